@@ -1,12 +1,16 @@
 import logging
 import os
 
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
 from app.config import Config
-from sqlalchemy import create_engine, inspect
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session
-from sqlalchemy.schema import CreateSchema
+from app.model.psql.replicas import ReadReplicas, Replica
+from app.telemetry.metrics import TimedAsyncAdaptedQueuePool, instrument_pool
+from app.telemetry.profiling import instrument_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
 
 logger = logging.getLogger(__name__)
 logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
@@ -14,66 +18,134 @@ logger.info(f'LOG_LEVEL: {os.environ.get("LOG_LEVEL")}')
 
 config = Config()
 
+# Sync drivers from DATABASE_URL mapped to their asyncio counterpart
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_conn_url(conn_url: str):
+    url = make_url(conn_url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+def initialize_psql_engine(conn_url: Optional[str] = None) -> AsyncEngine:
+    logger.info("Initializing PSQL Connection Pool")
+    url = get_async_conn_url(conn_url or config.postgres_conn_url)
+
+    # Pool tuning only applies to QueuePool backed dialects, sqlite picks its own pool
+    pool_options = {}
+    if url.get_backend_name() == "postgresql":
+        pool_options = {
+            "pool_size": config.postgres_pool_size,
+            "max_overflow": config.postgres_max_overflow,
+            "pool_timeout": config.postgres_pool_timeout,
+            "pool_recycle": config.postgres_pool_recycle,
+            "pool_pre_ping": config.postgres_pool_pre_ping,
+            "poolclass": TimedAsyncAdaptedQueuePool,
+        }
+
+    engine = create_async_engine(url, **pool_options)
+    instrument_pool(engine.sync_engine.pool, overflow=conn_url is None)
+    if config.profiling_enabled:
+        instrument_engine(
+            engine.sync_engine,
+            slow_query_ms=config.profiling_slow_query_ms,
+            explain_slow=config.profiling_explain_slow_queries,
+        )
+    logger.info("Initialized PSQL Connection Pool")
+
+    return engine
 
-def initialize_psql_session() -> Session:
-    logger.info("Initializing PSQL Connection")
-    engine = create_engine(config.postgres_conn_url, echo=True)
 
+def initialize_psql_session(engine: AsyncEngine) -> sessionmaker:
+    # The schema is bootstrapped by app.tools.migrate, see app/model/psql/bootstrap.py
     logger.info("Initializing PSQL Session")
-    base = declarative_base()
-    session = Session(bind=engine)
+    session_factory = sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
     logger.info("Initialized PSQL Session")
 
-    create_schema_and_tables(engine=engine, session=session, base=base)
-
-    return session
-
-
-def create_schema_and_tables(engine, session, base):
-    inspector = inspect(engine)
-
-    # Check if schema "test_app" exists
-    schema_name = "test_app"
-    if schema_name not in inspector.get_schema_names():
-        try:
-            with engine.begin() as connection:
-                connection.execute(CreateSchema(schema_name))
-            logger.info(f"Schema '{schema_name}' created successfully.")
-        except Exception as e:
-            logger.warning(
-                f"Schema '{schema_name}' already exists or an error occurred: {e}"
+    return session_factory
+
+
+def initialize_read_replicas() -> ReadReplicas:
+    # Every replica gets a pool of the DATABASE_POOL_* size of its own
+    replicas = []
+    for conn_url in (config.postgres_replica_urls or "").split(","):
+        if conn_url.strip():
+            engine = initialize_psql_engine(conn_url.strip())
+            replicas.append(
+                Replica(
+                    name=engine.url.render_as_string(hide_password=True),
+                    engine=engine,
+                    session_factory=initialize_psql_session(engine),
+                )
             )
-    else:
-        logger.info(f"Schema '{schema_name}' already exists.")
-
-    # Import ORM models and define tables
-    from app.model.psql.orm import ClaimModel, ClaimDetailModel, PatientModel, ProviderModel
-
-    # Define table list and check each table’s existence
-    tables = [
-        PatientModel.__table__,
-        ProviderModel.__table__,
-        ClaimDetailModel.__table__,
-        ClaimModel.__table__,
-    ]
-
-    # base.metadata.drop_all(engine, tables=tables)
-
-    # Only create tables that don’t exist
-    try:
-        base.metadata.create_all(
-            engine,
-            tables=[
-                table
-                for table in tables
-                if not inspector.has_table(table.name, schema=schema_name)
-            ],
-        )
-        session.commit()
-        logger.info("Tables initialized successfully!")
-    except SQLAlchemyError as e:
-        session.rollback()
-        logger.error(f"An error occurred: {str(e)}")
-
 
-postgres_conn = initialize_psql_session()
+    return ReadReplicas(
+        replicas,
+        max_lag=config.postgres_replica_max_lag,
+        sticky_seconds=config.postgres_replica_sticky_seconds,
+        interval=config.postgres_replica_check_interval,
+        timeout=config.readiness_ping_timeout,
+    )
+
+
+# Created on first use, by the app lifespan or the first request, importing
+# the app never connects to the database
+postgres_engine: Optional[AsyncEngine] = None
+postgres_session: Optional[sessionmaker] = None
+read_replicas: Optional[ReadReplicas] = None
+
+
+def start_database() -> sessionmaker:
+    global postgres_engine, postgres_session, read_replicas
+    if postgres_session is None:
+        postgres_engine = initialize_psql_engine()
+        postgres_session = initialize_psql_session(postgres_engine)
+        read_replicas = initialize_read_replicas()
+    return postgres_session
+
+
+def get_engine() -> AsyncEngine:
+    start_database()
+    return postgres_engine
+
+
+def get_read_replicas() -> ReadReplicas:
+    start_database()
+    return read_replicas
+
+
+async def stop_database() -> None:
+    global postgres_engine, postgres_session, read_replicas
+    if postgres_engine is not None:
+        await postgres_engine.dispose()
+    if read_replicas is not None:
+        await read_replicas.stop()
+        await read_replicas.dispose()
+    postgres_engine, postgres_session, read_replicas = None, None, None
+
+
+async def get_db_session() -> AsyncIterator[AsyncSession]:
+    # Request scoped session, the connection goes back to the pool once the
+    # response is sent
+    async with start_database()() as db_session:
+        yield db_session
+
+
+@asynccontextmanager
+async def read_db_session(
+    client: str, primary_until: Optional[float] = None
+) -> AsyncIterator[AsyncSession]:
+    # Session of a read only route, on a replica unless client wrote within
+    # the sticky window (primary_until comes from the write response cookie)
+    session_factory = start_database()
+    async with read_replicas.session(
+        session_factory, client, primary_until
+    ) as db_session:
+        yield db_session
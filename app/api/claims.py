@@ -1,28 +1,66 @@
+import base64
+import json
 import logging
 import logging.config
+import time
 import traceback
-from datetime import UTC, datetime
-from typing import Annotated, List
+from datetime import datetime
+from typing import Annotated, Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.param_functions import Header, Path, Query
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from sqlalchemy import desc, func
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import Integer, any_, bindparam, desc, select, text, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.exc import SQLAlchemyError
-
-from app import postgres_conn
-from app.authorizer.authorizer import authenticate_user
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import UploadFile
+
+from app import config, get_db_session, get_read_replicas, read_db_session
+from app.api.responses import FastJSONResponse
+from app.authorizer.authorizer import (
+    CLAIMS_READ,
+    CLAIMS_WRITE,
+    authenticate_user,
+    require_scopes,
+)
+from app.ratelimit.limiter import rate_limit
+from app.cache.response import CLAIM_ROUTE, TOP_PROVIDERS_ROUTE, response_cache
+from app.telemetry.metrics import CLAIM_LINES_INGESTED, VALIDATION_FAILURES
+from app.telemetry.profiling import ProfiledAPIRoute, profile_phase
+from app.ingest.batch import ClaimBatch, validate_claim_batch
+from app.ingest.csv_import import ClaimCsvImporter, ClaimImportError
+from app.ingest.engine import ClaimIngestEngine
+from app.ingest.group_commit import (
+    TICKET_PENDING_SECONDS,
+    WriterBusy,
+    claim_writer,
+    ticket_issued_at,
+)
 from app.model.api.claims import (
+    BadRequestResponseMessage,
     Claim,
+    ClaimBatchResponseModel,
+    ClaimImportResponseModel,
     ClaimResponseModel,
     ClaimsResponseModel,
+    ClaimTicketResponseModel,
+    ServiceUnavailableMessage,
     TooMayRequests,
     TopProviderFees,
     ClaimResourceResponseModel,
     standard_responses,
 )
-from app.model.psql.orm import ClaimDetailModel, ClaimModel, PatientModel, ProviderModel
+from app.model.psql.replicas import PRIMARY_COOKIE
+from app.model.psql.orm import (
+    ClaimDetailModel,
+    ClaimIngestTicketModel,
+    ClaimModel,
+    PatientModel,
+    ProviderModel,
+    ProviderNetFeeTotalModel,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -40,199 +78,668 @@ int_path_identifier = Annotated[
 claims_router = APIRouter(
     prefix="/claims",
     tags=["claims"],
+    route_class=ProfiledAPIRoute,
     dependencies=[Depends(authenticate_user, use_cache=True)],
 )
 
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
-router = APIRouter()
+# NOTE:
+# The static route must remain at top to avoid conflict with dynamic route ex. /claims must be defined before GET /{claimId}
+# authenticate_user verifies the bearer JWT and its tenant, require_scopes checks
+# the scopes of each route.
 
 
-async def _calculate_net_fee(claim: Claim):
-    # net fee formula
-    # *“net fee” = “provider fees” + “member coinsurance” + “member copay” - “Allowed fees”* (note again that the names are not consistent in capitalization).
-    net_fees = (
-        claim.provider_fees + claim.member_co_insurance + claim.member_co_pay
-    ) - claim.allowed_fees
+def _client(auth: dict) -> str:
+    return f"{auth['tenant']}:{auth['sub']}"
 
-    logger.info(f"Claim:{claim.submitted_procedure} net_fees:{net_fees}")
 
-    return net_fees
+async def _read_db_session(
+    request: Request,
+    auth: dict = Depends(authenticate_user, use_cache=True),
+) -> AsyncIterator[AsyncSession]:
+    # Read only routes run on a replica, see app/model/psql/replicas.py
+    try:
+        primary_until = float(request.cookies.get(PRIMARY_COOKIE, ""))
+    except ValueError:
+        primary_until = None
+
+    async with read_db_session(_client(auth), primary_until) as db_session:
+        yield db_session
+
+
+def _stick_to_primary(auth: dict, response: Response) -> None:
+    # The client's next reads see its write, on this worker and, through the
+    # cookie, on the others
+    read_replicas = get_read_replicas()
+    if read_replicas.replicas:
+        primary_until = read_replicas.stick(_client(auth))
+        response.set_cookie(
+            PRIMARY_COOKIE,
+            f"{primary_until:.3f}",
+            max_age=int(read_replicas.sticky_seconds) + 1,
+            httponly=True,
+        )
 
 
-# NOTE:
-# The static route must remain at top to avoid conflict with dynamic route ex. /claims must be defined before GET /{claimId}
-# The authenticate_user and dependency is for illustration purpose only, the actual implementation would does below.
-#  - Authenticate user with JWT
-#  - Validate Roles/Scope
-#  - Validate tenancy if multi tenant arch.
+def _encode_claims_cursor(created: datetime, claim_id: int) -> str:
+    # Opaque to clients, the position of the last claim of a page
+    return base64.urlsafe_b64encode(
+        json.dumps([created.isoformat(), claim_id]).encode()
+    ).decode()
+
+
+def _decode_claims_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created, claim_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created), int(claim_id)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(
+            detail=f"Invalid cursor: {e}",
+            status_code=400,
+            headers={"Content-Type": "application/json"},
+        )
+
+
+async def _estimate_claims_count(db_session: AsyncSession) -> int:
+    # Planner style estimate (reltuples per page scaled by the current relation
+    # size) from the catalog instead of a COUNT(*) over every claim
+    result = await db_session.execute(
+        text(
+            """
+            SELECT CASE
+                WHEN relpages > 0 AND reltuples > 0 THEN
+                    reltuples / relpages
+                    * (pg_relation_size(oid) / current_setting('block_size')::int)
+                ELSE GREATEST(reltuples, 0)
+            END
+            FROM pg_class
+            WHERE oid = to_regclass(:table_name)
+            """
+        ),
+        {"table_name": ClaimModel.__table__.fullname},
+    )
+    return int(result.scalar() or 0)
 
 
-# TODO: Implement the get_claims
 @claims_router.get(
     "/",
-    responses={**standard_responses},
+    responses={
+        **standard_responses,
+        **{
+            400: {"model": BadRequestResponseMessage},
+        },
+    },
+    response_model=ClaimsResponseModel,
+    response_class=FastJSONResponse,
+    dependencies=[Depends(require_scopes(CLAIMS_READ))],
     summary="List all claims paginated (Sorted by desc created time)",
 )
 async def get_claims(
     limit: Annotated[
         int,
         Query(
-            title="Limit of claims to get", description="Limit of claims to get", le=100
+            title="Limit of claims to get",
+            description="Limit of claims to get",
+            ge=1,
+            le=100,
         ),
     ] = 100,
+    cursor: Annotated[
+        Optional[str],
+        Query(
+            title="Page cursor",
+            description="The next cursor of the previous page, omit for the first page",
+        ),
+    ] = None,
     auth: dict = Depends(authenticate_user, use_cache=True),
-) -> ClaimsResponseModel:  # ClaimsResponseModel:
-    logger.info(f"Getting list of claims for limit: {limit} userId:{auth['sub']}")
+    db_session: AsyncSession = Depends(_read_db_session),
+) -> FastJSONResponse:
+    logger.info("Getting list of claims for limit: %s userId:%s", limit, auth["sub"])
+
+    try:
+        # Keyset pagination over claim_created_claim_id_key, every page is an
+        # index range scan of limit + 1 rows no matter how deep it is
+        claims_query = (
+            select(ClaimModel.claim_id, ClaimModel.created, ClaimModel.updated)
+            .order_by(ClaimModel.created.desc(), ClaimModel.claim_id.desc())
+            .limit(limit + 1)
+        )
+        if cursor:
+            created, claim_id = _decode_claims_cursor(cursor)
+            claims_query = claims_query.where(
+                tuple_(ClaimModel.created, ClaimModel.claim_id)
+                < tuple_(created, claim_id)
+            )
+
+        rows = (await db_session.execute(claims_query)).all()
+        total_count = await _estimate_claims_count(db_session)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_claims_cursor(rows[-1].created, rows[-1].claim_id)
+
+        logger.info("Returning list of claims for userId:%s", auth["sub"])
+        return FastJSONResponse(
+            {
+                "claims": [
+                    {
+                        "claimId": row.claim_id,
+                        "createdAt": row.created.isoformat(),
+                        "updatedAt": row.updated.isoformat() if row.updated else None,
+                    }
+                    for row in rows
+                ],
+                "totalCount": max(total_count, len(rows)),
+                "next": next_cursor,
+            }
+        )
+    except HTTPException:
+        raise
+    except SQLAlchemyError as s:
+        logger.error(f"SQLAlchemyError: {s}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        await db_session.rollback()
+        raise HTTPException(
+            detail="Internal Server Error",
+            status_code=500,
+            headers={"Content-Type": "application/json"},
+        )
+    except Exception as e:
+        logger.error(f"Error: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        raise HTTPException(
+            detail="Internal Server Error",
+            status_code=500,
+            headers={"Content-Type": "application/json"},
+        )
+
+
+claims_adapter = TypeAdapter(List[Claim])
+
+CLAIMS_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": {
+                    "type": "array",
+                    "items": Claim.model_json_schema(by_alias=True),
+                }
+            }
+        },
+    }
+}
+
+
+def _validate_claims(payload: Any) -> Union[List[Claim], ClaimBatch]:
+    # Large lists skip the per object Claim validators and are checked
+    # column-wise, both paths report errors the same way (422, loc per row)
+    if isinstance(payload, list) and len(payload) >= config.claim_columnar_threshold:
+        claims, errors = validate_claim_batch(payload)
+        if not errors:
+            return claims
+    else:
+        try:
+            return claims_adapter.validate_python(payload)
+        except ValidationError as e:
+            errors = e.errors(include_url=False)
+
+    VALIDATION_FAILURES.labels("process_claim").inc()
+    raise RequestValidationError(
+        errors=[{**error, "loc": ("body", *error["loc"])} for error in errors]
+    )
+
+
+async def _read_claims(request: Request) -> Union[List[Claim], ClaimBatch]:
+    body = await request.body()
+    with profile_phase("validate"):
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            VALIDATION_FAILURES.labels("process_claim").inc()
+            raise RequestValidationError(
+                errors=[
+                    {
+                        "type": "json_invalid",
+                        "loc": ("body", 0),
+                        "msg": "JSON decode error",
+                        "input": {},
+                        "ctx": {"error": str(e)},
+                    }
+                ],
+                body=body,
+            )
 
-    # TODO: Run query on Claims ORM and return list of claims within pagination limit
+        return _validate_claims(payload)
 
-    logger.info(f"Returning list of claims for userId:{auth['sub']}")
-    claims = [
-        ClaimResponseModel(
-            claimId=i,
-            createdAt=datetime.now(UTC).isoformat(),
-            updatedAt=datetime.now(UTC).isoformat(),
+
+@claims_router.get(
+    "/ingest/{ticketId}",
+    responses={
+        **standard_responses,
+    },
+    response_model=ClaimTicketResponseModel,
+    dependencies=[Depends(require_scopes(CLAIMS_WRITE))],
+    summary="Status of a claim accepted with 202 (CLAIM_INGEST_MODE=accepted)",
+)
+async def get_claim_ticket(
+    request: Request,
+    ticketId: Annotated[
+        str,
+        Path(
+            title="Ticket of an accepted claim",
+            description="Ticket of an accepted claim",
+            pattern="^[0-9a-f]{32}$",
+        ),
+    ],
+    auth: dict = Depends(authenticate_user, use_cache=True),
+    db_session: AsyncSession = Depends(get_db_session),
+) -> ClaimTicketResponseModel:
+    # Primary session, the outcome commits there first
+    result = await db_session.execute(
+        select(
+            ClaimIngestTicketModel.claim_id,
+            ClaimIngestTicketModel.error,
+            ClaimModel.created,
+            ClaimModel.updated,
         )
-        for i in range(0, 10)
-    ]
-    return ClaimsResponseModel(claims=claims[0:limit], totalCount=len(claims))
+        .outerjoin(ClaimModel, ClaimModel.claim_id == ClaimIngestTicketModel.claim_id)
+        .where(ClaimIngestTicketModel.ticket == ticketId)
+    )
+    row = result.one_or_none()
+    ticket = {
+        "ticketId": ticketId,
+        "statusUrl": request.url_for("get_claim_ticket", ticketId=ticketId).path,
+    }
+
+    if row is None:
+        # Not written yet, unless the worker holding it went away
+        if time.time() - ticket_issued_at(ticketId) > TICKET_PENDING_SECONDS:
+            raise HTTPException(
+                detail=f"Ticket {ticketId} not found",
+                status_code=404,
+                headers={"Content-Type": "application/json"},
+            )
+        return ClaimTicketResponseModel(**ticket, status="pending")
+
+    if row.claim_id is None:
+        return ClaimTicketResponseModel(**ticket, status="failed", error=row.error)
+
+    return ClaimTicketResponseModel(
+        **ticket,
+        status="committed",
+        claimId=row.claim_id,
+        createdAt=row.created.isoformat(),
+        updatedAt=row.updated.isoformat(),
+    )
 
 
 @claims_router.post(
     "/",
     responses={
         **standard_responses,
+        **{
+            202: {"model": ClaimTicketResponseModel},
+            503: {"model": ServiceUnavailableMessage},
+        },
     },
+    dependencies=[Depends(require_scopes(CLAIMS_WRITE))],
     summary="Process new claim",
+    openapi_extra=CLAIMS_REQUEST_BODY,
 )
 async def process_claim(
-    claims: List[Claim],
+    request: Request,
+    response: Response,
+    claims: Union[List[Claim], ClaimBatch] = Depends(_read_claims),
     x_test: str = Header(None, description="Custom x headers for demo"),
     auth: dict = Depends(authenticate_user, use_cache=True),
+    db_session: AsyncSession = Depends(get_db_session),
 ) -> ClaimResponseModel:
     # NOTE: Assuming claims received as a batch, Processing as a batch and allow
     # creation of subscriber and provider during processing batch. In actual impl.
     # this would have been solved by either creating the subscriber or provider before ingesting
     # this event for processing or via another ms
-    logger.info(f"Processing claim for user: {auth['sub']}")
+    logger.info("Processing claim for user: %s", auth["sub"])
 
     try:
-        # Create placeholder claim
-        with postgres_conn as db_session:
-            claim_model = ClaimModel()
-            db_session.add(claim_model)
-            # Commit to generate claim_id for claim_model
-            db_session.commit()
-            db_session.flush()
-
-            # Capture claim_id and timestamps immediately after flush
-            claim_id = claim_model.claim_id
-            created_at = claim_model.created
-            updated_at = claim_model.updated
-
-            # Create ClaimDetailModel instances with valid claim_id
-            providers_npi = []
-            subscribers_id = []
-            claims_details = []
-
-            for claim in claims:
-                net_fees = await _calculate_net_fee(claim=claim)
-
-                providers_npi.append(claim.npi)
-                subscribers_id.append(claim.subscriber)
-
-                # Populate each claim_detail with the correct claim_id
-                claims_details.append(
-                    ClaimDetailModel(
-                        claim_id=claim_id,
-                        service_date=claim.service_date,
-                        submitted_procedure=claim.submitted_procedure,
-                        quadrant=claim.quadrant,
-                        group=claim.group,
-                        allowed_fees=claim.allowed_fees,
-                        provider_fees=claim.provider_fees,
-                        member_co_insurance=claim.member_co_insurance,
-                        member_co_pay=claim.member_co_pay,
-                        net_fees=net_fees,
-                    )
-                )
-
-            # Batch query existing providers and subscribers
-            existing_providers = (
-                db_session.query(ProviderModel)
-                .filter(ProviderModel.npi.in_(providers_npi))
-                .all()
+        if claim_writer is None:
+            # Claim, provider/patient upserts and claim lines share one transaction
+            ingest_engine = ClaimIngestEngine(db_session=db_session)
+            claim_row = await ingest_engine.ingest(claims=claims)
+            await db_session.commit()
+            await response_cache.invalidate(TOP_PROVIDERS_ROUTE)
+            CLAIM_LINES_INGESTED.labels("process_claim").inc(
+                claims.lines if isinstance(claims, ClaimBatch) else len(claims)
             )
-            existing_subscribers = (
-                db_session.query(PatientModel)
-                .filter(PatientModel.subscriber_id.in_(subscribers_id))
-                .all()
+        elif config.claim_ingest_mode == "accepted":
+            # Written with a later group, the ticket reports the outcome
+            ticket = claim_writer.accept(claims)
+            status_url = request.url_for("get_claim_ticket", ticketId=ticket).path
+            accepted = FastJSONResponse(
+                {"ticketId": ticket, "status": "pending", "statusUrl": status_url},
+                status_code=202,
+                headers={"Location": status_url},
             )
-
-            existing_provider_npis = {
-                provider.npi: provider.provider_id for provider in existing_providers
-            }
-            existing_subscriber_ids = {
-                subscriber.subscriber_id: subscriber.patient_id
-                for subscriber in existing_subscribers
-            }
-
-            # Create new providers
-            new_providers = []
-            for npi in set(providers_npi) - set(existing_provider_npis.keys()):
-                provider = ProviderModel(npi=npi)
-                new_providers.append(provider)
-
-            # Create new subscribers
-            new_subscribers = []
-            for subscriber_id in set(subscribers_id) - set(
-                existing_subscriber_ids.keys()
-            ):
-                subscriber = PatientModel(subscriber_id=subscriber_id)
-                new_subscribers.append(subscriber)
-
-            # Add new providers and subscribers in bulk
-            if new_providers or new_subscribers:
-                db_session.add_all(new_providers + new_subscribers)
-                db_session.commit()
-
-                # Update provider and subscriber IDs for the newly created entries
-                for provider in new_providers:
-                    existing_provider_npis[provider.npi] = provider.provider_id
-                for subscriber in new_subscribers:
-                    existing_subscriber_ids[subscriber.subscriber_id] = (
-                        subscriber.patient_id
-                    )
-
-            # Update claim details with correct provider and subscriber IDs
-            for i, detail in enumerate(claims_details):
-                if claims[i].npi in existing_provider_npis:
-                    detail.provider_id = existing_provider_npis[claims[i].npi]
-                if claims[i].subscriber in existing_subscriber_ids:
-                    detail.subscriber_id = existing_subscriber_ids[claims[i].subscriber]
-
-            # Step 8: Add claim details in bulk
-            db_session.add_all(claims_details)
-            db_session.commit()
-
-        # Assumption on payment processing
-        # - Payment processing shall be handled asynchronously via Queue or Stream and claim detail shall be dumped which is inclusive of net_fees
-        # - Error Handling: If in the event of queue or stream is down, the API need to rollback psql commit
-        # - If queue is opted, then DLQ shall be setup to redrive the dead messages
-        # - If stream is opted, then stream event handler shall resume from where left of
+            _stick_to_primary(auth, accepted)
+            return accepted
+        else:
+            # Committed together with the claims of concurrent requests, see
+            # app/ingest/group_commit.py
+            claim_row = await claim_writer.submit(claims)
+        _stick_to_primary(auth, response)
+
+        # Payment processing
+        # - The claim.processed event (net fees included) is committed to payment_outbox
+        #   together with the claim lines, the request never waits on the queue/stream
+        # - The outbox dispatcher (app/outbox) publishes it asynchronously with retries,
+        #   events that keep failing are parked in payment_dead_letter
 
         # Return response
         return ClaimResponseModel(
-            claimId=claim_id,
-            createdAt=created_at.isoformat(),
-            updatedAt=updated_at.isoformat(),
+            claimId=claim_row.claim_id,
+            createdAt=claim_row.created.isoformat(),
+            updatedAt=claim_row.updated.isoformat(),
+        )
+    except WriterBusy as e:
+        logger.warning(f"Claim rejected: {e}")
+        raise HTTPException(
+            detail="Claim writer is busy.",
+            status_code=503,
+            headers={"Content-Type": "application/json", "Retry-After": "1"},
+        )
+    except SQLAlchemyError as s:
+        logger.error(f"SQLAlchemyError: {s}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        await db_session.rollback()
+        raise HTTPException(
+            detail="Internal Server Error",
+            status_code=500,
+            headers={"Content-Type": "application/json"},
+        )
+    except Exception as e:
+        logger.error(f"Error: {e}")
+        raise HTTPException(
+            detail="Internal Server Error",
+            status_code=500,
+            headers={"Content-Type": "application/json"},
+        )
+
+
+CLAIM_IMPORT_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "text/csv": {"schema": {"type": "string", "format": "binary"}},
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            },
+        },
+    }
+}
+
+
+async def _iter_upload(upload: UploadFile, chunk_size: int = 64 * 1024):
+    while chunk := await upload.read(chunk_size):
+        yield chunk
+
+
+@claims_router.post(
+    "/import",
+    responses={
+        **standard_responses,
+        **{
+            400: {"model": BadRequestResponseMessage},
+        },
+    },
+    dependencies=[Depends(require_scopes(CLAIMS_WRITE))],
+    summary="Import a claim file (claim_1234.csv layout) as a single claim",
+    openapi_extra=CLAIM_IMPORT_REQUEST_BODY,
+)
+async def import_claims(
+    request: Request,
+    response: Response,
+    auth: dict = Depends(authenticate_user, use_cache=True),
+    db_session: AsyncSession = Depends(get_db_session),
+) -> ClaimImportResponseModel:
+    # NOTE: The body is parsed as it streams in, raw text/csv bodies are never
+    # buffered. Multipart uploads are spooled to disk by starlette first.
+    logger.info(f"Importing claim file for user: {auth['sub']}")
+
+    form = None
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            form = await request.form()
+            upload = next(
+                (value for value in form.values() if isinstance(value, UploadFile)),
+                None,
+            )
+            if upload is None:
+                raise ClaimImportError("Multipart body must carry the claim file")
+            chunks = _iter_upload(upload)
+        else:
+            chunks = request.stream()
+
+        importer = ClaimCsvImporter(
+            db_session=db_session,
+            chunk_size=config.claim_import_chunk_size,
+            max_errors=config.claim_import_max_errors,
+        )
+        report = await importer.run(chunks)
+        await db_session.commit()
+        _stick_to_primary(auth, response)
+        if report.importedCount:
+            await response_cache.invalidate(TOP_PROVIDERS_ROUTE)
+        CLAIM_LINES_INGESTED.labels("import_claims").inc(report.importedCount)
+        VALIDATION_FAILURES.labels("import_claims").inc(report.rejectedCount)
+
+        logger.info(f"Imported claim:{report.claimId} for user: {auth['sub']}")
+        return report
+    except ClaimImportError as e:
+        VALIDATION_FAILURES.labels("import_claims").inc()
+        await db_session.rollback()
+        raise HTTPException(
+            detail=str(e),
+            status_code=400,
+            headers={"Content-Type": "application/json"},
+        )
+    except SQLAlchemyError as s:
+        logger.error(f"SQLAlchemyError: {s}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        await db_session.rollback()
+        raise HTTPException(
+            detail="Internal Server Error",
+            status_code=500,
+            headers={"Content-Type": "application/json"},
+        )
+    except Exception as e:
+        logger.error(f"Error: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        raise HTTPException(
+            detail="Internal Server Error",
+            status_code=500,
+            headers={"Content-Type": "application/json"},
+        )
+    finally:
+        if form is not None:
+            await form.close()
+
+
+def claim_resource_query():
+    """
+    Claim with its lines and their subscriber and NPI in one statement. The
+    claim row is the outer side so a claim without lines still comes back as a
+    single row with NULL line columns. Lines are found through
+    claim_detail_claim_id_key.
+    """
+
+    return (
+        select(
+            ClaimModel.claim_id,
+            ClaimDetailModel.id.label("claim_detail_id"),
+            ClaimDetailModel.service_date,
+            ClaimDetailModel.submitted_procedure,
+            ClaimDetailModel.quadrant,
+            ClaimDetailModel.group,
+            PatientModel.subscriber_id.label("subscriber"),
+            ProviderModel.npi,
+            ClaimDetailModel.provider_fees_cents,
+            ClaimDetailModel.allowed_fees_cents,
+            ClaimDetailModel.member_co_insurance_cents,
+            ClaimDetailModel.member_co_pay_cents,
+            ClaimDetailModel.net_fees_cents,
+            ClaimDetailModel.created,
+            ClaimDetailModel.updated,
+        )
+        .select_from(ClaimModel)
+        .outerjoin(ClaimDetailModel, ClaimDetailModel.claim_id == ClaimModel.claim_id)
+        .outerjoin(
+            PatientModel, PatientModel.patient_id == ClaimDetailModel.subscriber_id
+        )
+        .outerjoin(
+            ProviderModel, ProviderModel.provider_id == ClaimDetailModel.provider_id
+        )
+    )
+
+
+def claim_resource_from_row(row) -> dict:
+    # ClaimResourceResponseModel as a plain dict, cacheable in any backend and
+    # sent without building the model
+    return {
+        "claimId": row.claim_id,
+        "service_date": row.service_date.isoformat(),
+        "submitted_procedure": row.submitted_procedure,
+        "quadrant": row.quadrant,
+        "group": row.group,
+        "subscriber": row.subscriber,
+        "npi": row.npi,
+        "provider_fees": row.provider_fees_cents / 100,
+        "allowed_fees": row.allowed_fees_cents / 100,
+        "member_co_insurance": row.member_co_insurance_cents / 100,
+        "member_co_pay": row.member_co_pay_cents / 100,
+        "net_fees": row.net_fees_cents / 100,
+        "provider_fees_cents": row.provider_fees_cents,
+        "allowed_fees_cents": row.allowed_fees_cents,
+        "member_co_insurance_cents": row.member_co_insurance_cents,
+        "member_co_pay_cents": row.member_co_pay_cents,
+        "net_fees_cents": row.net_fees_cents,
+        "createdAt": row.created.isoformat(),
+        "updatedAt": row.updated.isoformat(),
+    }
+
+
+def group_claim_resources(rows) -> Dict[int, List[dict]]:
+    claims: Dict[int, List[dict]] = {}
+    for row in rows:
+        lines = claims.setdefault(row.claim_id, [])
+        if row.claim_detail_id is not None:
+            lines.append(claim_resource_from_row(row))
+
+    return claims
+
+
+async def fetch_claim_resources(
+    db_session: AsyncSession, claim_id: int
+) -> Optional[List[dict]]:
+    """Claim lines of claim_id, None when the claim doesn't exist"""
+
+    rows = (
+        await db_session.execute(
+            claim_resource_query()
+            .where(ClaimModel.claim_id == claim_id)
+            .order_by(ClaimDetailModel.id)
+        )
+    ).all()
+
+    return group_claim_resources(rows).get(claim_id)
+
+
+def claim_resources_batch_query(claim_ids: List[int]):
+    # One int[] parameter whatever the number of ids, so every batch shares a
+    # single prepared statement and plan
+    return (
+        claim_resource_query()
+        .where(
+            ClaimModel.claim_id
+            == any_(bindparam("claim_ids", claim_ids, type_=ARRAY(Integer())))
+        )
+        .order_by(ClaimModel.claim_id, ClaimDetailModel.id)
+    )
+
+
+def _parse_claim_ids(ids: str) -> List[int]:
+    try:
+        claim_ids = [int(claim_id) for claim_id in ids.split(",") if claim_id.strip()]
+    except ValueError as e:
+        raise HTTPException(
+            detail=f"Invalid claim ids: {e}",
+            status_code=400,
+            headers={"Content-Type": "application/json"},
+        )
+
+    # Duplicates are answered once, in the order they were first asked for
+    claim_ids = list(dict.fromkeys(claim_ids))
+    if not claim_ids or len(claim_ids) > config.claim_batch_max_ids:
+        raise HTTPException(
+            detail=f"Between 1 and {config.claim_batch_max_ids} claim ids are allowed",
+            status_code=400,
+            headers={"Content-Type": "application/json"},
+        )
+
+    return claim_ids
+
+
+@claims_router.get(
+    "/batch",
+    responses={
+        **standard_responses,
+        **{
+            400: {"model": BadRequestResponseMessage},
+        },
+    },
+    response_model=ClaimBatchResponseModel,
+    response_class=FastJSONResponse,
+    dependencies=[Depends(require_scopes(CLAIMS_READ))],
+    summary="Get many claims by ID, missing ids are reported instead of a 404",
+)
+async def get_claims_batch(
+    ids: Annotated[
+        str,
+        Query(
+            title="Claim identifiers",
+            description="Comma separated claim identifiers e.g. 1,2,3",
+        ),
+    ],
+    auth: dict = Depends(authenticate_user, use_cache=True),
+    db_session: AsyncSession = Depends(_read_db_session),
+) -> FastJSONResponse:
+    claim_ids = _parse_claim_ids(ids)
+    logger.info("Getting %s claims for userId:%s", len(claim_ids), auth["sub"])
+
+    try:
+        rows = (await db_session.execute(claim_resources_batch_query(claim_ids))).all()
+        claims = group_claim_resources(rows)
+
+        logger.info("Returning %s claims for userId:%s", len(claims), auth["sub"])
+        return FastJSONResponse(
+            {
+                "claims": [
+                    {"claimId": claim_id, "lines": claims[claim_id]}
+                    for claim_id in claim_ids
+                    if claim_id in claims
+                ],
+                "missingIds": [
+                    claim_id for claim_id in claim_ids if claim_id not in claims
+                ],
+            }
         )
     except SQLAlchemyError as s:
         logger.error(f"SQLAlchemyError: {s}")
         logger.error(f"Traceback: {traceback.format_exc()}")
-        db_session.rollback()
+        await db_session.rollback()
         raise HTTPException(
             detail="Internal Server Error",
             status_code=500,
@@ -240,6 +747,7 @@ async def process_claim(
         )
     except Exception as e:
         logger.error(f"Error: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(
             detail="Internal Server Error",
             status_code=500,
@@ -247,64 +755,47 @@ async def process_claim(
         )
 
 
-# TODO: Implement the get_claims_by_id for now it's placeholder
 @claims_router.get(
     "/{claimId}",
     responses={**standard_responses},
+    response_model=List[ClaimResourceResponseModel],
+    response_class=FastJSONResponse,
+    dependencies=[Depends(require_scopes(CLAIMS_READ))],
     summary="Get a given claims by ID",
 )
 async def get_claims_by_id(
     claimId: int_path_identifier,
     auth: dict = Depends(authenticate_user, use_cache=True),
-) -> List[ClaimResourceResponseModel]:
-    logger.info(f"Getting claimId:{claimId} userId:{auth['sub']}")
+    db_session: AsyncSession = Depends(_read_db_session),
+) -> FastJSONResponse:
+    logger.info("Getting claimId:%s userId:%s", claimId, auth["sub"])
+
+    async def load_claim() -> Optional[List[dict]]:
+        return await fetch_claim_resources(db_session=db_session, claim_id=claimId)
 
     try:
-        with postgres_conn as db_session:
+        # Claims are written once and never updated, reads are served from the
+        # cache until the entry expires or is evicted
+        claims = await response_cache.get_or_load(
+            CLAIM_ROUTE, (claimId,), load_claim
+        )
 
-            claim = (
-                db_session.query(ClaimModel)
-                .filter_by(claim_id=claimId)
-                .first()
+        if claims is None:
+            raise HTTPException(
+                detail=f"Given claimId:{claimId} not found.",
+                status_code=404,
+                headers={"Content-Type": "application/json"},
             )
 
-            if not claim:
-                raise HTTPException(
-                    detail=f"Given claimId:{claimId} not found.",
-                    status_code=404,
-                    headers={"Content-Type": "application/json"},
-                )
-            # Query to aggregate net fees by provider_npi
-            claim_query = db_session.query(ClaimDetailModel).filter_by(claim_id=claimId)
-
-            claims = db_session.execute(claim_query).scalars().fetchall()
-
-            logger.info(f"Returning claim:{claimId} for userId:{auth['sub']}")
-            # Return the result
-            return [
-                ClaimResourceResponseModel(
-                    claimId=row.claim_id,
-                    service_date=row.service_date.isoformat(),
-                    group=row.group,
-                    subscriber=row.patient.subscriber_id,
-                    npi=row.provider.npi,
-                    quadrant=row.quadrant,
-                    submitted_procedure=row.submitted_procedure,
-                    provider_fees=row.provider_fees,
-                    allowed_fees=row.allowed_fees,
-                    member_co_insurance=row.member_co_insurance,
-                    member_co_pay=row.member_co_pay,
-                    net_fees=row.net_fees,
-                    createdAt=row.created.isoformat(),
-                    updatedAt=row.updated.isoformat(),
-                )
-                for row in claims
-            ]
+        logger.info("Returning claim:%s for userId:%s", claimId, auth["sub"])
+        return FastJSONResponse(claims)
 
+    except HTTPException:
+        raise
     except SQLAlchemyError as s:
         logger.error(f"SQLAlchemyError: {s}")
         logger.error(f"Traceback: {traceback.format_exc()}")
-        db_session.rollback()
+        await db_session.rollback()
         raise HTTPException(
             detail="Internal Server Error",
             status_code=500,
@@ -328,49 +819,61 @@ async def get_claims_by_id(
             429: {"model": TooMayRequests},
         },
     },
+    response_model=List[TopProviderFees],
+    response_class=FastJSONResponse,
+    # Per client token bucket shared by the workers, see RATE_LIMITS
+    dependencies=[
+        Depends(require_scopes(CLAIMS_READ)),
+        Depends(rate_limit("top_providers")),
+    ],
 )
-# Using the slow API module to achieve the rate limiting based on client ip
-# In actual implementation, I would have used WAF, API or Lambda Level throttling
-# The alternative could have been building custom i/o based solution which works as
-# pre flight to track the request and
-@limiter.limit("10/minute")
 async def get_top_providers(
-    request: Request, auth: dict = Depends(authenticate_user, use_cache=True)
-) -> List[TopProviderFees]:
-    logger.info(f"Getting top providers by net fees for userId:{auth['sub']}")
-    try:
-        with postgres_conn as db_session:
-            # Query to aggregate net fees by provider_npi
-            result = (
-                db_session.query(
-                    ProviderModel.npi.label("provider_npi"),  # Select NPI directly
-                    func.sum(ClaimDetailModel.net_fees).label("total_net_fees"),
+    auth: dict = Depends(authenticate_user, use_cache=True),
+    db_session: AsyncSession = Depends(_read_db_session),
+) -> FastJSONResponse:
+    logger.info("Getting top providers by net fees for userId:%s", auth["sub"])
+
+    async def load_top_providers() -> List[dict]:
+        # Totals are maintained on ingest, the top 10 is a backward scan of
+        # provider_net_fee_totals_total_net_fees_key plus 10 provider lookups
+        result = (
+            await db_session.execute(
+                select(
+                    ProviderModel.npi.label("provider_npi"),
+                    ProviderNetFeeTotalModel.total_net_fees_cents,
                 )
                 .join(
-                    ClaimDetailModel,
-                    ClaimDetailModel.provider_id == ProviderModel.provider_id,
-                )  # Join on provider_id
-                .group_by(ProviderModel.npi)  # Group by provider_npi
-                .order_by(
-                    desc("total_net_fees")
-                )  # Order by total_net_fees in descending order
+                    ProviderModel,
+                    ProviderModel.provider_id == ProviderNetFeeTotalModel.provider_id,
+                )
+                .order_by(desc(ProviderNetFeeTotalModel.total_net_fees_cents))
                 .limit(10)  # Limit to top 10 results
-                .all()
             )
+        ).all()
 
-        logger.info(f"Returning top providers by net fees for userId:{auth['sub']}")
-        # Return the result
         return [
-            TopProviderFees(
-                provider_npi=row.provider_npi, total_net_fees=row.total_net_fees
-            )
+            {
+                "provider_npi": row.provider_npi,
+                "total_net_fees": row.total_net_fees_cents / 100,
+                "total_net_fees_cents": row.total_net_fees_cents,
+            }
             for row in result
         ]
 
+    try:
+        # Ingest drops the entry, the short TTL bounds staleness on workers
+        # that didn't see the write
+        top_providers = await response_cache.get_or_load(
+            TOP_PROVIDERS_ROUTE, (), load_top_providers
+        )
+
+        logger.info("Returning top providers by net fees for userId:%s", auth["sub"])
+        return FastJSONResponse(top_providers)
+
     except SQLAlchemyError as s:
         logger.error(f"SQLAlchemyError: {s}")
         logger.error(f"Traceback: {traceback.format_exc()}")
-        db_session.rollback()
+        await db_session.rollback()
         raise HTTPException(
             detail="Internal Server Error",
             status_code=500,
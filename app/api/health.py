@@ -2,6 +2,7 @@ import logging
 import logging.config
 
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from pydantic import (
     AliasGenerator,
     BaseModel,
@@ -10,6 +11,9 @@ from pydantic import (
 )
 from pydantic.alias_generators import to_camel
 
+from app import get_read_replicas
+from app.telemetry.readiness import database_readiness
+
 logger = logging.getLogger(__name__)
 
 
@@ -40,3 +44,17 @@ health_router = APIRouter(
 async def get_health() -> HealthModel:
     logger.info("Health endpoint pinged")
     return HealthModel(status="OK")
+
+
+@health_router.get(
+    "/ready",
+    summary="Get API readiness, 503 while the database can't be reached",
+)
+async def get_readiness() -> JSONResponse:
+    # Reads the outcome of the background ping, never the database itself
+    status = database_readiness.status()
+    # Informational, reads fall back to the primary without healthy replicas
+    status["replicas"] = get_read_replicas().status()
+    return JSONResponse(
+        content=status, status_code=200 if status["status"] == "OK" else 503
+    )
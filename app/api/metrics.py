@@ -0,0 +1,23 @@
+import logging
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from app.telemetry.metrics import render_metrics
+
+logger = logging.getLogger(__name__)
+
+
+metrics_router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+@metrics_router.get(
+    "",
+    summary="Prometheus metrics of all API workers",
+)
+def get_metrics() -> Response:
+    # Plain def, reading the worker files runs in the threadpool
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
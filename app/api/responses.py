@@ -0,0 +1,18 @@
+"""
+Fast response path of the read routes. They build plain dicts straight from
+the database rows and return a FastJSONResponse, which FastAPI sends as is:
+no response model is built or validated and orjson does the encoding. The
+route's response_model still documents the schema in OpenAPI.
+"""
+
+from typing import Any
+
+from fastapi.responses import ORJSONResponse
+
+from app.telemetry.profiling import profile_phase
+
+
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        with profile_phase("serialize"):
+            return super().render(content)
@@ -1,84 +1,28 @@
+import asyncio
 import os
 import json
-import contextvars
-from app.api import health, claims
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from app.api import health, claims, metrics
+from app.cache.identity import identity_cache, warm_identity_cache
+from app.ingest.group_commit import claim_writer
+from app.outbox.dispatcher import OutboxDispatcher
+from app.outbox.sinks import initialize_payment_sink
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
-from app import config
-
-from starlette.middleware.base import BaseHTTPMiddleware
+from app import config, get_read_replicas, start_database, stop_database
+from app.telemetry.logs import configure_logging
+from app.telemetry.metrics import MetricsMiddleware, mark_worker_dead
+from app.telemetry.profiling import ProfilingMiddleware
+from app.telemetry.readiness import database_readiness
+from app.telemetry.trace import REQUEST_ID_HEADER, TraceIdMiddleware
 
 
 import logging
-import logging.config
-
-
-request_id_context = contextvars.ContextVar("request_id", default="N/A")
-
-
-class ContextAwareFormatter(logging.Formatter):
-    def format(self, record):
-        record.trace_id = request_id_context.get("N/A")
-        return super().format(record)
-
 
-# Define the logging middleware for cloud deployment
-async def log_trace_id(request: Request, call_next):
-    logger.debug(f"Request headers: {request.headers}")
-    logger.debug(f"Request client: {request.client}")
-    # In actual application this could have been "x-forwarded-for"
-    trace_id = f"{request.headers.get('host', 'N/A')}"
 
-    # Log or set the trace ID in context for further processing/logging
-    request_id_context.set(trace_id)
-
-    response = await call_next(request)
-    return response
-
-
-LOGGING_CONFIG = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "formatters": {
-        "default": {
-            "()": ContextAwareFormatter,
-            "fmt": "%(asctime)s.%(msecs)03d [%(levelname)s] %(name)s [Trace ID: %(trace_id)s]: %(message)s",
-            "datefmt": "%Y-%m-%d %H:%M:%S",
-        },
-        "access": {
-            "()": ContextAwareFormatter,
-            "fmt": "%(asctime)s.%(msecs)03d [%(levelname)s] %(name)s [Trace ID: %(trace_id)s]: %(message)s",
-            "datefmt": "%Y-%m-%d %H:%M:%S",
-        },
-    },
-    "handlers": {
-        "default": {
-            "formatter": "default",
-            "class": "logging.StreamHandler",
-            "stream": "ext://sys.stdout",
-        },
-        "access": {
-            "formatter": "access",
-            "class": "logging.StreamHandler",
-            "stream": "ext://sys.stdout",
-        },
-    },
-    "loggers": {
-        "": {
-            "handlers": ["default"],
-            "level": config.app_log_level,
-        },
-        "uvicorn.access": {
-            "handlers": ["access"],
-            "level": config.api_log_level,
-            "propagate": False,
-        },
-    },
-}
-
-
-logging.config.dictConfig(LOGGING_CONFIG)
+# Records are queued by the request and written by a background thread
+log_listener = configure_logging(config)
 
 logger = logging.getLogger(__name__)
 
@@ -128,10 +72,70 @@ def custom_openapi():
     return app.openapi_schema
 
 
+async def warm_up(session_factory) -> None:
+    try:
+        async with session_factory() as db_session:
+            warmed = await warm_identity_cache(
+                db_session,
+                limit=config.identity_cache_warm_size,
+                days=config.identity_cache_warm_days,
+            )
+        logger.info(f"Identity cache warmed: {warmed}")
+    except Exception as e:
+        logger.warning(f"Identity cache warm up failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Creating the pool doesn't connect, the worker serves right away and the
+    # schema is left to app.tools.migrate
+    session_factory = start_database()
+    database_readiness.start()
+    get_read_replicas().start()
+    if claim_writer is not None:
+        claim_writer.start()
+
+    # Steady state ingest finds its busiest providers and patients cached, the
+    # warm up runs next to the first requests instead of delaying them
+    warm_up_task = None
+    if config.identity_cache_max_entries > 0 and config.identity_cache_warm_size > 0:
+        warm_up_task = asyncio.create_task(warm_up(session_factory))
+
+    # Every worker runs a dispatcher, SKIP LOCKED keeps them off each other's rows
+    dispatcher = None
+    if config.payment_dispatcher_enabled:
+        dispatcher = OutboxDispatcher(
+            session_factory=session_factory,
+            sink=initialize_payment_sink(),
+            batch_size=config.payment_outbox_batch_size,
+            poll_interval=config.payment_outbox_poll_interval,
+            max_attempts=config.payment_outbox_max_attempts,
+            backoff_base=config.payment_outbox_backoff_base,
+            backoff_max=config.payment_outbox_backoff_max,
+        )
+        dispatcher.start()
+
+    yield
+
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+        await asyncio.gather(warm_up_task, return_exceptions=True)
+    if claim_writer is not None:
+        # Writes the claims already acknowledged with a ticket
+        await claim_writer.stop()
+    if dispatcher is not None:
+        await dispatcher.stop()
+    await database_readiness.stop()
+    await stop_database()
+    logger.info(f"Identity cache stats: {identity_cache.stats()}")
+    mark_worker_dead()
+
+
 def create_app():
     logger.info("Creating Claim Processor Application")
     app = FastAPI(
         **doc_config,
+        lifespan=lifespan,
     )
 
     logger.info("Configuring Claim Processor App OpenAPI Specs")
@@ -146,10 +150,12 @@ def create_app():
         allow_credentials=True,
         allow_methods=config.cors_allowed_methods.split(","),
         allow_headers=config.cors_allowed_headers.split(","),
+        expose_headers=[REQUEST_ID_HEADER, "server-timing"],
     )
 
     app.include_router(claims.claims_router, prefix="/v1")
     app.include_router(health.health_router, include_in_schema=False)
+    app.include_router(metrics.metrics_router, include_in_schema=False)
 
     logger.info("Created Claim Processor Application")
 
@@ -160,8 +166,15 @@ logger.info("Starting Claim Processor Application")
 app = create_app()
 logger.info("Started Claim Processor Application")
 
-# Add the logging middleware using BaseHTTPMiddleware
-app.add_middleware(BaseHTTPMiddleware, dispatch=log_trace_id)
+if config.profiling_enabled:
+    app.add_middleware(
+        ProfilingMiddleware,
+        server_timing=config.server_timing_enabled,
+        repeated_query_threshold=config.profiling_repeated_query_threshold,
+    )
+app.add_middleware(MetricsMiddleware)
+# Outermost, the trace id is set before anything else logs for the request
+app.add_middleware(TraceIdMiddleware)
 
 if __name__ == "__main__":
     import uvicorn
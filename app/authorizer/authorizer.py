@@ -1,25 +1,201 @@
+import hashlib
 import logging
 import os
-from typing import Annotated
+import time
+from collections import OrderedDict
+from typing import Annotated, Callable, Dict, List, Optional, Tuple
 
-from fastapi import HTTPException
+import jwt
+from fastapi import Depends, HTTPException
 from fastapi.param_functions import Header
 
+from app import config
+from app.authorizer.jwks import JwksKeySet, jwks_loader
+from app.telemetry.metrics import CACHE_LOOKUPS
 
 logger = logging.getLogger(__name__)
 logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 
+CLAIMS_READ = "claims:read"
+CLAIMS_WRITE = "claims:write"
 
-# Custom authorizer
-async def authenticate_user(Authorization: Annotated[str, Header()]):
+# Identity of every request when no JWKS is configured, dev and test only
+UNVERIFIED_IDENTITY = {
+    "sub": "abc",
+    "tenant": "123",
+    "scopes": [CLAIMS_READ, CLAIMS_WRITE],
+}
+
+UNAUTHORIZED_HEADERS = {
+    "Content-Type": "application/json",
+    "WWW-Authenticate": "Bearer",
+}
+
+
+def unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers=UNAUTHORIZED_HEADERS)
+
+
+def forbidden(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=403, detail=detail, headers={"Content-Type": "application/json"}
+    )
+
+
+class TokenVerifier(object):
+    """
+    Verifies bearer JWTs against a JWKS and checks their tenant.
+
+    Verified tokens are kept in a bounded LRU until they expire, at most ttl
+    seconds, so a repeat caller costs a hash and a dict lookup instead of a
+    signature check. The ttl bounds how long a token signed by a key removed
+    from the JWKS is still accepted.
+    """
+
+    def __init__(
+        self,
+        key_set: JwksKeySet,
+        algorithms: List[str],
+        audience: Optional[str] = None,
+        issuer: Optional[str] = None,
+        tenant_claim: str = "tenant",
+        tenants: Optional[List[str]] = None,
+        cache_size: int = 10000,
+        cache_ttl: float = 300,
+        leeway: float = 30,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.key_set = key_set
+        self.algorithms = algorithms
+        self.audience = audience
+        self.issuer = issuer
+        self.tenant_claim = tenant_claim
+        self.tenants = set(tenants) if tenants else None
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.leeway = leeway
+        self.clock = clock
+        # sha256 of the token -> (identity, expires)
+        self._verified: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+
+    async def verify(self, token: str) -> dict:
+        key = hashlib.sha256(token.encode()).digest()
+        now = self.clock()
+        cached = self._verified.get(key)
+        if cached is not None and cached[1] > now:
+            self._verified.move_to_end(key)
+            CACHE_LOOKUPS.labels("token", "hit").inc()
+            return cached[0]
+        CACHE_LOOKUPS.labels("token", "miss").inc()
+
+        claims = await self.decode(token)
+        identity = self.identity(claims)
+
+        expires = now + self.cache_ttl
+        if "exp" in claims:
+            expires = min(expires, claims["exp"] + self.leeway)
+        if self.cache_size > 0:
+            self._verified[key] = (identity, expires)
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+
+        return identity
+
+    async def decode(self, token: str) -> dict:
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError as e:
+            raise unauthorized(f"Invalid token: {e}")
+
+        if header.get("alg") not in self.algorithms:
+            raise unauthorized("Invalid token: signing algorithm not allowed")
+
+        signing_key = await self.key_set.get(header.get("kid"))
+        if signing_key is None:
+            raise unauthorized("Invalid token: unknown signing key")
+
+        try:
+            return jwt.decode(
+                token,
+                key=signing_key.key,
+                algorithms=self.algorithms,
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={
+                    "require": ["exp", "sub"],
+                    "verify_aud": self.audience is not None,
+                },
+            )
+        except jwt.InvalidTokenError as e:
+            raise unauthorized(f"Invalid token: {e}")
+
+    def identity(self, claims: dict) -> dict:
+        tenant = claims.get(self.tenant_claim)
+        if tenant is None:
+            raise forbidden("Token has no tenant")
+        if self.tenants is not None and str(tenant) not in self.tenants:
+            raise forbidden(f"Tenant {tenant} is not allowed")
+
+        # OAuth scope string or a list (scp)
+        scopes = claims.get("scope", claims.get("scp", []))
+        if isinstance(scopes, str):
+            scopes = scopes.split()
+
+        return {"sub": str(claims["sub"]), "tenant": str(tenant), "scopes": scopes}
+
+
+def initialize_token_verifier() -> Optional[TokenVerifier]:
+    load = jwks_loader(config)
+    if load is None:
+        if not config.auth_allow_unverified:
+            raise RuntimeError(
+                "Set AUTH_JWKS, AUTH_JWKS_FILE or AUTH_JWKS_URL to verify tokens"
+            )
+        logger.warning("No JWKS configured, bearer tokens are not verified")
+        return None
+
+    return TokenVerifier(
+        key_set=JwksKeySet(
+            load,
+            refresh_interval=config.auth_jwks_refresh_interval,
+            max_age=config.auth_jwks_max_age,
+        ),
+        algorithms=config.auth_algorithms.split(","),
+        audience=config.auth_audience,
+        issuer=config.auth_issuer,
+        tenant_claim=config.auth_tenant_claim,
+        tenants=config.auth_tenants.split(",") if config.auth_tenants else None,
+        cache_size=config.auth_token_cache_size,
+        cache_ttl=config.auth_token_cache_ttl,
+    )
+
+
+token_verifier = initialize_token_verifier()
+
+
+async def authenticate_user(Authorization: Annotated[str, Header()]) -> Dict:
     if Authorization == "":
-        raise HTTPException(status_code=401, detail="Authentication Token Missing.")
+        raise unauthorized("Authentication Token Missing.")
+
+    if token_verifier is None:
+        return UNVERIFIED_IDENTITY
+
+    scheme, _, token = Authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        raise unauthorized("Bearer token expected.")
+
+    return await token_verifier.verify(token.strip())
+
 
-    logger.debug(f"Validating token: {Authorization}")
+def require_scopes(*scopes: str):
+    """Route dependency rejecting tokens without all of scopes"""
 
-    # TODO: Write authorizer base class and solution
+    async def check_scopes(
+        auth: dict = Depends(authenticate_user, use_cache=True),
+    ) -> None:
+        missing = set(scopes).difference(auth["scopes"])
+        if missing:
+            raise forbidden(f"Missing scope: {' '.join(sorted(missing))}")
 
-    return {
-        "sub": "abc",
-        "tenant": "123"
-    }
\ No newline at end of file
+    return check_scopes
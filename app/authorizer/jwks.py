@@ -0,0 +1,95 @@
+"""
+Signing keys of the bearer tokens, parsed once from a JWKS document: inline
+(AUTH_JWKS), a file (AUTH_JWKS_FILE) or served over HTTP (AUTH_JWKS_URL).
+
+A token signed with a kid the set doesn't know reloads the document, so
+rotated keys are picked up without a restart. Reloads are at most one per
+refresh interval, tokens with made up kids can't hammer the key server.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import urllib.request
+from typing import Callable, Dict, Optional
+
+from jwt import PyJWK, PyJWKSet
+from jwt.exceptions import PyJWKSetError
+
+logger = logging.getLogger(__name__)
+
+
+class JwksKeySet(object):
+    def __init__(
+        self,
+        load: Callable[[], dict],
+        refresh_interval: float = 60,
+        max_age: float = 3600,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.load = load
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.clock = clock
+        self.keys: Dict[Optional[str], PyJWK] = {}
+        self.loaded_at: Optional[float] = None
+        self.attempted_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, kid: Optional[str]) -> Optional[PyJWK]:
+        expired = self.loaded_at is None or self.clock() - self.loaded_at > self.max_age
+        if expired or kid not in self.keys:
+            await self.refresh()
+        return self.keys.get(kid)
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            # Also true when another request reloaded while this one waited
+            now = self.clock()
+            if (
+                self.attempted_at is not None
+                and now - self.attempted_at < self.refresh_interval
+            ):
+                return
+            self.attempted_at = now
+
+            try:
+                document = await asyncio.to_thread(self.load)
+                keys = {key.key_id: key for key in PyJWKSet.from_dict(document).keys}
+            except (OSError, ValueError, PyJWKSetError) as e:
+                # Keeps verifying with the keys it has until the next attempt
+                logger.error(f"Loading the JWKS failed: {e}")
+                return
+
+            # Tokens without a kid are accepted when the set has a single key
+            if len(keys) == 1:
+                keys[None] = next(iter(keys.values()))
+            self.keys = keys
+            self.loaded_at = now
+            logger.info("Loaded %s JWKS keys", len(document.get("keys", ())))
+
+
+def jwks_loader(config) -> Optional[Callable[[], dict]]:
+    # None when no JWKS is configured
+    if config.auth_jwks:
+        document = json.loads(config.auth_jwks)
+        return lambda: document
+
+    if config.auth_jwks_file:
+
+        def load_file() -> dict:
+            with open(config.auth_jwks_file, encoding="utf-8") as jwks_file:
+                return json.load(jwks_file)
+
+        return load_file
+
+    if config.auth_jwks_url:
+
+        def load_url() -> dict:
+            with urllib.request.urlopen(config.auth_jwks_url, timeout=5) as response:
+                return json.load(response)
+
+        return load_url
+
+    return None
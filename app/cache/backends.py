@@ -0,0 +1,108 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+
+class CacheBackend(object):
+    """
+    Async key/value store with per entry TTL, None is never stored and always
+    means a miss
+    """
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Per worker LRU, bounded by entry count, expired entries are dropped when
+    they are read or pushed out by the LRU
+    """
+
+    def __init__(
+        self, max_entries: int = 10000, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.max_entries = max_entries
+        self.clock = clock
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (self.clock() + ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+class SharedCacheBackend(CacheBackend):
+    """
+    Cache shared by every worker through a redis style client (async get,
+    set with ex=, delete), values are stored as JSON
+    """
+
+    def __init__(self, client, prefix: str = "claim-app:") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self.client.set(
+            self.prefix + key, json.dumps(value), ex=max(1, int(ttl))
+        )
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*[self.prefix + key for key in keys])
+
+
+class LocalSharedCacheClient(object):
+    """
+    In process stand-in for the shared cache server, speaks the same client
+    calls SharedCacheBackend makes. Meant for tests and local runs.
+    """
+
+    def __init__(self, max_entries: int = 10000) -> None:
+        self._store = MemoryCacheBackend(max_entries=max_entries)
+
+    async def get(self, name: str) -> Optional[str]:
+        return await self._store.get(name)
+
+    async def set(self, name: str, value: str, ex: Optional[int] = None) -> bool:
+        await self._store.set(name, value, ttl=ex if ex is not None else float("inf"))
+        return True
+
+    async def delete(self, *names: str) -> int:
+        await self._store.delete(*names)
+        return len(names)
@@ -0,0 +1,165 @@
+"""
+Per worker cache of the identity lookups of claim ingest: provider NPI to
+provider_id and subscriber id to patient_id.
+
+Both mappings never change once a row exists, so entries don't expire, they
+are only bounded by an LRU. Ids resolved by an ingest are cached once its
+transaction commits, a rolled back insert never leaves an id behind.
+"""
+
+import logging
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import config
+from app.model.psql.orm import ClaimDetailModel, PatientModel, ProviderModel
+from app.telemetry.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Cached kinds, named after their tables
+PROVIDER = ProviderModel.__tablename__
+PATIENT = PatientModel.__tablename__
+
+# Session.info key of the identities resolved in the open transaction
+PENDING_IDENTITIES = "pending_identities"
+
+
+class IdentityCache(object):
+    def __init__(self, max_entries: int = 50000) -> None:
+        self.max_entries = max_entries
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+        self.evictions: Dict[str, int] = defaultdict(int)
+        self._entries: Dict[str, "OrderedDict[str, int]"] = defaultdict(OrderedDict)
+
+    def lookup(self, kind: str, keys: Iterable[str]) -> Tuple[Dict[str, int], Set[str]]:
+        # Returns the cached ids and the keys that still need the database
+        entries = self._entries[kind]
+        found, missing = {}, set()
+        for key in keys:
+            identity = entries.get(key)
+            if identity is None:
+                missing.add(key)
+            else:
+                entries.move_to_end(key)
+                found[key] = identity
+
+        self.hits[kind] += len(found)
+        self.misses[kind] += len(missing)
+        CACHE_LOOKUPS.labels(kind, "hit").inc(len(found))
+        CACHE_LOOKUPS.labels(kind, "miss").inc(len(missing))
+        return found, missing
+
+    def put(self, kind: str, identities: Dict[str, int]) -> None:
+        if self.max_entries <= 0:
+            return
+
+        entries = self._entries[kind]
+        entries.update(identities)
+        for key in identities:
+            entries.move_to_end(key)
+
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions[kind] += 1
+
+    def invalidate(self, kind: str, keys: Optional[Iterable[str]] = None) -> None:
+        # No keys drops the whole kind
+        if keys is None:
+            self._entries.pop(kind, None)
+            return
+
+        entries = self._entries[kind]
+        for key in keys:
+            entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            kind: {
+                "entries": len(self._entries[kind]),
+                "hits": self.hits[kind],
+                "misses": self.misses[kind],
+                "evictions": self.evictions[kind],
+                "hit_rate": self.hits[kind] / (self.hits[kind] + self.misses[kind])
+                if self.hits[kind] + self.misses[kind]
+                else 0.0,
+            }
+            for kind in (PROVIDER, PATIENT)
+        }
+
+
+identity_cache = IdentityCache(max_entries=config.identity_cache_max_entries)
+
+
+def remember_identities(
+    db_session: AsyncSession, kind: str, identities: Dict[str, int]
+) -> None:
+    # Held on the session until its transaction commits
+    db_session.sync_session.info.setdefault(PENDING_IDENTITIES, []).append(
+        (kind, identities)
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_identities(session: Session) -> None:
+    for kind, identities in session.info.pop(PENDING_IDENTITIES, ()):
+        identity_cache.put(kind, identities)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_uncommitted_identities(session: Session, transaction) -> None:
+    # Rolled back or closed, after_commit already took the committed ones
+    if transaction.parent is None:
+        session.info.pop(PENDING_IDENTITIES, None)
+
+
+async def warm_identity_cache(
+    db_session: AsyncSession, limit: int, days: int
+) -> Dict[str, int]:
+    """
+    Load the providers and patients with the most claim lines of the last
+    days into the cache. The service date bound keeps the scan to the most
+    recent claim_detail partitions.
+    """
+
+    since = datetime.now() - timedelta(days=days)
+    warmed = {}
+    for kind, key_column, id_column, detail_column in (
+        (
+            PROVIDER,
+            ProviderModel.npi,
+            ProviderModel.provider_id,
+            ClaimDetailModel.provider_id,
+        ),
+        (
+            PATIENT,
+            PatientModel.subscriber_id,
+            PatientModel.patient_id,
+            ClaimDetailModel.subscriber_id,
+        ),
+    ):
+        active = (
+            select(detail_column.label("id"), func.count().label("lines"))
+            .where(ClaimDetailModel.service_date >= since)
+            .group_by(detail_column)
+            .order_by(func.count().desc())
+            .limit(limit)
+            .subquery()
+        )
+        result = await db_session.execute(
+            select(key_column, id_column).join(active, active.c.id == id_column)
+        )
+        identities = dict(result.all())
+        identity_cache.put(kind, identities)
+        warmed[kind] = len(identities)
+
+    return warmed
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app import config
+from app.cache.backends import (
+    CacheBackend,
+    LocalSharedCacheClient,
+    MemoryCacheBackend,
+    SharedCacheBackend,
+)
+from app.telemetry.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Cached routes, keys of the per route TTLs
+CLAIM_ROUTE = "claim"
+TOP_PROVIDERS_ROUTE = "top_providers"
+
+
+class ResponseCache(object):
+    """
+    Read-through cache of route payloads.
+
+    A failing backend never fails a request, it only turns into a miss.
+    Concurrent misses on one key within a worker share a single load.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend], ttls: Dict[str, float]) -> None:
+        self.backend = backend
+        self.ttls = ttls
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def key(route: str, *parts) -> str:
+        return ":".join([route, *(str(part) for part in parts)])
+
+    async def get_or_load(
+        self, route: str, parts: tuple, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        ttl = self.ttls.get(route, 0)
+        if self.backend is None or ttl <= 0:
+            return await loader()
+
+        key = self.key(route, *parts)
+        value = await self._get(key)
+        if value is not None:
+            self.hits[route] += 1
+            CACHE_LOOKUPS.labels(route, "hit").inc()
+            return value
+
+        self.misses[route] += 1
+        CACHE_LOOKUPS.labels(route, "miss").inc()
+        while key in self._loading:
+            loading = self._loading[key]
+            try:
+                return await asyncio.shield(loading)
+            except asyncio.CancelledError:
+                # The leader was cancelled, e.g. its client went away: the first
+                # waiter to wake up loads instead. This request's own
+                # cancellation propagates.
+                if not loading.cancelled():
+                    raise
+
+        loading = self._loading[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await loader()
+            loading.set_result(value)
+        except asyncio.CancelledError:
+            loading.cancel()
+            raise
+        except Exception as e:
+            loading.set_exception(e)
+            # Waiters re-raise it, don't let asyncio warn it was never retrieved
+            loading.exception()
+            raise
+        finally:
+            del self._loading[key]
+
+        if value is not None:
+            await self._set(key, value, ttl)
+
+        return value
+
+    async def invalidate(self, route: str, *parts) -> None:
+        if self.backend is None:
+            return
+
+        try:
+            await self.backend.delete(self.key(route, *parts))
+        except Exception as e:
+            logger.warning(f"Cache invalidation of {route} failed: {e}")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            route: {
+                "hits": self.hits[route],
+                "misses": self.misses[route],
+                "hit_rate": self.hits[route] / (self.hits[route] + self.misses[route])
+                if self.hits[route] + self.misses[route]
+                else 0.0,
+            }
+            for route in self.ttls
+        }
+
+    async def _get(self, key: str) -> Optional[Any]:
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Cache read of {key} failed: {e}")
+            return None
+
+    async def _set(self, key: str, value: Any, ttl: float) -> None:
+        try:
+            await self.backend.set(key, value, ttl)
+        except Exception as e:
+            logger.warning(f"Cache write of {key} failed: {e}")
+
+
+def initialize_cache_backend() -> Optional[CacheBackend]:
+    if config.cache_backend == "none":
+        return None
+
+    if config.cache_backend == "memory":
+        return MemoryCacheBackend(max_entries=config.cache_max_entries)
+
+    if config.cache_backend == "shared":
+        if config.cache_url is None:
+            # Same client protocol as the shared server, only visible to this worker
+            logger.warning(
+                "CACHE_URL is not set, using the local shared cache stand-in"
+            )
+            client = LocalSharedCacheClient(max_entries=config.cache_max_entries)
+        else:
+            try:
+                from redis import asyncio as redis
+            except ImportError:
+                raise RuntimeError("CACHE_BACKEND=shared requires the redis package")
+            client = redis.from_url(config.cache_url)
+        return SharedCacheBackend(client=client)
+
+    raise RuntimeError(f"Unknown CACHE_BACKEND {config.cache_backend}")
+
+
+response_cache = ResponseCache(
+    backend=initialize_cache_backend(),
+    ttls={
+        CLAIM_ROUTE: config.cache_ttl_claim,
+        TOP_PROVIDERS_ROUTE: config.cache_ttl_top_providers,
+    },
+)
@@ -13,10 +13,195 @@ class Config(object):
             self.disable_existing_logger = json.loads(
                 environ.get("DISABLE_EXISTING_LOGGER", "false")
             )
+            # text or json lines, records are written by a background thread
+            # unless LOG_QUEUE_SIZE is 0
+            self.log_format = environ.get("LOG_FORMAT", "text")
+            self.log_queue_size = int(environ.get("LOG_QUEUE_SIZE", "10000"))
+            # logger=fraction and logger=records per second, comma separated
+            self.log_sampling = environ.get("LOG_SAMPLING")
+            self.log_rate_limits = environ.get("LOG_RATE_LIMITS")
             self.cors_allowed_origin = environ.get("CORS_ALLOWED_ORIGIN", "*")
             self.cors_allowed_headers = environ.get("CORS_ALLOWED_HEADERS", "*")
             self.cors_allowed_methods = environ.get("CORS_ALLOWED_METHODS", "*")
 
             self.postgres_conn_url = environ["DATABASE_URL"]
+            # Log every SQL statement, off by default
+            self.database_echo = json.loads(
+                environ.get("DATABASE_ECHO", "false").lower()
+            )
+            self.postgres_pool_size = int(environ.get("DATABASE_POOL_SIZE", "10"))
+            self.postgres_max_overflow = int(
+                environ.get("DATABASE_MAX_OVERFLOW", "20")
+            )
+            self.postgres_pool_timeout = int(environ.get("DATABASE_POOL_TIMEOUT", "30"))
+            self.postgres_pool_recycle = int(
+                environ.get("DATABASE_POOL_RECYCLE", "1800")
+            )
+            self.postgres_pool_pre_ping = json.loads(
+                environ.get("DATABASE_POOL_PRE_PING", "true").lower()
+            )
+
+            # Comma separated replicas of DATABASE_URL serving the read only
+            # claim routes, left out while more than MAX_LAG seconds behind
+            self.postgres_replica_urls = environ.get("DATABASE_REPLICA_URLS")
+            self.postgres_replica_max_lag = float(
+                environ.get("DATABASE_REPLICA_MAX_LAG", "5")
+            )
+            self.postgres_replica_check_interval = float(
+                environ.get("DATABASE_REPLICA_CHECK_INTERVAL", "2")
+            )
+            # Reads of a client that wrote go to the primary for this long
+            self.postgres_replica_sticky_seconds = float(
+                environ.get("DATABASE_REPLICA_STICKY_SECONDS", "10")
+            )
+
+            self.claim_import_chunk_size = int(
+                environ.get("CLAIM_IMPORT_CHUNK_SIZE", "500")
+            )
+            self.claim_import_max_errors = int(
+                environ.get("CLAIM_IMPORT_MAX_ERRORS", "1000")
+            )
+            self.claim_batch_max_ids = int(environ.get("CLAIM_BATCH_MAX_IDS", "100"))
+            # Claim lists of at least this many lines are validated column-wise
+            self.claim_columnar_threshold = int(
+                environ.get("CLAIM_COLUMNAR_THRESHOLD", "200")
+            )
+
+            # direct: a transaction per POST /v1/claims/, group: requests wait
+            # for a shared group commit, accepted: 202 and a ticket right away
+            self.claim_ingest_mode = environ.get("CLAIM_INGEST_MODE", "direct")
+            self.claim_group_commit_max_claims = int(
+                environ.get("CLAIM_GROUP_COMMIT_MAX_CLAIMS", "50")
+            )
+            self.claim_group_commit_max_wait_ms = float(
+                environ.get("CLAIM_GROUP_COMMIT_MAX_WAIT_MS", "5")
+            )
+            self.claim_group_commit_max_pending = int(
+                environ.get("CLAIM_GROUP_COMMIT_MAX_PENDING", "5000")
+            )
+            self.claim_group_commit_writers = int(
+                environ.get("CLAIM_GROUP_COMMIT_WRITERS", "2")
+            )
+
+            # memory: per worker LRU, shared: CACHE_URL server, none: disabled
+            self.cache_backend = environ.get("CACHE_BACKEND", "memory")
+            self.cache_url = environ.get("CACHE_URL")
+            self.cache_max_entries = int(environ.get("CACHE_MAX_ENTRIES", "10000"))
+            self.cache_ttl_claim = float(environ.get("CACHE_TTL_CLAIM", "300"))
+            self.cache_ttl_top_providers = float(
+                environ.get("CACHE_TTL_TOP_PROVIDERS", "10")
+            )
+
+            # Bearer JWTs are verified against the JWKS, inline, from a file or
+            # an URL. Without one the dev and test environments skip verification
+            self.auth_jwks = environ.get("AUTH_JWKS")
+            self.auth_jwks_file = environ.get("AUTH_JWKS_FILE")
+            self.auth_jwks_url = environ.get("AUTH_JWKS_URL")
+            self.auth_allow_unverified = json.loads(
+                environ.get(
+                    "AUTH_ALLOW_UNVERIFIED",
+                    str(self.environment in ("dev", "test")),
+                ).lower()
+            )
+            self.auth_jwks_refresh_interval = float(
+                environ.get("AUTH_JWKS_REFRESH_INTERVAL", "60")
+            )
+            self.auth_jwks_max_age = float(environ.get("AUTH_JWKS_MAX_AGE", "3600"))
+            self.auth_algorithms = environ.get("AUTH_ALGORITHMS", "RS256,ES256")
+            self.auth_audience = environ.get("AUTH_AUDIENCE")
+            self.auth_issuer = environ.get("AUTH_ISSUER")
+            self.auth_tenant_claim = environ.get("AUTH_TENANT_CLAIM", "tenant")
+            # Comma separated, any tenant when unset
+            self.auth_tenants = environ.get("AUTH_TENANTS")
+            self.auth_token_cache_size = int(
+                environ.get("AUTH_TOKEN_CACHE_SIZE", "10000")
+            )
+            self.auth_token_cache_ttl = float(
+                environ.get("AUTH_TOKEN_CACHE_TTL", "300")
+            )
+
+            # Token buckets of RATE_LIMITS (route=count/period, comma separated)
+            # in postgres (shared by the workers), local (per worker) or none
+            self.rate_limit_backend = environ.get(
+                "RATE_LIMIT_BACKEND",
+                "postgres"
+                if self.postgres_conn_url.startswith("postgresql")
+                else "local",
+            )
+            self.rate_limits = environ.get("RATE_LIMITS", "top_providers=10/minute")
+            self.rate_limit_lease_fraction = float(
+                environ.get("RATE_LIMIT_LEASE_FRACTION", "0.1")
+            )
+            self.rate_limit_lease_seconds = float(
+                environ.get("RATE_LIMIT_LEASE_SECONDS", "1")
+            )
+
+            # Payment events go through the payment_outbox table, the dispatcher
+            # publishes them to PAYMENT_SINK (file or memory)
+            self.payment_dispatcher_enabled = json.loads(
+                environ.get("PAYMENT_DISPATCHER_ENABLED", "true").lower()
+            )
+            self.payment_sink = environ.get("PAYMENT_SINK", "file")
+            self.payment_sink_path = environ.get(
+                "PAYMENT_SINK_PATH", "payment-events.jsonl"
+            )
+            self.payment_outbox_batch_size = int(
+                environ.get("PAYMENT_OUTBOX_BATCH_SIZE", "100")
+            )
+            self.payment_outbox_poll_interval = float(
+                environ.get("PAYMENT_OUTBOX_POLL_INTERVAL", "1")
+            )
+            self.payment_outbox_max_attempts = int(
+                environ.get("PAYMENT_OUTBOX_MAX_ATTEMPTS", "10")
+            )
+            self.payment_outbox_backoff_base = float(
+                environ.get("PAYMENT_OUTBOX_BACKOFF_BASE", "1")
+            )
+            self.payment_outbox_backoff_max = float(
+                environ.get("PAYMENT_OUTBOX_BACKOFF_MAX", "300")
+            )
+
+            # Per worker NPI/subscriber id cache of the ingest, 0 disables it
+            self.identity_cache_max_entries = int(
+                environ.get("IDENTITY_CACHE_MAX_ENTRIES", "50000")
+            )
+            self.identity_cache_warm_size = int(
+                environ.get("IDENTITY_CACHE_WARM_SIZE", "1000")
+            )
+            self.identity_cache_warm_days = int(
+                environ.get("IDENTITY_CACHE_WARM_DAYS", "90")
+            )
+
+            # GET /health/ready reports the last background ping of the database
+            self.readiness_ping_interval = float(
+                environ.get("READINESS_PING_INTERVAL", "5")
+            )
+            self.readiness_ping_timeout = float(
+                environ.get("READINESS_PING_TIMEOUT", "2")
+            )
+
+            # Monthly claim_detail partitions kept ready beyond the current month
+            self.claim_detail_partition_months_ahead = int(
+                environ.get("CLAIM_DETAIL_PARTITION_MONTHS_AHEAD", "3")
+            )
+
+            # Per request SQL/validate/serialize profile, on by default in dev only
+            self.profiling_enabled = json.loads(
+                environ.get(
+                    "PROFILING_ENABLED", str(self.environment == "dev")
+                ).lower()
+            )
+            self.server_timing_enabled = json.loads(
+                environ.get("SERVER_TIMING_ENABLED", str(self.profiling_enabled)).lower()
+            )
+            self.profiling_slow_query_ms = float(
+                environ.get("PROFILING_SLOW_QUERY_MS", "500")
+            )
+            self.profiling_explain_slow_queries = json.loads(
+                environ.get("PROFILING_EXPLAIN_SLOW_QUERIES", "true").lower()
+            )
+            self.profiling_repeated_query_threshold = int(
+                environ.get("PROFILING_REPEATED_QUERY_THRESHOLD", "5")
+            )
         except KeyError as e:
             raise RuntimeError(f"Environment variable {e} is missing")
\ No newline at end of file
@@ -0,0 +1,276 @@
+"""
+Column oriented validation of large claim lists.
+
+The JSON claim list is transposed into one list per Claim field and every
+rule of the Claim model runs once per column with C level builtins (map,
+str methods, operator) instead of once per object. Only a column that fails
+its fast check is walked row by row to find the failing positions.
+"""
+
+from datetime import datetime
+from operator import add, itemgetter, methodcaller, sub
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from app.model.api.claims import (
+    SERVICE_DATE_ERROR,
+    Claim,
+    parse_cents,
+    parse_service_date_text,
+)
+
+# Claim field name -> JSON key (the claim file header)
+CLAIM_FIELD_ALIASES = {name: field.alias for name, field in Claim.model_fields.items()}
+MONEY_FIELDS = (
+    "provider_fees_cents",
+    "allowed_fees_cents",
+    "member_co_insurance_cents",
+    "member_co_pay_cents",
+)
+NUMERIC_STRING_FIELDS = ("subscriber", "npi")
+
+STR_MAX_LENGTH = Claim.model_config["str_max_length"]
+
+
+class ClaimBatch(NamedTuple):
+    service_date: List[str]
+    submitted_procedure: List[str]
+    quadrant: List[Optional[str]]
+    group: List[str]
+    subscriber: List[str]
+    npi: List[str]
+    provider_fees_cents: List[int]
+    allowed_fees_cents: List[int]
+    member_co_insurance_cents: List[int]
+    member_co_pay_cents: List[int]
+
+    @classmethod
+    def from_claims(cls, claims: List[Claim]) -> "ClaimBatch":
+        if not claims:
+            return cls(*([] for _ in cls._fields))
+
+        return cls(
+            *(
+                list(column)
+                for column in zip(*map(itemgetter(*cls._fields), map(vars, claims)))
+            )
+        )
+
+    @property
+    def lines(self) -> int:
+        return len(self.npi)
+
+    def net_fees_cents(self) -> List[int]:
+        # net fee = provider fees + member coinsurance + member copay - allowed fees
+        return list(
+            map(
+                sub,
+                map(
+                    add,
+                    map(add, self.provider_fees_cents, self.member_co_insurance_cents),
+                    self.member_co_pay_cents,
+                ),
+                self.allowed_fees_cents,
+            )
+        )
+
+
+def parse_service_dates(service_dates: List[str]) -> List[datetime]:
+    # A claim list spans a handful of service dates, parse each one once
+    parsed = {value: parse_service_date_text(value) for value in set(service_dates)}
+    return list(map(parsed.__getitem__, service_dates))
+
+
+def _error(index: int, field: str, error_type: str, msg: str, value: Any) -> dict:
+    # Same shape as the pydantic errors of the per object path
+    loc = (index,) if field is None else (index, CLAIM_FIELD_ALIASES[field])
+    return {"type": error_type, "loc": loc, "msg": msg, "input": value}
+
+
+def _transpose(items: List[Any]) -> Tuple[Optional[List[tuple]], List[dict]]:
+    getter = itemgetter(*CLAIM_FIELD_ALIASES.values())
+    try:
+        return list(zip(*map(getter, items))), []
+    except (KeyError, TypeError):
+        pass
+
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append(
+                _error(
+                    index, None, "dict_type", "Input should be a valid dictionary", item
+                )
+            )
+            continue
+
+        for field, alias in CLAIM_FIELD_ALIASES.items():
+            if alias not in item:
+                errors.append(_error(index, field, "missing", "Field required", item))
+
+    return None, errors
+
+
+def _validate_strings(field: str, column: tuple, optional: bool = False) -> List[dict]:
+    types = set(map(type, column))
+    allowed = {str, type(None)} if optional else {str}
+    if types <= allowed and (
+        str not in types
+        or max(map(len, filter(None, column)), default=0) <= STR_MAX_LENGTH
+    ):
+        return []
+
+    errors = []
+    for index, value in enumerate(column):
+        if value is None and optional:
+            continue
+        if not isinstance(value, str):
+            errors.append(
+                _error(
+                    index, field, "string_type", "Input should be a valid string", value
+                )
+            )
+        elif len(value) > STR_MAX_LENGTH:
+            errors.append(
+                _error(
+                    index,
+                    field,
+                    "string_too_long",
+                    f"String should have at most {STR_MAX_LENGTH} characters",
+                    value,
+                )
+            )
+
+    return errors
+
+
+def _coerce_numbers(column: tuple) -> tuple:
+    if set(map(type, column)) <= {str}:
+        return column
+
+    # coerce_numbers_to_str on the Claim fields, bool is not a number there
+    return tuple(
+        str(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+        else value
+        for value in column
+    )
+
+
+def _invalid_service_dates(column: tuple) -> List[dict]:
+    # Distinct dates only, a claim list repeats a handful of them
+    invalid = set()
+    for value in set(column):
+        try:
+            parse_service_date_text(value)
+        except ValueError:
+            invalid.add(value)
+
+    return [
+        _error(
+            index,
+            "service_date",
+            "value_error",
+            f"Value error, {SERVICE_DATE_ERROR}",
+            value,
+        )
+        for index, value in enumerate(column)
+        if value in invalid
+    ]
+
+
+def _parse_money(field: str, column: tuple) -> Tuple[Optional[List[int]], List[dict]]:
+    try:
+        return list(map(parse_cents, column)), []
+    except ValueError:
+        pass
+
+    # Column holds strings only by now, find the ones parse_cents rejects
+    alias = CLAIM_FIELD_ALIASES[field]
+    errors = []
+    for index, value in enumerate(column):
+        try:
+            parse_cents(value)
+        except ValueError:
+            errors.append(
+                _error(
+                    index,
+                    field,
+                    "value_error",
+                    f"Value error, {alias} must be always e.g., '$10.00'",
+                    value,
+                )
+            )
+
+    return None, errors
+
+
+def validate_claim_batch(items: Any) -> Tuple[Optional[ClaimBatch], List[dict]]:
+    """
+    Validate a JSON claim list with the rules of the Claim model. Returns the
+    batch, or None and pydantic style errors located by (row, JSON key).
+    """
+
+    if not isinstance(items, list):
+        return None, [
+            {
+                "type": "list_type",
+                "loc": (),
+                "msg": "Input should be a valid list",
+                "input": items,
+            }
+        ]
+
+    if not items:
+        return ClaimBatch.from_claims([]), []
+
+    rows, errors = _transpose(items)
+    if rows is None:
+        return None, errors
+
+    columns = dict(zip(CLAIM_FIELD_ALIASES, rows))
+    for field in NUMERIC_STRING_FIELDS:
+        columns[field] = _coerce_numbers(columns[field])
+
+    for field, column in columns.items():
+        errors.extend(_validate_strings(field, column, optional=field == "quadrant"))
+    if errors:
+        return None, sorted(errors, key=itemgetter("loc"))
+
+    errors.extend(_invalid_service_dates(columns["service_date"]))
+
+    procedures = columns["submitted_procedure"]
+    if not all(map(methodcaller("startswith", "D"), procedures)):
+        errors.extend(
+            _error(
+                index,
+                "submitted_procedure",
+                "value_error",
+                "Value error, submitted procedure must start with D always",
+                value,
+            )
+            for index, value in enumerate(procedures)
+            if not value.startswith("D")
+        )
+
+    npis = columns["npi"]
+    if set(map(len, npis)) != {10} or not all(map(str.isdigit, npis)):
+        errors.extend(
+            _error(
+                index,
+                "npi",
+                "value_error",
+                "Value error, Provider NPI must be always 10 digit integer value",
+                value,
+            )
+            for index, value in enumerate(npis)
+            if len(value) != 10 or not value.isdigit()
+        )
+
+    for field in MONEY_FIELDS:
+        columns[field], money_errors = _parse_money(field, columns[field])
+        errors.extend(money_errors)
+
+    if errors:
+        return None, sorted(errors, key=itemgetter("loc"))
+
+    return ClaimBatch(**{field: list(column) for field, column in columns.items()}), []
@@ -0,0 +1,157 @@
+import codecs
+import csv
+import logging
+from typing import AsyncIterable, AsyncIterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ingest.engine import ClaimIngestEngine
+from app.model.api.claims import Claim, ClaimImportResponseModel, ClaimImportRowError
+
+logger = logging.getLogger(__name__)
+
+# CSV header of a claim file, e.g. claim_1234.csv, is the Claim field aliases
+CLAIM_CSV_COLUMNS = [field.alias for field in Claim.model_fields.values()]
+
+
+class ClaimImportError(ValueError):
+    pass
+
+
+async def iter_csv_records(
+    chunks: AsyncIterable[bytes],
+) -> AsyncIterator[List[Tuple[int, List[str]]]]:
+    """
+    Decode a byte stream into batches of (line number, CSV record) as the bytes
+    arrive, only the trailing partial line is held between chunks
+    """
+
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    line_number = 0
+
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+
+        if lines:
+            numbered = range(line_number + 1, line_number + len(lines) + 1)
+            line_number += len(lines)
+            yield [
+                (number, record)
+                for number, record in zip(numbered, csv.reader(lines))
+                if record
+            ]
+
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield [(line_number + 1, record) for record in csv.reader([pending]) if record]
+
+
+def validate_claim_header(record: List[str]) -> List[str]:
+    header = [column.strip() for column in record]
+    missing = [column for column in CLAIM_CSV_COLUMNS if column not in header]
+    if missing:
+        raise ClaimImportError(f"Claim file is missing columns: {missing}")
+
+    return header
+
+
+def validate_claim_record(
+    header: List[str], record: List[str]
+) -> Tuple[Optional[Claim], List[str]]:
+    if len(record) != len(header):
+        return None, [f"Expected {len(header)} columns, got {len(record)}"]
+
+    values = dict(zip(header, record))
+    # Empty CSV cell is a missing quadrant, same as null in the JSON API
+    if not values["quadrant"].strip():
+        values["quadrant"] = None
+
+    try:
+        return Claim.model_validate(values), []
+    except ValidationError as e:
+        return None, [
+            f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+            for error in e.errors()
+        ]
+
+
+class ClaimCsvImporter(object):
+    """
+    Validates claim file rows with the Claim model and writes the valid ones
+    through the ingest engine chunk by chunk, invalid rows end up in the report.
+    """
+
+    def __init__(
+        self, db_session: AsyncSession, chunk_size: int = 500, max_errors: int = 1000
+    ) -> None:
+        self.ingest_engine = ClaimIngestEngine(db_session=db_session)
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+
+        self.claim_row: Optional[Row] = None
+        self.imported_count = 0
+        self.rejected_count = 0
+        self.errors: List[ClaimImportRowError] = []
+
+    async def run(self, chunks: AsyncIterable[bytes]) -> ClaimImportResponseModel:
+        header = None
+        batch: List[Claim] = []
+
+        async for records in iter_csv_records(chunks):
+            for line_number, record in records:
+                if header is None:
+                    header = validate_claim_header(record)
+                    continue
+
+                claim, messages = validate_claim_record(header, record)
+                if claim is None:
+                    self._reject(line_number, messages)
+                else:
+                    batch.append(claim)
+
+                if len(batch) >= self.chunk_size:
+                    await self._write(batch)
+                    batch = []
+
+        if header is None:
+            raise ClaimImportError("Claim file is empty")
+
+        await self._write(batch)
+        if self.claim_row is not None:
+            await self.ingest_engine.enqueue_payment_event(
+                claim_id=self.claim_row.claim_id
+            )
+
+        logger.info(
+            f"Imported claim file imported:{self.imported_count} rejected:{self.rejected_count}"
+        )
+        return ClaimImportResponseModel(
+            claimId=self.claim_row.claim_id if self.claim_row else None,
+            createdAt=self.claim_row.created.isoformat() if self.claim_row else None,
+            updatedAt=self.claim_row.updated.isoformat() if self.claim_row else None,
+            importedCount=self.imported_count,
+            rejectedCount=self.rejected_count,
+            errors=self.errors,
+        )
+
+    def _reject(self, line_number: int, messages: List[str]) -> None:
+        self.rejected_count += 1
+        # The report is capped so a fully broken file can't grow it unbounded
+        if len(self.errors) < self.max_errors:
+            self.errors.append(ClaimImportRowError(row=line_number, errors=messages))
+
+    async def _write(self, batch: List[Claim]) -> None:
+        if not batch:
+            return
+
+        if self.claim_row is None:
+            self.claim_row = await self.ingest_engine.create_claim()
+
+        self.imported_count += await self.ingest_engine.insert_claim_lines(
+            claim_id=self.claim_row.claim_id, claims=batch
+        )
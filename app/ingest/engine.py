@@ -0,0 +1,284 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple, Union
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache.identity import identity_cache, remember_identities
+from app.ingest.batch import ClaimBatch, parse_service_dates
+from app.ingest.rollup import sum_net_fees_by_provider, upsert_provider_net_fee_totals
+from app.model.api.claims import Claim, parse_service_date_text
+from app.outbox.store import enqueue_claim_processed, enqueue_claims_processed
+from app.model.psql.orm import (
+    ClaimDetailModel,
+    ClaimIngestTicketModel,
+    ClaimModel,
+    PatientModel,
+    ProviderModel,
+)
+
+logger = logging.getLogger(__name__)
+
+# asyncpg caps a statement at 32767 bind params, claim_detail inserts bind 12 per line
+CLAIM_DETAIL_INSERT_CHUNK = 1000
+
+
+def calculate_net_fee(claim: Claim) -> int:
+    # net fee formula
+    # *“net fee” = “provider fees” + “member coinsurance” + “member copay” - “Allowed fees”* (note again that the names are not consistent in capitalization).
+    # All amounts are integer cents so the result is exact
+    net_fees_cents = (
+        claim.provider_fees_cents
+        + claim.member_co_insurance_cents
+        + claim.member_co_pay_cents
+    ) - claim.allowed_fees_cents
+
+    # Lazy %-args, runs once per claim line and is formatted only when enabled
+    logger.debug("Claim:%s net_fees_cents:%s", claim.submitted_procedure, net_fees_cents)
+
+    return net_fees_cents
+
+
+def parse_service_date(claim: Claim) -> datetime:
+    # asyncpg binds TIMESTAMP params from datetime only, claim files carry "3/28/18 0:00"
+    return parse_service_date_text(claim.service_date)
+
+
+class ClaimIngestEngine(object):
+    """
+    Writes a claim batch with set based statements on the caller's session.
+
+    Nothing is committed here, the caller owns the transaction so the claim,
+    its providers/patients and lines land (or roll back) together.
+    """
+
+    def __init__(self, db_session: AsyncSession) -> None:
+        self.db_session = db_session
+
+    async def ingest(self, claims: Union[List[Claim], ClaimBatch]) -> Row:
+        return (await self.ingest_many([claims]))[0]
+
+    async def ingest_many(
+        self, claims_list: List[Union[List[Claim], ClaimBatch]]
+    ) -> List[Row]:
+        """
+        Claims of several requests in one go, one claim row each. Their lines,
+        providers/patients, rollup and payment events share the statements.
+        """
+
+        claim_rows = await self.create_claims(len(claims_list))
+        await self.insert_claims_lines(
+            [
+                (claim_row.claim_id, claims)
+                for claim_row, claims in zip(claim_rows, claims_list)
+            ]
+        )
+        await enqueue_claims_processed(
+            db_session=self.db_session,
+            claim_ids=[claim_row.claim_id for claim_row in claim_rows],
+        )
+
+        return claim_rows
+
+    async def create_claim(self) -> Row:
+        result = await self.db_session.execute(
+            insert(ClaimModel).returning(
+                ClaimModel.claim_id, ClaimModel.created, ClaimModel.updated
+            )
+        )
+        return result.one()
+
+    async def create_claims(self, count: int) -> List[Row]:
+        # One INSERT ... SELECT FROM generate_series for the whole group, rows
+        # in claim_id order so the group's claims get ids in submission order
+        if count == 1:
+            return [await self.create_claim()]
+
+        result = await self.db_session.execute(
+            insert(ClaimModel)
+            .from_select(
+                [ClaimModel.created.name],
+                select(func.now()).select_from(func.generate_series(1, count)),
+            )
+            .returning(ClaimModel.claim_id, ClaimModel.created, ClaimModel.updated)
+        )
+        return sorted(result.all(), key=lambda claim_row: claim_row.claim_id)
+
+    async def enqueue_payment_event(self, claim_id: int) -> None:
+        # Outbox row instead of publishing here, the event can't exist without
+        # the committed claim nor get lost after it
+        await enqueue_claim_processed(db_session=self.db_session, claim_id=claim_id)
+
+    async def record_tickets(self, tickets: Dict[str, int]) -> None:
+        # Claim ids of tickets issued by the group commit writer
+        await self.db_session.execute(
+            insert(ClaimIngestTicketModel).values(
+                [
+                    {"ticket": ticket, "claim_id": claim_id}
+                    for ticket, claim_id in tickets.items()
+                ]
+            )
+        )
+
+    async def record_failed_ticket(self, ticket: str, error: str) -> None:
+        await self.db_session.execute(
+            insert(ClaimIngestTicketModel).values(ticket=ticket, error=error)
+        )
+
+    async def purge_tickets(self, retention_seconds: float) -> None:
+        await self.db_session.execute(
+            delete(ClaimIngestTicketModel).where(
+                ClaimIngestTicketModel.created
+                < func.now() - timedelta(seconds=retention_seconds)
+            )
+        )
+
+    async def insert_claim_lines(
+        self, claim_id: int, claims: Union[List[Claim], ClaimBatch]
+    ) -> int:
+        return await self.insert_claims_lines([(claim_id, claims)])
+
+    async def insert_claims_lines(
+        self, claims_by_id: List[Tuple[int, Union[List[Claim], ClaimBatch]]]
+    ) -> int:
+        # Lines are built column-wise, a list of Claim objects is transposed first
+        batches = [
+            (
+                claim_id,
+                claims
+                if isinstance(claims, ClaimBatch)
+                else ClaimBatch.from_claims(claims),
+            )
+            for claim_id, claims in claims_by_id
+        ]
+        batches = [(claim_id, claims) for claim_id, claims in batches if claims.lines]
+        if not batches:
+            return 0
+
+        provider_ids = await self.upsert_providers(
+            {npi for _, claims in batches for npi in claims.npi}
+        )
+        patient_ids = await self.upsert_patients(
+            {subscriber for _, claims in batches for subscriber in claims.subscriber}
+        )
+
+        claims_details = [
+            {
+                "claim_id": claim_id,
+                "subscriber_id": patient_ids[subscriber],
+                "provider_id": provider_ids[npi],
+                "service_date": service_date,
+                "submitted_procedure": submitted_procedure,
+                "quadrant": quadrant,
+                "group": group,
+                "provider_fees_cents": provider_fees_cents,
+                "allowed_fees_cents": allowed_fees_cents,
+                "member_co_insurance_cents": member_co_insurance_cents,
+                "member_co_pay_cents": member_co_pay_cents,
+                "net_fees_cents": net_fees_cents,
+            }
+            for claim_id, claims in batches
+            for (
+                service_date,
+                submitted_procedure,
+                quadrant,
+                group,
+                subscriber,
+                npi,
+                provider_fees_cents,
+                allowed_fees_cents,
+                member_co_insurance_cents,
+                member_co_pay_cents,
+                net_fees_cents,
+            ) in zip(
+                parse_service_dates(claims.service_date),
+                claims.submitted_procedure,
+                claims.quadrant,
+                claims.group,
+                claims.subscriber,
+                claims.npi,
+                claims.provider_fees_cents,
+                claims.allowed_fees_cents,
+                claims.member_co_insurance_cents,
+                claims.member_co_pay_cents,
+                claims.net_fees_cents(),
+            )
+        ]
+
+        # Multi row VALUES insert, one statement per chunk instead of an ORM flush per line
+        try:
+            for i in range(0, len(claims_details), CLAIM_DETAIL_INSERT_CHUNK):
+                await self.db_session.execute(
+                    insert(ClaimDetailModel).values(
+                        claims_details[i : i + CLAIM_DETAIL_INSERT_CHUNK]
+                    )
+                )
+        except IntegrityError:
+            # A cached id whose row is gone fails the foreign keys, resolve these
+            # keys from the database again on the next attempt
+            identity_cache.invalidate(ProviderModel.__tablename__, provider_ids)
+            identity_cache.invalidate(PatientModel.__tablename__, patient_ids)
+            raise
+
+        # Keep the top providers rollup in step with the lines just written
+        await self.db_session.execute(
+            upsert_provider_net_fee_totals(
+                sum_net_fees_by_provider(
+                    (detail["provider_id"], detail["net_fees_cents"])
+                    for detail in claims_details
+                )
+            )
+        )
+
+        return len(claims_details)
+
+    async def upsert_providers(self, npis) -> Dict[str, int]:
+        return await self._upsert_identities(
+            ProviderModel, ProviderModel.npi, ProviderModel.provider_id, npis
+        )
+
+    async def upsert_patients(self, subscriber_ids) -> Dict[str, int]:
+        return await self._upsert_identities(
+            PatientModel, PatientModel.subscriber_id, PatientModel.patient_id, subscriber_ids
+        )
+
+    async def _upsert_identities(self, model, key_column, id_column, keys) -> Dict[str, int]:
+        # Providers and patients seen before resolve from the worker's cache
+        cached, keys = identity_cache.lookup(model.__tablename__, set(keys))
+        if not keys:
+            return cached
+
+        # One statement resolves new and existing rows:
+        # WITH inserted AS (INSERT ... ON CONFLICT DO NOTHING RETURNING ...)
+        # SELECT ... FROM inserted UNION ALL SELECT ... FROM <table> WHERE key IN (...)
+        # DO NOTHING (rather than a no-op DO UPDATE) keeps hot provider rows from
+        # being rewritten and locked on every claim. Keys go in sorted order, set
+        # order differs per worker and concurrent inserts of the same new keys in
+        # opposite orders would deadlock on each other's index entries.
+        inserted = (
+            pg_insert(model)
+            .values([{key_column.name: key} for key in sorted(keys)])
+            .on_conflict_do_nothing(index_elements=[key_column])
+            .returning(key_column, id_column)
+            .cte(f"inserted_{model.__tablename__}")
+        )
+        stmt = select(inserted.c[key_column.name], inserted.c[id_column.name]).union_all(
+            select(key_column, id_column).where(key_column.in_(keys))
+        )
+        identities = dict((await self.db_session.execute(stmt)).all())
+
+        # A row committed by a concurrent ingest after this statement's snapshot
+        # conflicts on insert but isn't visible to the select, fetch it again
+        missing = keys - identities.keys()
+        if missing:
+            result = await self.db_session.execute(
+                select(key_column, id_column).where(key_column.in_(missing))
+            )
+            identities.update(result.all())
+
+        remember_identities(self.db_session, model.__tablename__, identities)
+        return {**identities, **cached}
@@ -0,0 +1,239 @@
+"""
+Group commit of POST /v1/claims/ (CLAIM_INGEST_MODE group or accepted).
+
+Requests hand their validated claims to the worker's writer instead of
+running a transaction each. The writer takes up to max_claims claims, waiting
+at most max_wait seconds for more, and writes them with one set of statements
+in one transaction: one commit, one WAL flush, for the whole group.
+
+In group mode the request waits for the commit of its group and answers as
+usual. In accepted mode it answers 202 right away with a ticket, the outcome
+lands in claim_ingest_ticket with the group's transaction (or on its own
+after a failure) where any worker can report it.
+
+A group that fails is written again one claim per transaction, so a bad
+claim only fails itself.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Callable, List, NamedTuple, Optional, Union
+
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import config, start_database
+from app.cache.response import TOP_PROVIDERS_ROUTE, response_cache
+from app.ingest.batch import ClaimBatch
+from app.ingest.engine import ClaimIngestEngine
+from app.model.api.claims import Claim
+from app.telemetry.metrics import (
+    CLAIM_LINES_INGESTED,
+    GROUP_COMMIT_CLAIMS,
+    GROUP_COMMIT_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+# Unknown tickets issued longer ago than this are reported lost, not pending
+TICKET_PENDING_SECONDS = 300
+# claim_ingest_ticket rows are purged after this many seconds, once an hour
+TICKET_RETENTION_SECONDS = 86400
+TICKET_PURGE_INTERVAL = 3600
+
+
+def new_ticket(clock: Callable[[], float] = time.time) -> str:
+    # Milliseconds of the issue time, then random bits, 32 hex digits
+    return f"{int(clock() * 1000):012x}{uuid.uuid4().hex[:20]}"
+
+
+def ticket_issued_at(ticket: str) -> float:
+    return int(ticket[:12], 16) / 1000
+
+
+class WriterBusy(Exception):
+    pass
+
+
+class PendingClaim(NamedTuple):
+    claims: Union[List[Claim], ClaimBatch]
+    # Resolved with the claim row of a waiting request (group mode)
+    future: Optional[asyncio.Future]
+    # Reported through claim_ingest_ticket (accepted mode)
+    ticket: Optional[str]
+
+    @property
+    def lines(self) -> int:
+        return (
+            self.claims.lines
+            if isinstance(self.claims, ClaimBatch)
+            else len(self.claims)
+        )
+
+
+class GroupCommitWriter(object):
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        max_claims: int = 50,
+        max_wait: float = 0.005,
+        max_pending: int = 5000,
+        writers: int = 2,
+        engine_class=ClaimIngestEngine,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.session_factory = session_factory
+        self.max_claims = max_claims
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.writers = writers
+        self.engine_class = engine_class
+        self.clock = clock
+        self.purged_at: Optional[float] = None
+        # Created by start(), on the loop of the worker
+        self._queue: Optional["asyncio.Queue[PendingClaim]"] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _put(self, pending: PendingClaim) -> None:
+        if self._queue is None:
+            raise WriterBusy("Claim writer isn't running")
+        try:
+            self._queue.put_nowait(pending)
+        except asyncio.QueueFull:
+            GROUP_COMMIT_CLAIMS.labels("rejected").inc()
+            raise WriterBusy(f"{self._queue.qsize()} claims waiting to be written")
+
+    async def submit(self, claims: Union[List[Claim], ClaimBatch]) -> Row:
+        """Claim row of claims once their group committed"""
+        future = asyncio.get_running_loop().create_future()
+        self._put(PendingClaim(claims, future, None))
+        return await future
+
+    def accept(self, claims: Union[List[Claim], ClaimBatch]) -> str:
+        """Ticket of claims, written with a later group"""
+        ticket = new_ticket()
+        self._put(PendingClaim(claims, None, ticket))
+        return ticket
+
+    async def next_group(self) -> List[PendingClaim]:
+        group = [await self._queue.get()]
+        deadline = self.clock() + self.max_wait
+        while len(group) < self.max_claims:
+            # Claims queued during the previous flush don't wait
+            if not self._queue.empty():
+                group.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - self.clock()
+            if timeout <= 0:
+                break
+            try:
+                group.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return group
+
+    async def flush(self, group: List[PendingClaim]) -> None:
+        try:
+            async with self.session_factory() as db_session:
+                ingest_engine = self.engine_class(db_session=db_session)
+                claim_rows = await ingest_engine.ingest_many(
+                    [pending.claims for pending in group]
+                )
+                tickets = {
+                    pending.ticket: claim_row.claim_id
+                    for pending, claim_row in zip(group, claim_rows)
+                    if pending.ticket is not None
+                }
+                if tickets:
+                    await ingest_engine.record_tickets(tickets)
+                await self.purge_tickets(ingest_engine)
+                await db_session.commit()
+        except Exception as e:
+            if len(group) > 1:
+                logger.warning(
+                    f"Group of {len(group)} claims failed, writing them one by one: {e}"
+                )
+                for pending in group:
+                    await self.flush([pending])
+            else:
+                await self.fail(group[0], e)
+            return
+
+        await response_cache.invalidate(TOP_PROVIDERS_ROUTE)
+        CLAIM_LINES_INGESTED.labels("process_claim").inc(
+            sum(pending.lines for pending in group)
+        )
+        GROUP_COMMIT_CLAIMS.labels("committed").inc(len(group))
+        GROUP_COMMIT_SIZE.observe(len(group))
+        for pending, claim_row in zip(group, claim_rows):
+            if pending.future is not None and not pending.future.done():
+                pending.future.set_result(claim_row)
+
+    async def fail(self, pending: PendingClaim, error: Exception) -> None:
+        GROUP_COMMIT_CLAIMS.labels("failed").inc()
+        if pending.future is not None:
+            if not pending.future.done():
+                pending.future.set_exception(error)
+            return
+
+        logger.error(f"Claim of ticket {pending.ticket} failed: {error!r}")
+        try:
+            async with self.session_factory() as db_session:
+                await self.engine_class(db_session=db_session).record_failed_ticket(
+                    pending.ticket, f"{type(error).__name__}: {error}"
+                )
+                await db_session.commit()
+        except Exception as e:
+            logger.error(
+                f"Recording the failure of ticket {pending.ticket} failed: {e}"
+            )
+
+    async def purge_tickets(self, ingest_engine) -> None:
+        # Once an hour per worker, inside a group's transaction
+        now = self.clock()
+        if self.purged_at is None or now - self.purged_at > TICKET_PURGE_INTERVAL:
+            self.purged_at = now
+            await ingest_engine.purge_tickets(TICKET_RETENTION_SECONDS)
+
+    async def run(self) -> None:
+        while True:
+            group = await self.next_group()
+            try:
+                await self.flush(group)
+            finally:
+                for _ in group:
+                    self._queue.task_done()
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(self.max_pending)
+        self._tasks = [asyncio.create_task(self.run()) for _ in range(self.writers)]
+
+    async def stop(self) -> None:
+        # Claims already accepted are written before the worker exits
+        if self._tasks:
+            await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._queue, self._tasks = None, []
+
+
+def initialize_claim_writer() -> Optional[GroupCommitWriter]:
+    if config.claim_ingest_mode == "direct":
+        return None
+
+    if config.claim_ingest_mode not in ("group", "accepted"):
+        raise RuntimeError(f"Unknown CLAIM_INGEST_MODE {config.claim_ingest_mode}")
+
+    return GroupCommitWriter(
+        session_factory=lambda: start_database()(),
+        max_claims=config.claim_group_commit_max_claims,
+        max_wait=config.claim_group_commit_max_wait_ms / 1000,
+        max_pending=config.claim_group_commit_max_pending,
+        writers=config.claim_group_commit_writers,
+    )
+
+
+claim_writer = initialize_claim_writer()
@@ -0,0 +1,87 @@
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.model.psql.orm import ClaimDetailModel, ProviderNetFeeTotalModel
+
+logger = logging.getLogger(__name__)
+
+
+def sum_net_fees_by_provider(lines: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    totals = defaultdict(int)
+    for provider_id, net_fees_cents in lines:
+        totals[provider_id] += net_fees_cents
+
+    return totals
+
+
+def upsert_provider_net_fee_totals(totals: Dict[int, int]):
+    """
+    INSERT ... ON CONFLICT DO UPDATE adding the batch's net fees to each
+    provider's running total
+    """
+
+    # Rows are locked in provider_id order so concurrent ingests touching the
+    # same providers queue up instead of deadlocking
+    return _add_to_running_totals(
+        pg_insert(ProviderNetFeeTotalModel).values(
+            [
+                {
+                    "provider_id": provider_id,
+                    "total_net_fees_cents": totals[provider_id],
+                }
+                for provider_id in sorted(totals)
+            ]
+        )
+    )
+
+
+def upsert_provider_net_fee_totals_from_select(totals_query):
+    # totals_query selects (provider_id, net fees cents), ordered by provider_id
+    return _add_to_running_totals(
+        pg_insert(ProviderNetFeeTotalModel).from_select(
+            ["provider_id", "total_net_fees_cents"], totals_query
+        )
+    )
+
+
+def _add_to_running_totals(stmt):
+    return stmt.on_conflict_do_update(
+        index_elements=[ProviderNetFeeTotalModel.provider_id],
+        set_={
+            "total_net_fees_cents": ProviderNetFeeTotalModel.total_net_fees_cents
+            + stmt.excluded.total_net_fees_cents,
+            "updated": func.now(),
+        },
+    )
+
+
+def rebuild_provider_net_fee_totals(connection) -> int:
+    """
+    Recompute every provider total from claim_detail, repairs any drift.
+
+    The EXCLUSIVE lock is held until commit: ingests that want to bump a total
+    wait for the rebuild and then add their lines on top of it, readers keep
+    seeing the previous totals meanwhile.
+    """
+
+    rollup_table = ProviderNetFeeTotalModel.__table__
+    if connection.dialect.name == "postgresql":
+        connection.execute(
+            text(f"LOCK TABLE {rollup_table.fullname} IN EXCLUSIVE MODE")
+        )
+    connection.execute(rollup_table.delete())
+    result = connection.execute(
+        rollup_table.insert().from_select(
+            ["provider_id", "total_net_fees_cents"],
+            select(
+                ClaimDetailModel.provider_id, func.sum(ClaimDetailModel.net_fees_cents)
+            ).group_by(ClaimDetailModel.provider_id),
+        )
+    )
+
+    logger.info(f"Rebuilt provider net fee totals for {result.rowcount} providers")
+    return result.rowcount
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List, Optional
 
 from pydantic import (
@@ -31,6 +32,33 @@ class BaseSchema(BaseModel):
 # 3/28/18 0:00,D4211,UR,GRP-1000,3730189502,1497775530,$178.00 ,$178.00 ,$35.60 ,$0.00
 
 
+def parse_cents(value: str) -> int:
+    """
+    Exact dollar string to integer cents, e.g. "$35.60 " -> 3560. Anything
+    finer than a cent is rejected rather than rounded.
+    """
+
+    dollars, _, cents = value.replace("$", "").strip().partition(".")
+    if (
+        len(cents) > 2
+        or not (dollars.lstrip("+-") or cents)
+        or (cents and not cents.isdigit())
+    ):
+        raise ValueError(f"Invalid amount {value!r}")
+
+    # int() does the digit and sign checks of "<dollars><cents>" in one go
+    return int(dollars + cents.ljust(2, "0"))
+
+
+# Service dates of the claim file, e.g. "3/28/18 0:00"
+SERVICE_DATE_FORMAT = "%m/%d/%y %H:%M"
+SERVICE_DATE_ERROR = "service date must be always e.g., '3/28/18 0:00'"
+
+
+def parse_service_date_text(value: str) -> datetime:
+    return datetime.strptime(value, SERVICE_DATE_FORMAT)
+
+
 class Claim(BaseSchema):
     service_date: str = Field(
         description="Claim service data",
@@ -54,30 +82,43 @@ class Claim(BaseSchema):
         alias="Provider NPI",
         coerce_numbers_to_str=True,
     )
-    provider_fees: str = Field(
+    provider_fees_cents: str = Field(
         description="Claim provider fees",
         alias="provider fees",
     )
-    allowed_fees: str = Field(
+    allowed_fees_cents: str = Field(
         description="Claim allowed fees",
         alias="Allowed fees",
     )
-    member_co_insurance: str = Field(
+    member_co_insurance_cents: str = Field(
         description="Claim member co-insurance",
         alias="member coinsurance",
     )
-    member_co_pay: str = Field(
+    member_co_pay_cents: str = Field(
         description="Claim member co-pay",
         alias="member copay",
     )
 
+    @field_validator("service_date")
+    def default_service_date(cls, v):
+        """
+        Custom validator for service_date, ingest parses it with the same format
+        """
+
+        try:
+            parse_service_date_text(v)
+        except ValueError:
+            raise ValueError(SERVICE_DATE_ERROR)
+
+        return v
+
     @field_validator("submitted_procedure")
     def default_submitted_procedure(cls, v):
         """
         Custom validator for submitted_procedure
         """
 
-        if v[0] != "D":
+        if not v.startswith("D"):
             raise ValueError("submitted procedure must start with D always")
 
         return v
@@ -110,10 +151,10 @@ class Claim(BaseSchema):
     @model_validator(mode="after")
     def transform_payment_fields(cls, values):
         for field_name in [
-            "provider_fees",
-            "allowed_fees",
-            "member_co_insurance",
-            "member_co_pay",
+            "provider_fees_cents",
+            "allowed_fees_cents",
+            "member_co_insurance_cents",
+            "member_co_pay_cents",
         ]:
             setattr(
                 values,
@@ -124,13 +165,12 @@ class Claim(BaseSchema):
 
     @classmethod
     def _strip_dollar_sign_and_convert(cls, field_name, v):
-        if isinstance(v, str):
-            v = v.replace("$", "").strip()
-        else:
+        field_name = cls.model_fields[field_name].alias
+        if not isinstance(v, str):
             raise ValueError(f"{field_name} must be always start with $")
 
         try:
-            value = float(v)
+            value = parse_cents(v)
         except ValueError:
             raise ValueError(f"{field_name} must be always e.g., '$10.00'")
 
@@ -174,7 +214,10 @@ class ClaimResponseModel(BaseModel):
 
 class ClaimsResponseModel(BaseModel):
     claims: List[ClaimResponseModel] = Field(description="Claims")
-    totalCount: int = Field(description="Total processed claims")
+    totalCount: int = Field(description="Total processed claims (estimated)")
+    next: Optional[str] = Field(
+        description="Cursor of the next page, null on the last page", default=None
+    )
 
 
 class ClaimResourceResponseModel(BaseModel):
@@ -208,6 +251,13 @@ class ClaimResourceResponseModel(BaseModel):
     net_fees: float = Field(
         description="Claim net fees",
     )
+    provider_fees_cents: int = Field(description="Claim provider fees in cents")
+    allowed_fees_cents: int = Field(description="Claim allowed fees in cents")
+    member_co_insurance_cents: int = Field(
+        description="Claim member co-insurance in cents"
+    )
+    member_co_pay_cents: int = Field(description="Claim member co-pay in cents")
+    net_fees_cents: int = Field(description="Claim net fees in cents")
     createdAt: str = Field(
         description="Claim created at as UTC ISO timestamp.",
     )
@@ -217,16 +267,74 @@ class ClaimResourceResponseModel(BaseModel):
     )
 
 
+class ClaimResourcesModel(BaseModel):
+    claimId: int = Field(description="Claim identifier")
+    lines: List[ClaimResourceResponseModel] = Field(description="Claim lines")
+
+
+class ClaimBatchResponseModel(BaseModel):
+    claims: List[ClaimResourcesModel] = Field(
+        description="Found claims in the requested order"
+    )
+    missingIds: List[int] = Field(description="Requested claim ids that don't exist")
+
+
+class ClaimImportRowError(BaseModel):
+    row: int = Field(description="Claim file line number, header is line 1")
+    errors: List[str] = Field(description="Validation errors of the row")
+
+
+class ClaimImportResponseModel(BaseModel):
+    claimId: Optional[int] = Field(
+        description="Claim identifier, null when no row was valid", default=None
+    )
+    createdAt: Optional[str] = Field(
+        description="Claim created at as UTC ISO timestamp.", default=None
+    )
+    updatedAt: Optional[str] = Field(
+        description="Claim updated at as UTC ISO timestamp.", default=None
+    )
+    importedCount: int = Field(description="Claim lines imported")
+    rejectedCount: int = Field(description="Claim lines rejected by validation")
+    errors: List[ClaimImportRowError] = Field(
+        description="Per row validation errors, capped in size"
+    )
+
+
+class ClaimTicketResponseModel(BaseModel):
+    ticketId: str = Field(description="Ticket of a claim accepted for ingest")
+    status: str = Field(description="pending, committed or failed")
+    statusUrl: str = Field(description="Where the ticket status is reported")
+    claimId: Optional[int] = Field(
+        description="Claim identifier once committed", default=None
+    )
+    createdAt: Optional[str] = Field(
+        description="Claim created at as UTC ISO timestamp.", default=None
+    )
+    updatedAt: Optional[str] = Field(
+        description="Claim updated at as UTC ISO timestamp.", default=None
+    )
+    error: Optional[str] = Field(description="Why the claim failed", default=None)
+
 
 class TopProviderFees(BaseModel):
     provider_npi: str
     total_net_fees: float
+    total_net_fees_cents: int
 
 
 class AuthenticationResponseMessage(BaseModel):
     detail: str = Field(default="Authentication Required.")
 
 
+class ForbiddenResponseMessage(BaseModel):
+    detail: str = Field(default="Missing scope: claims:read")
+
+
+class BadRequestResponseMessage(BaseModel):
+    detail: str = Field(default="Bad Request.")
+
+
 class TooMayRequests(BaseModel):
     detail: str = Field(default="Too Many Requests.")
 
@@ -235,12 +343,17 @@ class NotFoundResponseMessage(BaseModel):
     detail: str = Field(default="Given identifier resource not found.")
 
 
+class ServiceUnavailableMessage(BaseModel):
+    detail: str = Field(default="Claim writer is busy.")
+
+
 class InternalServerErrorMessage(BaseModel):
     detail: str = Field(default="Internal Server Error.")
 
 
 standard_responses = {
     401: {"model": AuthenticationResponseMessage},
+    403: {"model": ForbiddenResponseMessage},
     404: {"model": NotFoundResponseMessage},
     500: {"model": InternalServerErrorMessage},
 }
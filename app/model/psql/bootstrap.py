@@ -0,0 +1,124 @@
+"""
+Schema bootstrap: the test_app schema, missing tables and indexes, in place
+upgrades of older tables, the claim_detail partitions and the initial top
+providers rollup. Run once per deploy by app.tools.migrate, never by the API
+workers.
+"""
+
+import logging
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateSchema
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+
+def bootstrap_database(conn_url: str) -> None:
+    engine = create_engine(conn_url)
+    try:
+        base = declarative_base()
+        with Session(bind=engine) as session:
+            create_schema_and_tables(engine=engine, session=session, base=base)
+    finally:
+        engine.dispose()
+
+
+def create_schema_and_tables(engine, session, base):
+    inspector = inspect(engine)
+
+    # Check if schema "test_app" exists
+    schema_name = "test_app"
+    if schema_name not in inspector.get_schema_names():
+        try:
+            with engine.begin() as connection:
+                connection.execute(CreateSchema(schema_name))
+            logger.info(f"Schema '{schema_name}' created successfully.")
+        except Exception as e:
+            logger.warning(
+                f"Schema '{schema_name}' already exists or an error occurred: {e}"
+            )
+    else:
+        logger.info(f"Schema '{schema_name}' already exists.")
+
+    # Import ORM models and define tables
+    from app.model.psql.orm import (
+        ClaimModel,
+        ClaimDetailModel,
+        PatientModel,
+        PaymentDeadLetterModel,
+        PaymentOutboxModel,
+        ProviderModel,
+        ProviderNetFeeTotalModel,
+        RateLimitBucketModel,
+        ClaimIngestTicketModel,
+    )
+
+    # Define table list and check each table’s existence
+    tables = [
+        PatientModel.__table__,
+        ProviderModel.__table__,
+        ClaimDetailModel.__table__,
+        ClaimModel.__table__,
+        ProviderNetFeeTotalModel.__table__,
+        PaymentOutboxModel.__table__,
+        PaymentDeadLetterModel.__table__,
+        RateLimitBucketModel.__table__,
+        ClaimIngestTicketModel.__table__,
+    ]
+
+    # base.metadata.drop_all(engine, tables=tables)
+
+    # Only create tables that don’t exist
+    try:
+        existing_tables = [
+            table
+            for table in tables
+            if inspector.has_table(table.name, schema=schema_name)
+        ]
+        base.metadata.create_all(
+            engine,
+            tables=[table for table in tables if table not in existing_tables],
+        )
+
+        # Tables created by an older version of the models, e.g. money as Float or
+        # duplicate npis the unique indexes below would reject
+        if ClaimDetailModel.__table__ in existing_tables:
+            from app.model.psql.migrations import run_migrations
+
+            run_migrations(engine)
+
+        # Indexes added to the models after a table was created, e.g. the unique
+        # npi/subscriber_id indexes the ingest upserts rely on
+        for table in existing_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+
+        # Monthly claim_detail partitions up to CLAIM_DETAIL_PARTITION_MONTHS_AHEAD
+        if engine.dialect.name == "postgresql":
+            from app.model.psql.partitions import ensure_claim_detail_partitions
+
+            with engine.begin() as connection:
+                ensure_claim_detail_partitions(
+                    connection, months_ahead=config.claim_detail_partition_months_ahead
+                )
+
+        # Rollup added next to existing claim lines starts from their totals
+        if (
+            ClaimDetailModel.__table__ in existing_tables
+            and ProviderNetFeeTotalModel.__table__ not in existing_tables
+        ):
+            from app.ingest.rollup import rebuild_provider_net_fee_totals
+
+            with engine.begin() as connection:
+                rebuild_provider_net_fee_totals(connection)
+        session.commit()
+        logger.info("Tables initialized successfully!")
+    except SQLAlchemyError as e:
+        session.rollback()
+        logger.error(f"An error occurred: {str(e)}")
+        raise
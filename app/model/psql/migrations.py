@@ -0,0 +1,252 @@
+"""
+In place upgrades of tables created by an older version of the models.
+
+create_all only creates missing tables, every migration here checks the live
+columns first so it runs once against an old table and is a no-op afterwards.
+"""
+
+import logging
+
+from sqlalchemy import inspect, text
+
+from app.model.psql.orm import (
+    ClaimDetailModel,
+    PatientModel,
+    ProviderModel,
+    ProviderNetFeeTotalModel,
+)
+
+logger = logging.getLogger(__name__)
+
+# claim_detail money columns before integer cents: Float, member_co_pay as Text
+CLAIM_DETAIL_MONEY_COLUMNS = {
+    "provider_fees": "provider_fees_cents",
+    "allowed_fees": "allowed_fees_cents",
+    "member_co_insurance": "member_co_insurance_cents",
+    "member_co_pay": "member_co_pay_cents",
+    "net_fees": "net_fees_cents",
+}
+
+
+def _column_names(connection, table) -> set:
+    return {
+        column["name"]
+        for column in inspect(connection).get_columns(table.name, schema=table.schema)
+    }
+
+
+def migrate_money_to_cents(connection) -> bool:
+    """
+    Convert claim_detail dollars (Float, member_co_pay Text) and the provider
+    totals to BIGINT cents.
+
+    All columns change in one ALTER TABLE so claim_detail is rewritten once,
+    under an ACCESS EXCLUSIVE lock for the length of the rewrite. The totals
+    are then rebuilt from the converted lines rather than converting sums
+    that already drifted.
+    """
+
+    claim_detail = ClaimDetailModel.__table__
+    if "net_fees" not in _column_names(connection, claim_detail):
+        return False
+
+    logger.info(f"Converting {claim_detail.fullname} money columns to cents")
+    for old, new in CLAIM_DETAIL_MONEY_COLUMNS.items():
+        connection.execute(
+            text(f"ALTER TABLE {claim_detail.fullname} RENAME COLUMN {old} TO {new}")
+        )
+
+    conversions = []
+    for new in CLAIM_DETAIL_MONEY_COLUMNS.values():
+        amount = f"{new}::numeric"
+        if new == "member_co_pay_cents":
+            amount = f"replace({new}, '$', '')::numeric"
+        conversions.append(
+            f"ALTER COLUMN {new} TYPE BIGINT USING round({amount} * 100)::bigint"
+        )
+    connection.execute(
+        text(f"ALTER TABLE {claim_detail.fullname} {', '.join(conversions)}")
+    )
+
+    totals = ProviderNetFeeTotalModel.__table__
+    if "total_net_fees" in _column_names(connection, totals):
+        connection.execute(
+            text(
+                f"ALTER TABLE {totals.fullname} "
+                "RENAME COLUMN total_net_fees TO total_net_fees_cents"
+            )
+        )
+        connection.execute(
+            text(
+                f"ALTER TABLE {totals.fullname} "
+                "ALTER COLUMN total_net_fees_cents TYPE BIGINT "
+                "USING round(total_net_fees_cents::numeric * 100)::bigint"
+            )
+        )
+
+        from app.ingest.rollup import rebuild_provider_net_fee_totals
+
+        rebuild_provider_net_fee_totals(connection)
+
+    return True
+
+
+def merge_duplicate_identities(connection) -> bool:
+    """
+    Merge providers sharing an npi and patients sharing a subscriber_id into
+    the row with the lowest id, before their unique indexes are created.
+
+    Tables from before the indexes can hold duplicates written by concurrent
+    ingests. The claim lines of a duplicate move to the kept row, the totals
+    of the kept providers are recomputed from their lines and the duplicates
+    are deleted.
+    """
+
+    claim_detail = ClaimDetailModel.__table__
+    totals = ProviderNetFeeTotalModel.__table__
+    merged = False
+    for model, key, line_column, index_name in [
+        (ProviderModel, "npi", "provider_id", "provider_npi_key"),
+        (PatientModel, "subscriber_id", "subscriber_id", "patient_subscriber_id_key"),
+    ]:
+        table = model.__table__
+        indexes = inspect(connection).get_indexes(table.name, schema=table.schema)
+        if index_name in {index["name"] for index in indexes}:
+            continue
+
+        id_column = table.primary_key.columns.values()[0].name
+        kept = f"SELECT min({id_column}) FROM {table.fullname} GROUP BY {key}"
+        duplicated = f"{kept} HAVING count(*) > 1"
+        duplicates = (
+            f"SELECT {id_column} FROM {table.fullname} "
+            f"WHERE {id_column} NOT IN ({kept})"
+        )
+        count = connection.execute(
+            text(f"SELECT count(*) FROM ({duplicates}) AS duplicates")
+        ).scalar()
+        if not count:
+            continue
+
+        logger.info(f"Merging {count} duplicate rows of {table.fullname} by {key}")
+        connection.execute(
+            text(
+                f"UPDATE {claim_detail.fullname} SET {line_column} = ("
+                f"SELECT min(k.{id_column}) FROM {table.fullname} k "
+                f"JOIN {table.fullname} d ON d.{key} = k.{key} "
+                f"WHERE d.{id_column} = {claim_detail.name}.{line_column}"
+                f") WHERE {line_column} IN ({duplicates})"
+            )
+        )
+        if model is ProviderModel:
+            connection.execute(
+                text(
+                    f"DELETE FROM {totals.fullname} "
+                    f"WHERE provider_id IN ({duplicates}) "
+                    f"OR provider_id IN ({duplicated})"
+                )
+            )
+            connection.execute(
+                text(
+                    f"INSERT INTO {totals.fullname} "
+                    "(provider_id, total_net_fees_cents) "
+                    "SELECT provider_id, sum(net_fees_cents) "
+                    f"FROM {claim_detail.fullname} "
+                    f"WHERE provider_id IN ({duplicated}) GROUP BY provider_id"
+                )
+            )
+        connection.execute(
+            text(f"DELETE FROM {table.fullname} WHERE {id_column} IN ({duplicates})")
+        )
+        merged = True
+
+    return merged
+
+
+def migrate_claim_detail_to_partitioned(connection) -> bool:
+    """
+    Rebuild a plain claim_detail table as the monthly partitioned table.
+
+    The old table is renamed aside, the partitioned table and the partitions
+    of every month it holds are created, the lines are copied over in one
+    INSERT ... SELECT and the old table is dropped. Claim writes block until
+    the copy commits.
+    """
+
+    claim_detail = ClaimDetailModel.__table__
+    if connection.dialect.name != "postgresql":
+        return False
+    relkind = connection.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"),
+        {"name": claim_detail.fullname},
+    ).scalar()
+    if relkind != "r":
+        return False
+
+    logger.info(f"Partitioning {claim_detail.fullname} by service_date")
+    old_name = f"{claim_detail.name}_unpartitioned"
+    old = f"{claim_detail.schema}.{old_name}"
+
+    # Free the names the partitioned table is created with
+    id_sequence = connection.execute(
+        text("SELECT pg_get_serial_sequence(:table, 'id')"),
+        {"table": claim_detail.fullname},
+    ).scalar()
+    if id_sequence:
+        connection.execute(
+            text(f"ALTER SEQUENCE {id_sequence} RENAME TO {old_name}_id_seq")
+        )
+    connection.execute(
+        text(f"ALTER TABLE {claim_detail.fullname} RENAME TO {old_name}")
+    )
+    for index in ["claim_detail_pkey", *(index.name for index in claim_detail.indexes)]:
+        connection.execute(
+            text(
+                f"ALTER INDEX IF EXISTS {claim_detail.schema}.{index} "
+                f"RENAME TO {index.replace(claim_detail.name, old_name, 1)}"
+            )
+        )
+
+    claim_detail.create(connection)
+
+    from app.model.psql.partitions import ensure_claim_detail_partitions
+
+    months = [
+        month
+        for (month,) in connection.execute(
+            text(f"SELECT DISTINCT date_trunc('month', service_date) FROM {old}")
+        )
+    ]
+    ensure_claim_detail_partitions(connection, months_ahead=0, months=months)
+
+    columns = ", ".join(f'"{column.name}"' for column in claim_detail.columns)
+    connection.execute(
+        text(
+            f"INSERT INTO {claim_detail.fullname} ({columns}) "
+            f"SELECT {columns} FROM {old}"
+        )
+    )
+    connection.execute(
+        text(
+            "SELECT setval(pg_get_serial_sequence(:table, 'id'), max(id)) "
+            f"FROM {claim_detail.fullname} HAVING max(id) IS NOT NULL"
+        ),
+        {"table": claim_detail.fullname},
+    )
+    connection.execute(text(f"DROP TABLE {old}"))
+
+    return True
+
+
+# Applied in order by every app.tools.migrate run
+MIGRATIONS = [
+    migrate_money_to_cents,
+    merge_duplicate_identities,
+    migrate_claim_detail_to_partitioned,
+]
+
+
+def run_migrations(engine) -> None:
+    with engine.begin() as connection:
+        for migration in MIGRATIONS:
+            if migration(connection):
+                logger.info(f"Applied migration {migration.__name__}")
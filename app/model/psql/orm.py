@@ -1,22 +1,20 @@
-import logging
-import os
-
 from sqlalchemy import (
+    DDL,
+    BigInteger,
     Column,
+    Float,
     ForeignKey,
     Index,
     Integer,
-    Float,
+    JSON,
     Text,
+    event,
     text,
 )
-from sqlalchemy.dialects.postgresql import TIMESTAMP
+from sqlalchemy.dialects.postgresql import JSONB, TIMESTAMP
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
-logging.basicConfig()
-logging.getLogger("sqlalchemy.engine").setLevel(os.environ.get("LOG_LEVEL", "INFO"))
-
 Base = declarative_base()
 
 
@@ -24,6 +22,8 @@ class ProviderModel(Base):
     __tablename__ = "provider"
     __table_args__ = (
         Index("provider_id_key", "provider_id", unique=True),
+        # Conflict target for provider upserts during claim ingest
+        Index("provider_npi_key", "npi", unique=True),
         {"schema": "test_app"},
     )
 
@@ -42,6 +42,8 @@ class PatientModel(Base):
     __tablename__ = "patient"
     __table_args__ = (
         Index("patient_id_key", "patient_id", unique=True),
+        # Conflict target for patient upserts during claim ingest
+        Index("patient_subscriber_id_key", "subscriber_id", unique=True),
         {"schema": "test_app"},
     )
 
@@ -55,10 +57,12 @@ class PatientModel(Base):
 
 
 class ClaimDetailModel(Base):
+    # Monthly range partitions by service_date, see app/model/psql/partitions.py.
+    # The partition key has to be part of the primary key.
     __tablename__ = "claim_detail"
     __table_args__ = (
         Index("claim_detail_claim_id_key", "claim_id", unique=False),
-        {"schema": "test_app"},
+        {"schema": "test_app", "postgresql_partition_by": "RANGE (service_date)"},
     )
 
     id = Column(Integer(), primary_key=True, autoincrement=True)
@@ -73,15 +77,16 @@ class ClaimDetailModel(Base):
     provider_id = Column(
         Integer(), ForeignKey("test_app.provider.provider_id"), nullable=False
     )
-    service_date = Column(TIMESTAMP, nullable=False)
+    service_date = Column(TIMESTAMP, primary_key=True, nullable=False)
     submitted_procedure = Column(Text(), nullable=False)
     quadrant = Column(Text(), nullable=True)
     group = Column(Text(), nullable=False)
-    provider_fees = Column(Float(), nullable=False)
-    allowed_fees = Column(Float(), nullable=False)
-    member_co_insurance = Column(Float(), nullable=False)
-    member_co_pay = Column(Text(), nullable=False)
-    net_fees = Column(Float(), nullable=False)
+    # Money is exact integer cents
+    provider_fees_cents = Column(BigInteger(), nullable=False)
+    allowed_fees_cents = Column(BigInteger(), nullable=False)
+    member_co_insurance_cents = Column(BigInteger(), nullable=False)
+    member_co_pay_cents = Column(BigInteger(), nullable=False)
+    net_fees_cents = Column(BigInteger(), nullable=False)
     created = Column(TIMESTAMP, server_default=text("now()"))
     updated = Column(TIMESTAMP, server_default=text("now()"))
 
@@ -91,10 +96,23 @@ class ClaimDetailModel(Base):
     claim = relationship("ClaimModel", back_populates="claim_details")
 
 
+# Lines outside the managed months land here until their partition is created
+event.listen(
+    ClaimDetailModel.__table__,
+    "after_create",
+    DDL(
+        "CREATE TABLE IF NOT EXISTS test_app.claim_detail_default "
+        "PARTITION OF test_app.claim_detail DEFAULT"
+    ).execute_if(dialect="postgresql"),
+)
+
+
 class ClaimModel(Base):
     __tablename__ = "claim"
     __table_args__ = (
         Index("claim_id_key", "claim_id", unique=True),
+        # Keyset pagination of the claims listing, newest first
+        Index("claim_created_claim_id_key", "created", "claim_id"),
         {"schema": "test_app"},
     )
 
@@ -104,3 +122,96 @@ class ClaimModel(Base):
 
     # Relationship to ClaimDetailModel
     claim_details = relationship("ClaimDetailModel", back_populates="claim")
+
+
+class ProviderNetFeeTotalModel(Base):
+    # Running SUM(claim_detail.net_fees_cents) per provider, maintained by the ingest
+    # path in the same transaction as the claim lines
+    __tablename__ = "provider_net_fee_totals"
+    __table_args__ = (
+        Index(
+            "provider_net_fee_totals_total_net_fees_key",
+            "total_net_fees_cents",
+            unique=False,
+        ),
+        {"schema": "test_app"},
+    )
+
+    provider_id = Column(
+        Integer(),
+        ForeignKey("test_app.provider.provider_id"),
+        primary_key=True,
+        nullable=False,
+    )
+    total_net_fees_cents = Column(
+        BigInteger(), nullable=False, server_default=text("0")
+    )
+    created = Column(TIMESTAMP, server_default=text("now()"))
+    updated = Column(TIMESTAMP, server_default=text("now()"))
+
+    provider = relationship("ProviderModel")
+
+
+class PaymentOutboxModel(Base):
+    # Payment events written in the claim's transaction, drained and deleted
+    # by the outbox dispatcher once the sink accepted them
+    __tablename__ = "payment_outbox"
+    __table_args__ = (
+        Index("payment_outbox_available_at_id_key", "available_at", "id"),
+        {"schema": "test_app"},
+    )
+
+    id = Column(BigInteger(), primary_key=True, autoincrement=True)
+    claim_id = Column(
+        Integer(), ForeignKey("test_app.claim.claim_id"), nullable=False
+    )
+    event_type = Column(Text(), nullable=False)
+    payload = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+    attempts = Column(Integer(), nullable=False, server_default=text("0"))
+    available_at = Column(TIMESTAMP, nullable=False, server_default=text("now()"))
+    last_error = Column(Text(), nullable=True)
+    created = Column(TIMESTAMP, server_default=text("now()"))
+
+
+class PaymentDeadLetterModel(Base):
+    # Outbox events that ran out of attempts, kept for inspection and replay
+    __tablename__ = "payment_dead_letter"
+    __table_args__ = ({"schema": "test_app"},)
+
+    id = Column(BigInteger(), primary_key=True)
+    claim_id = Column(
+        Integer(), ForeignKey("test_app.claim.claim_id"), nullable=False
+    )
+    event_type = Column(Text(), nullable=False)
+    payload = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+    attempts = Column(Integer(), nullable=False)
+    last_error = Column(Text(), nullable=True)
+    created = Column(TIMESTAMP)
+    dead_at = Column(TIMESTAMP, server_default=text("now()"))
+
+
+class RateLimitBucketModel(Base):
+    # Token buckets of the API rate limits, one row per route and client,
+    # shared by every worker, see app/ratelimit/buckets.py
+    __tablename__ = "rate_limit_bucket"
+    __table_args__ = ({"schema": "test_app"},)
+
+    key = Column(Text(), primary_key=True)
+    tokens = Column(Float(), nullable=False)
+    granted = Column(Integer(), nullable=False, server_default=text("0"))
+    updated = Column(TIMESTAMP, nullable=False, server_default=text("now()"))
+
+
+class ClaimIngestTicketModel(Base):
+    # Outcome of the claims accepted with 202 by the group commit writer, the
+    # committed ones are written with their claim, see app/ingest/group_commit.py
+    __tablename__ = "claim_ingest_ticket"
+    __table_args__ = (
+        Index("claim_ingest_ticket_created_key", "created", unique=False),
+        {"schema": "test_app"},
+    )
+
+    ticket = Column(Text(), primary_key=True)
+    claim_id = Column(Integer(), ForeignKey("test_app.claim.claim_id"), nullable=True)
+    error = Column(Text(), nullable=True)
+    created = Column(TIMESTAMP, server_default=text("now()"))
@@ -0,0 +1,206 @@
+"""
+Monthly range partitions of claim_detail by service_date.
+
+claim_detail is declared PARTITION BY RANGE (service_date). Every month gets
+its own partition named claim_detail_pYYYYMM covering [first of the month,
+first of the next month), lines outside the managed months land in
+claim_detail_default until their month is created.
+
+New partitions are built as plain tables and attached afterwards, so the
+parent is only locked with SHARE UPDATE EXCLUSIVE. The attach still takes an
+ACCESS EXCLUSIVE lock on the default partition and scans it for lines of the
+new month: writes of lines outside the managed months wait until the
+transaction commits, the other ingests keep running. Lines already sitting in
+the default partition for that month are moved over before the attach.
+
+Detached partitions leave the claims API. Their lines are subtracted from
+provider_net_fee_totals in the same transaction, so the top providers only
+count the attached months.
+"""
+
+import logging
+import re
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Union
+
+from sqlalchemy import text
+
+from app.model.psql.orm import ClaimDetailModel, ProviderNetFeeTotalModel
+
+logger = logging.getLogger(__name__)
+
+CLAIM_DETAIL = ClaimDetailModel.__table__
+DEFAULT_PARTITION = f"{CLAIM_DETAIL.schema}.{CLAIM_DETAIL.name}_default"
+PARTITION_NAME = re.compile(rf"^{CLAIM_DETAIL.name}_p(\d{{4}})(\d{{2}})$")
+
+
+def month_start(value: Union[date, datetime]) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return date(year, month_index + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{CLAIM_DETAIL.name}_p{month:%Y%m}"
+
+
+def list_claim_detail_partitions(connection) -> Dict[date, str]:
+    # Attached monthly partitions, the default partition is not part of it
+    result = connection.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = CAST(:parent AS regclass)"
+        ),
+        {"parent": CLAIM_DETAIL.fullname},
+    )
+
+    partitions = {}
+    for (name,) in result:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def create_claim_detail_partition(connection, month: date) -> str:
+    name = f"{CLAIM_DETAIL.schema}.{partition_name(month)}"
+    lower, upper = month.isoformat(), add_months(month, 1).isoformat()
+    bounds = f"service_date >= '{lower}' AND service_date < '{upper}'"
+
+    connection.execute(
+        text(
+            f"CREATE TABLE {name} "
+            f"(LIKE {CLAIM_DETAIL.fullname} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+    )
+    # Matching check constraint lets ATTACH skip validating the new partition
+    connection.execute(
+        text(
+            f"ALTER TABLE {name} ADD CONSTRAINT {partition_name(month)}_bounds "
+            f"CHECK ({bounds})"
+        )
+    )
+    # Locked before the move rather than by the attach, otherwise a line of
+    # this month written to the default in between fails the attach's scan
+    connection.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE"))
+    moved = connection.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {bounds} "
+            f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+        )
+    )
+    connection.execute(
+        text(
+            f"ALTER TABLE {CLAIM_DETAIL.fullname} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        )
+    )
+    connection.execute(
+        text(f"ALTER TABLE {name} DROP CONSTRAINT {partition_name(month)}_bounds")
+    )
+
+    logger.info(
+        f"Created partition {name}, moved {moved.rowcount} lines from the default"
+    )
+    return name
+
+
+def ensure_claim_detail_partitions(
+    connection,
+    months_ahead: int,
+    months: Iterable[Union[date, datetime]] = (),
+    today: date = None,
+) -> List[str]:
+    """
+    Create the partitions of the current month, the next months_ahead months,
+    the given months and every month that has lines in the default partition.
+    Returns the names of the partitions created.
+    """
+
+    # One maintainer at a time, e.g. a migration next to the maintenance job
+    connection.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:name))"),
+        {"name": CLAIM_DETAIL.fullname},
+    )
+
+    current = month_start(today or date.today())
+    wanted = {add_months(current, offset) for offset in range(months_ahead + 1)}
+    wanted.update(map(month_start, months))
+    wanted.update(
+        month_start(month)
+        for (month,) in connection.execute(
+            text(
+                f"SELECT DISTINCT date_trunc('month', service_date) "
+                f"FROM {DEFAULT_PARTITION}"
+            )
+        )
+    )
+
+    created = []
+    for month in sorted(wanted):
+        name = f"{CLAIM_DETAIL.schema}.{partition_name(month)}"
+        if connection.execute(
+            text("SELECT to_regclass(:name)"), {"name": name}
+        ).scalar():
+            continue
+        created.append(create_claim_detail_partition(connection, month))
+
+    detached = set(wanted) - set(list_claim_detail_partitions(connection))
+    if detached:
+        # A detached partition still owns the name, its lines stay in the default
+        logger.warning(
+            f"Months {sorted(map(str, detached))} have detached partitions, "
+            f"their lines stay in {DEFAULT_PARTITION}"
+        )
+
+    return created
+
+
+def detach_claim_detail_partitions(connection, before: date) -> List[str]:
+    """
+    Detach the partitions that end on or before the given date. They stay
+    around as plain tables to be archived or dropped, their lines are taken
+    out of the provider totals.
+    """
+
+    totals = ProviderNetFeeTotalModel.__table__
+
+    connection.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:name))"),
+        {"name": CLAIM_DETAIL.fullname},
+    )
+
+    detached = []
+    for month, name in sorted(list_claim_detail_partitions(connection).items()):
+        if add_months(month, 1) > before:
+            break
+        connection.execute(
+            text(
+                f"ALTER TABLE {CLAIM_DETAIL.fullname} "
+                f"DETACH PARTITION {CLAIM_DETAIL.schema}.{name}"
+            )
+        )
+        # The detach holds ACCESS EXCLUSIVE on claim_detail until commit, no
+        # ingest can add to the totals of these lines meanwhile
+        subtracted = connection.execute(
+            text(
+                f"UPDATE {totals.fullname} AS totals "
+                "SET total_net_fees_cents = "
+                "totals.total_net_fees_cents - detached.net_fees_cents, "
+                "updated = now() "
+                "FROM (SELECT provider_id, sum(net_fees_cents) AS net_fees_cents "
+                f"FROM {CLAIM_DETAIL.schema}.{name} GROUP BY provider_id) AS detached "
+                "WHERE totals.provider_id = detached.provider_id"
+            )
+        )
+        logger.info(
+            f"Detached partition {CLAIM_DETAIL.schema}.{name}, subtracted its lines "
+            f"from {subtracted.rowcount} provider totals"
+        )
+        detached.append(f"{CLAIM_DETAIL.schema}.{name}")
+
+    return detached
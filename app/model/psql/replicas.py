@@ -0,0 +1,212 @@
+"""
+Read replicas of DATABASE_URL (DATABASE_REPLICA_URLS) for the read only claim
+routes, writes always go to the primary.
+
+Every replica is pinged in the background. A replica that can't be reached or
+replays more than max_lag seconds behind the primary is left out until it
+catches up, reads go round robin over the healthy ones and to the primary when
+there is none.
+
+A client that just wrote reads from the primary for sticky_seconds
+(read-your-writes). The worker remembers the client and the write response
+sets a cookie for the other workers. With sticky_seconds above max_lag plus
+the ping interval, a replica serving the client's next reads has the write.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.telemetry.metrics import DB_READS
+
+logger = logging.getLogger(__name__)
+
+# Cookie of the write responses, epoch seconds until which reads use the primary
+PRIMARY_COOKIE = "claims-primary-until"
+
+# Seconds the replica replays behind the primary. An idle primary sends no new
+# transactions, a streaming replica that replayed all it received isn't behind.
+# A standalone server (not in recovery) is never behind.
+REPLICA_LAG_SQL = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+            AND EXISTS (
+                SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming'
+            ) THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+        )
+    END
+    """
+)
+
+
+class Replica(object):
+    def __init__(
+        self, name: str, engine: AsyncEngine, session_factory: sessionmaker
+    ) -> None:
+        self.name = name
+        self.engine = engine
+        self.session_factory = session_factory
+        # Unused until its first ping
+        self.ok = False
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+class ReadReplicas(object):
+    def __init__(
+        self,
+        replicas: List[Replica],
+        max_lag: float = 5,
+        sticky_seconds: float = 10,
+        interval: float = 2,
+        timeout: float = 2,
+        max_clients: int = 10000,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.sticky_seconds = sticky_seconds
+        self.interval = interval
+        self.timeout = timeout
+        self.max_clients = max_clients
+        # Wall clock, sticky deadlines are shared with the other workers
+        self.clock = clock
+        # client -> epoch seconds until which its reads use the primary
+        self._sticky: "OrderedDict[str, float]" = OrderedDict()
+        self._next = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def ping(self, replica: Replica) -> bool:
+        try:
+            async with replica.engine.connect() as connection:
+                if connection.dialect.name == "postgresql":
+                    lag = await asyncio.wait_for(
+                        connection.scalar(REPLICA_LAG_SQL), timeout=self.timeout
+                    )
+                else:
+                    await asyncio.wait_for(
+                        connection.execute(text("SELECT 1")), timeout=self.timeout
+                    )
+                    lag = 0
+        except Exception as e:
+            self.mark_down(replica, e)
+            return False
+
+        replica.lag = float(lag)
+        if replica.lag > self.max_lag:
+            if replica.ok:
+                logger.warning(f"Replica {replica.name} is {replica.lag:.1f}s behind")
+            replica.ok, replica.error = False, f"Replica is {replica.lag:.1f}s behind"
+            return False
+
+        if not replica.ok:
+            logger.info(f"Replica {replica.name} serves reads")
+        replica.ok, replica.error = True, None
+        return True
+
+    def mark_down(self, replica: Replica, error: Exception) -> None:
+        if replica.ok or replica.error is None:
+            logger.warning(f"Replica {replica.name} is unavailable: {error!r}")
+        replica.ok, replica.error = False, repr(error)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.gather(*(self.ping(replica) for replica in self.replicas))
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.replicas:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def stick(self, client: str) -> float:
+        until = self.clock() + self.sticky_seconds
+        self._sticky.pop(client, None)
+        self._sticky[client] = until
+        while len(self._sticky) > self.max_clients:
+            self._sticky.popitem(last=False)
+        return until
+
+    def is_sticky(self, client: str, until: Optional[float] = None) -> bool:
+        now = self.clock()
+        local = self._sticky.get(client)
+        if local is not None and local <= now:
+            del self._sticky[client]
+            local = None
+        # A cookie further out than a write could set is ignored
+        shared = until is not None and now < until <= now + self.sticky_seconds
+        return local is not None or shared
+
+    def route(self, client: str, until: Optional[float] = None) -> Optional[Replica]:
+        """The replica serving a read of client, None for the primary"""
+        if not self.replicas:
+            return None
+        if self.is_sticky(client, until):
+            DB_READS.labels("sticky").inc()
+            return None
+
+        healthy = [replica for replica in self.replicas if replica.ok]
+        if not healthy:
+            DB_READS.labels("primary").inc()
+            return None
+        self._next = (self._next + 1) % len(healthy)
+        DB_READS.labels("replica").inc()
+        return healthy[self._next]
+
+    @asynccontextmanager
+    async def session(
+        self,
+        primary: sessionmaker,
+        client: str,
+        until: Optional[float] = None,
+    ) -> AsyncIterator[AsyncSession]:
+        db_session = None
+        replica = self.route(client, until)
+        if replica is not None:
+            db_session = replica.session_factory()
+            try:
+                # Connects up front, a replica gone since its last ping falls
+                # back to the primary instead of failing the request
+                await asyncio.wait_for(db_session.connection(), timeout=self.timeout)
+            except (SQLAlchemyError, OSError, asyncio.TimeoutError) as e:
+                await db_session.close()
+                self.mark_down(replica, e)
+                DB_READS.labels("fallback").inc()
+                db_session = None
+
+        if db_session is None:
+            db_session = primary()
+        async with db_session:
+            yield db_session
+
+    def status(self) -> List[dict]:
+        return [
+            {
+                "name": replica.name,
+                "ok": replica.ok,
+                "lagSeconds": None if replica.lag is None else round(replica.lag, 3),
+                "error": replica.error,
+            }
+            for replica in self.replicas
+        ]
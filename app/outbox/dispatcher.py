@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import traceback
+from typing import Optional
+
+from sqlalchemy.orm import sessionmaker
+
+from app.outbox.sinks import PaymentEventSink
+from app.outbox.store import OutboxStore
+
+logger = logging.getLogger(__name__)
+
+
+def event_message(row) -> dict:
+    return {
+        "eventId": row.id,
+        "eventType": row.event_type,
+        "claimId": row.claim_id,
+        "payload": row.payload,
+        "createdAt": row.created.isoformat() if row.created else None,
+    }
+
+
+class OutboxDispatcher(object):
+    """
+    Drains payment_outbox in batches into a sink.
+
+    Every batch is one transaction: the claimed rows are locked with SKIP
+    LOCKED, published, then deleted. A failed publish pushes the batch back
+    with backoff, rows that used up max_attempts move to payment_dead_letter.
+    Any number of workers can run a dispatcher side by side.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        sink: PaymentEventSink,
+        batch_size: int = 100,
+        poll_interval: float = 1.0,
+        max_attempts: int = 10,
+        backoff_base: float = 1.0,
+        backoff_max: float = 300.0,
+        store_class=OutboxStore,
+    ) -> None:
+        self.session_factory = session_factory
+        self.sink = sink
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.store_class = store_class
+
+        self.published = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def dispatch_once(self) -> int:
+        async with self.session_factory() as db_session:
+            store = self.store_class(db_session)
+            rows = await store.claim_batch(self.batch_size)
+            if not rows:
+                await db_session.rollback()
+                return 0
+
+            try:
+                await self.sink.publish([event_message(row) for row in rows])
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                logger.warning(f"Publishing {len(rows)} payment events failed: {error}")
+
+                dead = [row.id for row in rows if row.attempts + 1 >= self.max_attempts]
+                retry = [row.id for row in rows if row.attempts + 1 < self.max_attempts]
+                if retry:
+                    await store.retry(retry, error, self.backoff_base, self.backoff_max)
+                if dead:
+                    logger.error(f"Dead lettering payment events {dead}: {error}")
+                    await store.dead_letter(dead, error)
+
+                self.retried += len(retry)
+                self.dead_lettered += len(dead)
+            else:
+                await store.delete([row.id for row in rows])
+                self.published += len(rows)
+
+            await db_session.commit()
+            return len(rows)
+
+    async def run(self) -> None:
+        logger.info("Payment outbox dispatcher started")
+        idle_delay = self.poll_interval
+        while not self._stopping.is_set():
+            try:
+                dispatched = await self.dispatch_once()
+                idle_delay = self.poll_interval
+            except Exception as e:
+                # Database trouble, back off the polling itself
+                logger.error(f"Payment outbox dispatch failed: {e}")
+                logger.error(f"Traceback: {traceback.format_exc()}")
+                dispatched = 0
+                idle_delay = min(idle_delay * 2, self.backoff_max)
+
+            # A full batch means more is waiting, go again right away
+            if dispatched < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=idle_delay)
+                except asyncio.TimeoutError:
+                    pass
+
+        logger.info("Payment outbox dispatcher stopped")
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.sink.close()
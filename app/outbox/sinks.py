@@ -0,0 +1,63 @@
+import asyncio
+import json
+import logging
+import os
+from typing import List
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentEventSink(object):
+    """
+    Destination of payment events. publish either accepts the whole batch or
+    raises, delivery is at least once so consumers dedupe on eventId.
+    """
+
+    async def publish(self, events: List[dict]) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryPaymentEventSink(PaymentEventSink):
+    """Keeps published events in a list, for tests and local runs"""
+
+    def __init__(self) -> None:
+        self.events: List[dict] = []
+
+    async def publish(self, events: List[dict]) -> None:
+        self.events.extend(events)
+
+
+class FilePaymentEventSink(PaymentEventSink):
+    """
+    Appends events as JSON lines and fsyncs before acknowledging, stand-in
+    for a queue or stream until payment processing picks one
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    async def publish(self, events: List[dict]) -> None:
+        data = "".join(json.dumps(event, default=str) + "\n" for event in events)
+        await asyncio.to_thread(self._append, data)
+
+    def _append(self, data: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as sink_file:
+            sink_file.write(data)
+            sink_file.flush()
+            os.fsync(sink_file.fileno())
+
+
+def initialize_payment_sink() -> PaymentEventSink:
+    if config.payment_sink == "file":
+        return FilePaymentEventSink(path=config.payment_sink_path)
+
+    if config.payment_sink == "memory":
+        logger.warning("PAYMENT_SINK=memory, payment events are not persisted")
+        return MemoryPaymentEventSink()
+
+    raise RuntimeError(f"Unknown PAYMENT_SINK {config.payment_sink}")
@@ -0,0 +1,117 @@
+from typing import List
+
+from sqlalchemy import delete, func, insert, literal, literal_column, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.model.psql.orm import (
+    ClaimDetailModel,
+    PaymentDeadLetterModel,
+    PaymentOutboxModel,
+)
+
+CLAIM_PROCESSED_EVENT = "claim.processed"
+
+
+async def enqueue_claim_processed(db_session: AsyncSession, claim_id: int) -> None:
+    """
+    Add the payment event of a claim to the outbox. Runs on the caller's
+    session so the event commits or rolls back with the claim lines.
+    """
+
+    await enqueue_claims_processed(db_session=db_session, claim_ids=[claim_id])
+
+
+async def enqueue_claims_processed(
+    db_session: AsyncSession, claim_ids: List[int]
+) -> None:
+    # One event per claim, claims without lines get none
+    # Keys are inlined, asyncpg can't infer types of jsonb_build_object's
+    # variadic parameters
+    await db_session.execute(
+        insert(PaymentOutboxModel).from_select(
+            ["claim_id", "event_type", "payload"],
+            select(
+                ClaimDetailModel.claim_id,
+                literal(CLAIM_PROCESSED_EVENT),
+                func.jsonb_build_object(
+                    literal_column("'claimId'"),
+                    ClaimDetailModel.claim_id,
+                    literal_column("'lines'"),
+                    func.count(),
+                    literal_column("'netFeesCents'"),
+                    func.sum(ClaimDetailModel.net_fees_cents),
+                ),
+            )
+            .where(ClaimDetailModel.claim_id.in_(claim_ids))
+            .group_by(ClaimDetailModel.claim_id),
+        )
+    )
+
+
+class OutboxStore(object):
+    """
+    Outbox statements of one dispatch transaction. Claimed rows stay locked
+    until commit, concurrent dispatchers skip them instead of waiting.
+    """
+
+    def __init__(self, db_session: AsyncSession) -> None:
+        self.db_session = db_session
+
+    async def claim_batch(self, limit: int) -> List[Row]:
+        result = await self.db_session.execute(
+            select(PaymentOutboxModel.__table__)
+            .where(PaymentOutboxModel.available_at <= func.now())
+            .order_by(PaymentOutboxModel.available_at, PaymentOutboxModel.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return result.all()
+
+    async def delete(self, ids: List[int]) -> None:
+        await self.db_session.execute(
+            delete(PaymentOutboxModel).where(PaymentOutboxModel.id.in_(ids))
+        )
+
+    async def retry(
+        self, ids: List[int], error: str, backoff_base: float, backoff_max: float
+    ) -> None:
+        # Exponential backoff on the row's own attempt count with up to 50%
+        # jitter so a sink outage doesn't retry every event in lockstep
+        delay = func.least(
+            backoff_base * func.power(2, PaymentOutboxModel.attempts), backoff_max
+        ) * (0.5 + func.random() / 2)
+        await self.db_session.execute(
+            update(PaymentOutboxModel)
+            .where(PaymentOutboxModel.id.in_(ids))
+            .values(
+                attempts=PaymentOutboxModel.attempts + 1,
+                available_at=func.now() + func.make_interval(0, 0, 0, 0, 0, 0, delay),
+                last_error=error,
+            )
+        )
+
+    async def dead_letter(self, ids: List[int], error: str) -> None:
+        await self.db_session.execute(
+            insert(PaymentDeadLetterModel).from_select(
+                [
+                    "id",
+                    "claim_id",
+                    "event_type",
+                    "payload",
+                    "attempts",
+                    "last_error",
+                    "created",
+                ],
+                select(
+                    PaymentOutboxModel.id,
+                    PaymentOutboxModel.claim_id,
+                    PaymentOutboxModel.event_type,
+                    PaymentOutboxModel.payload,
+                    PaymentOutboxModel.attempts + 1,
+                    literal(error),
+                    PaymentOutboxModel.created,
+                ).where(PaymentOutboxModel.id.in_(ids)),
+            )
+        )
+        await self.delete(ids)
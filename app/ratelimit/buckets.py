@@ -0,0 +1,201 @@
+"""
+Token bucket stores of the API rate limits.
+
+A take refills the bucket for the time since its last take (capacity tokens
+per period, never more than capacity) and grants tokens from it in one atomic
+step. A bucket well above its lease (twice the lease) grants the whole lease
+so the worker can serve the next requests of the client locally, otherwise
+one token at most.
+
+A bucket untouched for the period of its limit is full again, the same as a
+bucket that doesn't exist. The shared store deletes such rows periodically so
+rate_limit_bucket holds the recently active clients only.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.model.psql.orm import RateLimitBucketModel
+
+logger = logging.getLogger(__name__)
+
+# Full buckets are deleted once an hour per worker
+BUCKET_PURGE_INTERVAL = 3600
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class RateLimit(NamedTuple):
+    capacity: int
+    period: float
+
+    @property
+    def refill_rate(self) -> float:
+        # Tokens per second
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimit":
+        # "10/minute", count per second, minute, hour or day
+        count, _, period = value.strip().partition("/")
+        if period not in PERIODS or int(count) < 1:
+            raise ValueError(f"Invalid rate limit {value}")
+        return cls(capacity=int(count), period=PERIODS[period])
+
+
+def parse_rate_limits(value: Optional[str]) -> Dict[str, RateLimit]:
+    # "top_providers=10/minute,claims=100/second" -> {route: RateLimit}
+    limits = {}
+    for item in filter(None, (value or "").split(",")):
+        route, _, limit = item.partition("=")
+        limits[route.strip()] = RateLimit.parse(limit)
+    return limits
+
+
+class TokenBucketStore(object):
+    async def take(self, key: str, limit: RateLimit, lease: int) -> Tuple[int, float]:
+        """
+        Returns the tokens granted (0 when the bucket is empty) and the tokens
+        left in the bucket
+        """
+
+        raise NotImplementedError
+
+
+def granted_tokens(tokens: float, lease: int) -> int:
+    if tokens >= 2 * lease:
+        return lease
+    return 1 if tokens >= 1 else 0
+
+
+class LocalTokenBucketStore(TokenBucketStore):
+    """
+    In process stand-in for the shared store, same grants as
+    PostgresTokenBucketStore. Meant for tests and local runs.
+    """
+
+    def __init__(
+        self, max_entries: int = 10000, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.max_entries = max_entries
+        self.clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, limit: RateLimit, lease: int) -> Tuple[int, float]:
+        now = self.clock()
+        tokens, updated = self._buckets.pop(key, (limit.capacity, now))
+        tokens = min(limit.capacity, tokens + (now - updated) * limit.refill_rate)
+
+        granted = granted_tokens(tokens, lease)
+        self._buckets[key] = (tokens - granted, now)
+        # A dropped bucket comes back full, the least recently used one goes
+        while len(self._buckets) > self.max_entries:
+            self._buckets.popitem(last=False)
+
+        return granted, tokens - granted
+
+
+class PostgresTokenBucketStore(TokenBucketStore):
+    """
+    Buckets in the rate_limit_bucket table, shared by every worker. A take is
+    one autocommitted upsert, a single round trip without BEGIN and COMMIT.
+    The row lock of the conflict serializes concurrent takes of one bucket.
+    """
+
+    CAPACITY = "CAST(:capacity AS double precision)"
+    REFILLED = (
+        f"LEAST({CAPACITY}, bucket.tokens"
+        " + EXTRACT(EPOCH FROM statement_timestamp() - bucket.updated)"
+        " * CAST(:refill_rate AS double precision))"
+    )
+
+    def __init__(
+        self,
+        get_engine: Callable[[], AsyncEngine],
+        retention_seconds: float = PERIODS["day"],
+        purge_interval: float = BUCKET_PURGE_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        # The app's engine is created lazily, it's looked up on every take
+        self.get_engine = get_engine
+        # Longest period of the limits, a bucket untouched for it is full
+        self.retention_seconds = retention_seconds
+        self.purge_interval = purge_interval
+        self.clock = clock
+        self.purged_at: Optional[float] = None
+        self.statement = text(
+            f"""
+            INSERT INTO {RateLimitBucketModel.__table__.fullname} AS bucket
+                (key, tokens, granted, updated)
+            VALUES (
+                :key,
+                {self.CAPACITY} - {self.grant(self.CAPACITY)},
+                {self.grant(self.CAPACITY)},
+                statement_timestamp()
+            )
+            ON CONFLICT (key) DO UPDATE SET
+                tokens = {self.REFILLED} - {self.grant(self.REFILLED)},
+                granted = {self.grant(self.REFILLED)},
+                updated = statement_timestamp()
+            RETURNING bucket.granted, bucket.tokens
+            """
+        )
+        # No index on updated: it changes on every take and an index would
+        # turn those HOT updates into index writes, the hourly scan is cheaper
+        self.purge_statement = text(
+            f"""
+            DELETE FROM {RateLimitBucketModel.__table__.fullname}
+            WHERE updated < statement_timestamp()
+                - CAST(:retention_seconds AS double precision) * interval '1 second'
+            """
+        )
+
+    @staticmethod
+    def grant(tokens: str) -> str:
+        # granted_tokens in SQL
+        return (
+            f"(CASE WHEN {tokens} >= 2 * CAST(:lease AS integer)"
+            f" THEN CAST(:lease AS integer) WHEN {tokens} >= 1 THEN 1 ELSE 0 END)"
+        )
+
+    async def take(self, key: str, limit: RateLimit, lease: int) -> Tuple[int, float]:
+        async with self.get_engine().connect() as connection:
+            connection = await connection.execution_options(
+                isolation_level="AUTOCOMMIT"
+            )
+            granted, tokens = (
+                await connection.execute(
+                    self.statement,
+                    {
+                        "key": key,
+                        "capacity": float(limit.capacity),
+                        "refill_rate": limit.refill_rate,
+                        "lease": lease,
+                    },
+                )
+            ).one()
+
+        await self.purge_buckets()
+        return granted, tokens
+
+    async def purge_buckets(self) -> None:
+        now = self.clock()
+        if self.purged_at is not None and now - self.purged_at <= self.purge_interval:
+            return
+
+        self.purged_at = now
+        # Not failing the take that happened to run it, the next interval retries
+        try:
+            async with self.get_engine().begin() as connection:
+                result = await connection.execute(
+                    self.purge_statement,
+                    {"retention_seconds": self.retention_seconds},
+                )
+            logger.info(f"Purged {result.rowcount} full rate limit buckets")
+        except Exception as e:
+            logger.warning(f"Purging rate limit buckets failed: {e}")
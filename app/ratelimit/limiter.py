@@ -0,0 +1,154 @@
+"""
+Per route rate limits keyed on the authenticated client (tenant and sub of
+authenticate_user) instead of the client address.
+
+Buckets live in a store shared by every worker (RATE_LIMIT_BACKEND=postgres)
+so a limit holds whatever the number of workers. A client well under its
+limit gets a few tokens leased to the worker, its next requests are served
+from the lease without a round trip to the store.
+"""
+
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import Depends, HTTPException
+
+from app import config
+from app.authorizer.authorizer import authenticate_user
+from app.ratelimit.buckets import (
+    LocalTokenBucketStore,
+    PostgresTokenBucketStore,
+    RateLimit,
+    TokenBucketStore,
+    parse_rate_limits,
+)
+from app.telemetry.metrics import RATE_LIMIT_CHECKS
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitDecision(NamedTuple):
+    allowed: bool
+    retry_after: float = 0.0
+
+
+class RateLimiter(object):
+    """
+    A failing store never fails a request, the check lets it through and
+    logs a warning.
+    """
+
+    def __init__(
+        self,
+        store: Optional[TokenBucketStore],
+        limits: Dict[str, RateLimit],
+        lease_fraction: float = 0.1,
+        lease_seconds: float = 1,
+        max_leases: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.store = store
+        self.limits = limits
+        self.lease_fraction = lease_fraction
+        self.lease_seconds = lease_seconds
+        self.max_leases = max_leases
+        self.clock = clock
+        # key -> (tokens, expires), tokens already taken from the shared bucket
+        self._leases: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+
+    def lease_size(self, limit: RateLimit) -> int:
+        # A lease of 1 keeps nothing in the worker: limits under 2 / fraction
+        # tokens, e.g. 10/minute at 0.1, check the store on every request
+        return max(1, int(limit.capacity * self.lease_fraction))
+
+    async def check(self, route: str, client: str) -> RateLimitDecision:
+        limit = self.limits.get(route)
+        if self.store is None or limit is None:
+            return RateLimitDecision(allowed=True)
+
+        key = f"{route}:{client}"
+        now = self.clock()
+        tokens, expires = self._leases.pop(key, (0, 0.0))
+        if tokens > 0 and expires > now:
+            if tokens > 1:
+                self._leases[key] = (tokens - 1, expires)
+            RATE_LIMIT_CHECKS.labels(route, "local").inc()
+            return RateLimitDecision(allowed=True)
+
+        try:
+            granted, remaining = await self.store.take(
+                key, limit, self.lease_size(limit)
+            )
+        except Exception as e:
+            logger.warning(f"Rate limit check of {key} failed: {e}")
+            RATE_LIMIT_CHECKS.labels(route, "error").inc()
+            return RateLimitDecision(allowed=True)
+
+        if granted == 0:
+            RATE_LIMIT_CHECKS.labels(route, "denied").inc()
+            return RateLimitDecision(
+                allowed=False, retry_after=(1 - remaining) / limit.refill_rate
+            )
+
+        # Unused leased tokens expire, a worker can't save them up for a burst
+        if granted > 1:
+            self._leases[key] = (granted - 1, now + self.lease_seconds)
+            while len(self._leases) > self.max_leases:
+                self._leases.popitem(last=False)
+        RATE_LIMIT_CHECKS.labels(route, "shared").inc()
+        return RateLimitDecision(allowed=True)
+
+
+def initialize_rate_limit_store(
+    limits: Dict[str, RateLimit],
+) -> Optional[TokenBucketStore]:
+    if config.rate_limit_backend == "none":
+        return None
+
+    if config.rate_limit_backend == "local":
+        # Per worker buckets, a limit is multiplied by the number of workers
+        return LocalTokenBucketStore()
+
+    if config.rate_limit_backend == "postgres":
+        from app import get_engine
+
+        return PostgresTokenBucketStore(
+            get_engine=get_engine,
+            retention_seconds=max(
+                (limit.period for limit in limits.values()), default=0
+            ),
+        )
+
+    raise RuntimeError(f"Unknown RATE_LIMIT_BACKEND {config.rate_limit_backend}")
+
+
+rate_limits = parse_rate_limits(config.rate_limits)
+rate_limiter = RateLimiter(
+    store=initialize_rate_limit_store(rate_limits),
+    limits=rate_limits,
+    lease_fraction=config.rate_limit_lease_fraction,
+    lease_seconds=config.rate_limit_lease_seconds,
+)
+
+
+def rate_limit(route: str):
+    """Route dependency enforcing the RATE_LIMITS entry of route"""
+
+    async def check_rate_limit(
+        auth: dict = Depends(authenticate_user, use_cache=True),
+    ) -> None:
+        decision = await rate_limiter.check(route, f"{auth['tenant']}:{auth['sub']}")
+        if not decision.allowed:
+            raise HTTPException(
+                detail="Too Many Requests.",
+                status_code=429,
+                headers={
+                    "Content-Type": "application/json",
+                    "Retry-After": str(math.ceil(decision.retry_after)),
+                },
+            )
+
+    return check_rate_limit
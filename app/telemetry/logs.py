@@ -0,0 +1,190 @@
+"""
+Logging pipeline of the API workers.
+
+Request code only builds a record and puts it on a bounded queue, a
+QueueListener thread formats and writes them. The trace id is read from
+request_id_context when the record is queued, the listener thread doesn't
+see the request's context. Hot loggers can be sampled (LOG_SAMPLING) or
+rate limited (LOG_RATE_LIMITS), warnings and errors always go through. A
+setting applies to the logger and its children, e.g. sqlalchemy.engine
+covers sqlalchemy.engine.Engine.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.config
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from app.telemetry.trace import request_id_context
+
+TEXT_FORMAT = (
+    "%(asctime)s.%(msecs)03d [%(levelname)s] %(name)s "
+    "[Trace ID: %(trace_id)s]: %(message)s"
+)
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class ContextAwareFormatter(logging.Formatter):
+    def format(self, record):
+        if not hasattr(record, "trace_id"):
+            record.trace_id = request_id_context.get("N/A")
+        return super().format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line for log shippers
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", None)
+            or request_id_context.get("N/A"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TraceQueueHandler(QueueHandler):
+    """
+    Queues records with their trace id. A full queue drops the record and
+    counts it instead of blocking the event loop.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Unlike QueueHandler.prepare, no formatting here: the message, args
+        # and exc_info reach the listener thread's formatter as they are
+        record = copy.copy(record)
+        record.trace_id = request_id_context.get("N/A")
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    # Keeps one in every round(1 / rate) records below WARNING of the logger
+    # name and its children, other records pass
+    def __init__(self, rate: float, name: str = "") -> None:
+        super().__init__(name)
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._seen = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not super().filter(record):
+            return True
+        if not self.every:
+            return False
+
+        self._seen += 1
+        return (self._seen - 1) % self.every == 0
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most per_second records below WARNING of the logger name and its
+    children through per second, the first record of the next second reports
+    how many were suppressed. Other records pass.
+    """
+
+    def __init__(self, per_second: int, name: str = "", clock=time.monotonic) -> None:
+        super().__init__(name)
+        self.per_second = per_second
+        self.clock = clock
+        self._window = 0
+        self._passed = 0
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not super().filter(record):
+            return True
+
+        window = int(self.clock())
+        with self._lock:
+            if window != self._window:
+                if self._suppressed:
+                    record.msg = (
+                        f"{record.msg} ({self._suppressed} earlier messages "
+                        "suppressed by rate limit)"
+                    )
+                self._window, self._passed, self._suppressed = window, 0, 0
+
+            if self._passed >= self.per_second:
+                self._suppressed += 1
+                return False
+            self._passed += 1
+            return True
+
+
+def parse_logger_settings(value: Optional[str]) -> Dict[str, float]:
+    # "app.api.claims=0.1,sqlalchemy.engine=0.01" -> {logger: number}
+    settings = {}
+    for item in filter(None, (value or "").split(",")):
+        name, _, number = item.partition("=")
+        settings[name.strip()] = float(number)
+    return settings
+
+
+def configure_logging(config) -> Optional[QueueListener]:
+    formatter = (
+        JsonFormatter()
+        if config.log_format == "json"
+        else ContextAwareFormatter(fmt=TEXT_FORMAT, datefmt=DATE_FORMAT)
+    )
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    listener = None
+    handler = stream_handler
+    if config.log_queue_size > 0:
+        handler = TraceQueueHandler(queue.Queue(maxsize=config.log_queue_size))
+        listener = QueueListener(handler.queue, stream_handler)
+        listener.start()
+        atexit.register(listener.stop)
+
+    logging.config.dictConfig(
+        {
+            "version": 1,
+            "disable_existing_loggers": config.disable_existing_logger,
+            "loggers": {
+                "": {"level": config.app_log_level},
+                "uvicorn.access": {"level": config.api_log_level, "propagate": False},
+                # Statements are only logged with DATABASE_ECHO
+                "sqlalchemy.engine": {
+                    "level": "INFO" if config.database_echo else "WARNING"
+                },
+            },
+        }
+    )
+
+    # uvicorn installs its own stdout handlers before the app is imported
+    for name in ("", "uvicorn", "uvicorn.access"):
+        logging.getLogger(name).handlers = [handler]
+
+    # On the handler rather than the loggers: a logger's filters skip the
+    # records propagated from its children
+    for name, rate in parse_logger_settings(config.log_sampling).items():
+        handler.addFilter(SamplingFilter(rate, name=name))
+    for name, per_second in parse_logger_settings(config.log_rate_limits).items():
+        handler.addFilter(RateLimitFilter(int(per_second), name=name))
+
+    return listener
@@ -0,0 +1,165 @@
+"""
+Prometheus metrics of the API workers.
+
+With PROMETHEUS_MULTIPROC_DIR set (the Dockerfile does) every uvicorn worker
+writes its samples to memory mapped files in that directory and /metrics
+aggregates the files of all workers, whichever worker serves the scrape.
+Without it the metrics are the serving process' own.
+"""
+
+import os
+import time
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+REQUESTS = Counter(
+    "claim_app_http_requests_total",
+    "HTTP requests by route, method and status",
+    ["route", "method", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "claim_app_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+CLAIM_LINES_INGESTED = Counter(
+    "claim_app_claim_lines_ingested_total",
+    "Claim lines committed, by ingest route",
+    ["route"],
+)
+GROUP_COMMIT_CLAIMS = Counter(
+    "claim_app_group_commit_claims_total",
+    "Claims handed to the group commit writer by outcome (committed, failed or "
+    "rejected on a full queue)",
+    ["result"],
+)
+GROUP_COMMIT_SIZE = Histogram(
+    "claim_app_group_commit_size",
+    "Claims written per group commit transaction",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+)
+VALIDATION_FAILURES = Counter(
+    "claim_app_validation_failures_total",
+    "Claim payloads or claim file rows rejected by validation, by route",
+    ["route"],
+)
+CACHE_LOOKUPS = Counter(
+    "claim_app_cache_lookups_total",
+    "Cache lookups by cache and result (hit or miss)",
+    ["cache", "result"],
+)
+RATE_LIMIT_CHECKS = Counter(
+    "claim_app_rate_limit_checks_total",
+    "Rate limit checks by route and result (local, shared, denied or error)",
+    ["route", "result"],
+)
+DB_READS = Counter(
+    "claim_app_db_reads_total",
+    "Read only route sessions by database: replica, primary (no healthy "
+    "replica), sticky (client wrote recently) or fallback (replica failed)",
+    ["target"],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "claim_app_db_pool_checked_out",
+    "Database connections in use",
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "claim_app_db_pool_overflow",
+    "Database connections open beyond the pool size",
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Histogram(
+    "claim_app_db_pool_wait_seconds",
+    "Time to get a database connection from the pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    # The pool has no event before a checkout starts, the wait is timed here
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+
+def instrument_pool(pool, overflow: bool = True) -> None:
+    # Overflow is sampled on checkout and checkin, it can trail a connection
+    # that is closed right after its checkin. Only QueuePools (postgres) keep
+    # it, and only the primary pool reports it.
+    overflow = overflow and hasattr(pool, "overflow")
+
+    def checkout(*args) -> None:
+        DB_POOL_CHECKED_OUT.inc()
+        if overflow:
+            DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+    def checkin(*args) -> None:
+        DB_POOL_CHECKED_OUT.dec()
+        if overflow:
+            DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+    event.listen(pool, "checkout", checkout)
+    event.listen(pool, "checkin", checkin)
+
+
+class MetricsMiddleware(object):
+    """
+    Pure ASGI middleware counting and timing requests by route name, e.g.
+    process_claim. Paths that match no route share the "unmatched" label.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "name", None) or "unmatched"
+            REQUESTS.labels(route, scope["method"], str(status)).inc()
+            REQUEST_LATENCY.labels(route).observe(time.perf_counter() - started)
+
+
+def render_metrics() -> bytes:
+    if MULTIPROC_DIR is None:
+        return generate_latest(REGISTRY)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def mark_worker_dead() -> None:
+    # Drops this worker's live gauges from the aggregate
+    if MULTIPROC_DIR is not None:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,201 @@
+"""
+Per request profile of where the time goes: SQL (query count and time from
+the cursor execute events), claim validation and response serialization.
+
+ProfilingMiddleware opens a RequestProfile for every request and can report
+it in a Server-Timing response header. Statements executed repeatedly within
+one request (N+1 patterns) and slow statements, with their plan, are logged.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+
+class RequestProfile(object):
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: Counter = Counter()
+        self.phases: Dict[str, float] = defaultdict(float)
+        self.endpoint_returned: Optional[float] = None
+
+    def record_query(self, statement: str, seconds: float) -> None:
+        self.queries += 1
+        self.db_seconds += seconds
+        # Chunked inserts repeat by design, N+1 patterns are reads
+        if statement.lstrip()[:6].upper() == "SELECT":
+            self.statements[statement] += 1
+
+    def repeated_statements(self, threshold: int) -> Dict[str, int]:
+        return {
+            statement: count
+            for statement, count in self.statements.items()
+            if count >= threshold
+        }
+
+    def server_timing(self) -> str:
+        timings = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"']
+        timings.extend(
+            f"{phase};dur={seconds * 1000:.1f}"
+            for phase, seconds in self.phases.items()
+        )
+        timings.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(timings)
+
+
+request_profile_context: contextvars.ContextVar[Optional[RequestProfile]] = (
+    contextvars.ContextVar("request_profile", default=None)
+)
+
+
+@contextmanager
+def profile_phase(name: str):
+    profile = request_profile_context.get()
+    if profile is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.phases[name] += time.perf_counter() - started
+
+
+def explain(cursor, statement: str, parameters) -> Optional[str]:
+    # Plan only, EXPLAIN without ANALYZE doesn't run the statement again
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute(f"EXPLAIN {statement}", parameters)
+        return "\n".join(row[0] for row in explain_cursor.fetchall())
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        explain_cursor.close()
+
+
+def instrument_engine(engine, slow_query_ms: float, explain_slow: bool) -> None:
+    """
+    Time every cursor execute of a sync engine (an async engine's
+    sync_engine) into the request profile and log the slow ones.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        seconds = time.perf_counter() - conn.info["query_started"].pop()
+
+        profile = request_profile_context.get()
+        if profile is not None:
+            profile.record_query(statement, seconds)
+
+        if seconds * 1000 >= slow_query_ms:
+            plan = None
+            if explain_slow and not many and conn.dialect.name == "postgresql":
+                plan = explain(cursor, statement, parameters)
+            logger.warning(
+                "Slow query %.1fms: %s\nPlan:\n%s", seconds * 1000, statement, plan
+            )
+
+
+class ProfiledAPIRoute(APIRoute):
+    """
+    Marks the moment the endpoint returns, what the route handler does after
+    that (response model validation, encoding, rendering) is the serialize
+    phase of the profile.
+    """
+
+    def get_route_handler(self):
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint):
+
+            async def timed_endpoint(**values):
+                try:
+                    return await endpoint(**values)
+                finally:
+                    profile = request_profile_context.get()
+                    if profile is not None:
+                        profile.endpoint_returned = time.perf_counter()
+
+            self.dependant.call = timed_endpoint
+
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request):
+            response = await handler(request)
+            profile = request_profile_context.get()
+            if profile is not None and profile.endpoint_returned is not None:
+                profile.phases["serialize"] += (
+                    time.perf_counter() - profile.endpoint_returned
+                )
+            return response
+
+        return profiled_handler
+
+
+class ProfilingMiddleware(object):
+    """
+    Pure ASGI middleware opening the request profile, adding Server-Timing
+    when enabled and logging repeated statements once the request is done.
+    """
+
+    def __init__(
+        self, app, server_timing: bool = False, repeated_query_threshold: int = 5
+    ) -> None:
+        self.app = app
+        self.server_timing = server_timing
+        self.repeated_query_threshold = repeated_query_threshold
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = request_profile_context.set(profile)
+
+        async def send_with_server_timing(message) -> None:
+            if message["type"] == "http.response.start" and self.server_timing:
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"server-timing", profile.server_timing().encode("ascii")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_server_timing)
+        finally:
+            request_profile_context.reset(token)
+
+            for statement, count in profile.repeated_statements(
+                self.repeated_query_threshold
+            ).items():
+                logger.warning(
+                    "Statement executed %s times in %s %s, N+1 pattern? %s",
+                    count,
+                    scope["method"],
+                    scope["path"],
+                    statement,
+                )
+            logger.debug(
+                "%s %s: %s queries, %.1fms db, phases %s",
+                scope["method"],
+                scope["path"],
+                profile.queries,
+                profile.db_seconds * 1000,
+                dict(profile.phases),
+            )
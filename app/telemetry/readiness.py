@@ -0,0 +1,115 @@
+"""
+Database readiness of a worker for GET /health/ready.
+
+A background task pings the database every interval and keeps the outcome,
+the probe endpoint only reads it. Load balancer probes never take a pool
+connection, whatever their rate.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app import config, get_engine
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseReadiness(object):
+    def __init__(
+        self,
+        get_engine: Callable[[], AsyncEngine],
+        interval: float = 5,
+        timeout: float = 2,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.get_engine = get_engine
+        self.interval = interval
+        self.timeout = timeout
+        self.clock = clock
+        self.ok = False
+        self.checked_at: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def ping(self) -> bool:
+        started = self.clock()
+        try:
+            async with self.get_engine().connect() as connection:
+                await asyncio.wait_for(
+                    connection.execute(text("SELECT 1")), timeout=self.timeout
+                )
+        except Exception as e:
+            if self.ok or self.checked_at is None:
+                logger.warning(f"Database ping failed: {e!r}")
+            self.ok, self.error = False, repr(e)
+        else:
+            if not self.ok and self.checked_at is not None:
+                logger.info("Database ping succeeded again")
+            self.ok, self.error = True, None
+
+        self.checked_at = self.clock()
+        self.latency = self.checked_at - started
+        return self.ok
+
+    async def run(self) -> None:
+        while True:
+            await self.ping()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def ready(self) -> bool:
+        # A ping that stopped reporting, e.g. stuck on the pool, isn't ready
+        return (
+            self.ok
+            and self.checked_at is not None
+            and self.clock() - self.checked_at <= 3 * self.interval + self.timeout
+        )
+
+    def status(self) -> dict:
+        pool = self.get_engine().sync_engine.pool
+        return {
+            "status": "OK" if self.ready() else "UNAVAILABLE",
+            "database": {
+                "ok": self.ok,
+                "checkedSecondsAgo": None
+                if self.checked_at is None
+                else round(self.clock() - self.checked_at, 3),
+                "latencyMs": None
+                if self.latency is None
+                else round(self.latency * 1000, 2),
+                "error": self.error,
+            },
+            # QueuePool figures, other pools (sqlite) don't keep them
+            "pool": {
+                "size": pool.size(),
+                "checkedOut": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+            }
+            if hasattr(pool, "overflow")
+            else {},
+        }
+
+
+def initialize_database_readiness() -> DatabaseReadiness:
+    return DatabaseReadiness(
+        get_engine,
+        interval=config.readiness_ping_interval,
+        timeout=config.readiness_ping_timeout,
+    )
+
+
+database_readiness = initialize_database_readiness()
@@ -0,0 +1,69 @@
+"""
+Per request trace id, taken from the W3C traceparent or x-request-id request
+header or generated, kept in request_id_context for the log records and
+echoed back in the x-request-id response header.
+"""
+
+import contextvars
+import re
+import secrets
+from typing import Iterable, Optional, Tuple
+
+request_id_context = contextvars.ContextVar("request_id", default="N/A")
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# version-traceid-parentid-flags, an all zero trace id is invalid
+TRACEPARENT = re.compile(
+    rb"^[0-9a-f]{2}-(?!0{32})([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}"
+)
+# Client ids end up in logs and response headers, only plain tokens are taken
+REQUEST_ID = re.compile(rb"^[A-Za-z0-9._:-]{1,128}$")
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def trace_id_from_headers(headers: Iterable[Tuple[bytes, bytes]]) -> Optional[str]:
+    request_id = None
+    for name, value in headers:
+        if name == b"traceparent":
+            match = TRACEPARENT.match(value)
+            if match:
+                return match[1].decode("ascii")
+        elif name == b"x-request-id" and REQUEST_ID.match(value):
+            request_id = value.decode("ascii")
+
+    return request_id
+
+
+class TraceIdMiddleware(object):
+    """
+    Pure ASGI middleware, the app runs in the same task and sees the request
+    messages untouched, only the response start gets one more header.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = trace_id_from_headers(scope["headers"]) or new_trace_id()
+        token = request_id_context.set(trace_id)
+
+        async def send_with_trace_id(message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"x-request-id", trace_id.encode("ascii")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            request_id_context.reset(token)
@@ -0,0 +1,365 @@
+"""
+Offline bulk loader for historical claim files in the claim_1234.csv layout.
+
+Every file becomes one claim. Files are parsed, validated and priced in a
+process pool, the parent COPYs the lines into a temporary staging table and
+merges them into provider, patient, claim, claim_detail and the provider
+net fee totals with set based statements, one transaction per batch.
+
+    python -m app.tools.load /data/claims/2019 /data/claims/2020 --workers 8
+"""
+
+import argparse
+import csv
+import io
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Tuple
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Integer,
+    MetaData,
+    Table,
+    Text,
+    create_engine,
+    func,
+    select,
+)
+from sqlalchemy.dialects.postgresql import TIMESTAMP
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import config
+from app.ingest.csv_import import (
+    ClaimImportError,
+    validate_claim_header,
+    validate_claim_record,
+)
+from app.ingest.engine import calculate_net_fee, parse_service_date
+from app.ingest.rollup import upsert_provider_net_fee_totals_from_select
+from app.model.psql.orm import ClaimDetailModel, ClaimModel, PatientModel, ProviderModel
+from app.model.psql.partitions import ensure_claim_detail_partitions
+
+logger = logging.getLogger("app.tools.load")
+
+staging_metadata = MetaData()
+
+# Claim lines as they come out of the parser, keyed by the file sequence
+# number until claim ids are allocated
+claim_detail_staging = Table(
+    "claim_detail_staging",
+    staging_metadata,
+    Column("file_seq", Integer(), nullable=False),
+    Column("npi", Text(), nullable=False),
+    Column("subscriber", Text(), nullable=False),
+    Column("service_date", TIMESTAMP, nullable=False),
+    Column("submitted_procedure", Text(), nullable=False),
+    Column("quadrant", Text(), nullable=True),
+    Column("group", Text(), nullable=False),
+    Column("provider_fees_cents", BigInteger(), nullable=False),
+    Column("allowed_fees_cents", BigInteger(), nullable=False),
+    Column("member_co_insurance_cents", BigInteger(), nullable=False),
+    Column("member_co_pay_cents", BigInteger(), nullable=False),
+    Column("net_fees_cents", BigInteger(), nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DELETE ROWS",
+)
+
+# file_seq -> claim_id allocated from the claim sequence
+claim_staging = Table(
+    "claim_staging",
+    staging_metadata,
+    Column("file_seq", Integer(), primary_key=True),
+    Column("claim_id", Integer(), nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DELETE ROWS",
+)
+
+
+class ParsedClaimFile(NamedTuple):
+    path: str
+    lines: int
+    rejected: int
+    errors: List[str]
+    # claim_detail_staging rows in COPY csv format
+    copy_data: str
+
+
+def parse_claim_file(job: Tuple[int, str]) -> ParsedClaimFile:
+    """
+    Runs in a pool worker: validate every row with the Claim model, compute
+    net fees and serialize the lines for COPY
+    """
+
+    file_seq, path = job
+    buffer = io.StringIO()
+    # Every string is quoted, a missing quadrant is written as "" and COPY
+    # turns it back into NULL through FORCE_NULL
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+    lines, rejected, errors = 0, 0, []
+
+    with open(path, newline="", encoding="utf-8-sig") as claim_file:
+        reader = csv.reader(claim_file)
+        try:
+            header = validate_claim_header(next(reader))
+        except (StopIteration, ClaimImportError) as e:
+            return ParsedClaimFile(path, 0, 0, [f"{path}: {e or 'empty file'}"], "")
+
+        for record in reader:
+            if not record:
+                continue
+
+            claim, messages = validate_claim_record(header, record)
+            if claim is not None:
+                # A row the parsing still chokes on is rejected, not the file
+                try:
+                    row = (
+                        file_seq,
+                        claim.npi,
+                        claim.subscriber,
+                        parse_service_date(claim).isoformat(),
+                        claim.submitted_procedure,
+                        claim.quadrant,
+                        claim.group,
+                        claim.provider_fees_cents,
+                        claim.allowed_fees_cents,
+                        claim.member_co_insurance_cents,
+                        claim.member_co_pay_cents,
+                        calculate_net_fee(claim),
+                    )
+                except (ValueError, IndexError) as e:
+                    claim, messages = None, [f"{type(e).__name__}: {e}"]
+
+            if claim is None:
+                rejected += 1
+                if len(errors) < 20:
+                    errors.extend(f"{path}:{reader.line_num}: {m}" for m in messages)
+                continue
+
+            writer.writerow(row)
+            lines += 1
+
+    return ParsedClaimFile(path, lines, rejected, errors, buffer.getvalue())
+
+
+def iter_claim_files(paths: List[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(str(p) for p in Path(path).rglob("*.csv"))
+        else:
+            yield path
+
+
+class ClaimBulkLoader(object):
+    def __init__(self, engine, workers: int, batch_lines: int) -> None:
+        self.engine = engine
+        self.workers = workers
+        self.batch_lines = batch_lines
+
+        self.claims = 0
+        self.lines = 0
+        self.rejected = 0
+        self.started = time.monotonic()
+
+    def run(self, files: List[str]) -> None:
+        batch: List[ParsedClaimFile] = []
+        jobs = iter(enumerate(files))
+        pending = set()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            # Bounded number of files in flight so parsed results never pile
+            # up in memory faster than COPY drains them
+            while True:
+                while len(pending) < self.workers * 4:
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    pending.add(executor.submit(parse_claim_file, job))
+
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    parsed = future.result()
+                    self.rejected += parsed.rejected
+                    for error in parsed.errors:
+                        logger.warning(error)
+
+                    if parsed.lines:
+                        batch.append(parsed)
+                    if sum(p.lines for p in batch) >= self.batch_lines:
+                        self.load(batch)
+                        batch = []
+
+        self.load(batch)
+        self.report(final=True)
+
+    def load(self, batch: List[ParsedClaimFile]) -> None:
+        if not batch:
+            return
+
+        with self.engine.begin() as connection:
+            staging_metadata.create_all(connection, checkfirst=True)
+
+            # COPY is the only per-row work the database sees
+            cursor = connection.connection.cursor()
+            columns = ", ".join(f'"{c.name}"' for c in claim_detail_staging.columns)
+            cursor.copy_expert(
+                f"COPY {claim_detail_staging.name} ({columns}) FROM STDIN WITH (FORMAT csv, FORCE_NULL (quadrant))",
+                io.StringIO("".join(parsed.copy_data for parsed in batch)),
+            )
+            cursor.close()
+
+            self.merge(connection)
+
+        self.claims += len(batch)
+        self.lines += sum(parsed.lines for parsed in batch)
+        self.report()
+
+    def merge(self, connection) -> None:
+        staging = claim_detail_staging.c
+
+        for model, key_column, staging_column in (
+            (ProviderModel, ProviderModel.npi, staging.npi),
+            (PatientModel, PatientModel.subscriber_id, staging.subscriber),
+        ):
+            connection.execute(
+                pg_insert(model)
+                .from_select([key_column.name], select(staging_column).distinct())
+                .on_conflict_do_nothing(index_elements=[key_column])
+            )
+
+        # Allocate one claim id per file straight from the claim sequence
+        claim_id_sequence = func.pg_get_serial_sequence(
+            ClaimModel.__table__.fullname, ClaimModel.claim_id.name
+        )
+        file_seqs = select(staging.file_seq).distinct().subquery()
+        connection.execute(
+            claim_staging.insert().from_select(
+                ["file_seq", "claim_id"],
+                select(file_seqs.c.file_seq, func.nextval(claim_id_sequence)),
+            )
+        )
+        connection.execute(
+            ClaimModel.__table__.insert().from_select(
+                ["claim_id"], select(claim_staging.c.claim_id)
+            )
+        )
+
+        # Historical lines go straight to their month instead of the default partition
+        ensure_claim_detail_partitions(
+            connection,
+            months_ahead=config.claim_detail_partition_months_ahead,
+            months=connection.execute(
+                select(func.date_trunc("month", staging.service_date).distinct())
+            ).scalars().all(),
+        )
+
+        connection.execute(
+            ClaimDetailModel.__table__.insert().from_select(
+                [
+                    "claim_id",
+                    "subscriber_id",
+                    "provider_id",
+                    "service_date",
+                    "submitted_procedure",
+                    "quadrant",
+                    "group",
+                    "provider_fees_cents",
+                    "allowed_fees_cents",
+                    "member_co_insurance_cents",
+                    "member_co_pay_cents",
+                    "net_fees_cents",
+                ],
+                select(
+                    claim_staging.c.claim_id,
+                    PatientModel.patient_id,
+                    ProviderModel.provider_id,
+                    staging.service_date,
+                    staging.submitted_procedure,
+                    staging.quadrant,
+                    staging.group,
+                    staging.provider_fees_cents,
+                    staging.allowed_fees_cents,
+                    staging.member_co_insurance_cents,
+                    staging.member_co_pay_cents,
+                    staging.net_fees_cents,
+                )
+                .join_from(
+                    claim_detail_staging,
+                    claim_staging,
+                    claim_staging.c.file_seq == staging.file_seq,
+                )
+                .join(ProviderModel, ProviderModel.npi == staging.npi)
+                .join(PatientModel, PatientModel.subscriber_id == staging.subscriber),
+            )
+        )
+
+        connection.execute(
+            upsert_provider_net_fee_totals_from_select(
+                select(ProviderModel.provider_id, func.sum(staging.net_fees_cents))
+                .join_from(
+                    claim_detail_staging,
+                    ProviderModel,
+                    ProviderModel.npi == staging.npi,
+                )
+                .group_by(ProviderModel.provider_id)
+                .order_by(ProviderModel.provider_id)
+            )
+        )
+
+    def report(self, final: bool = False) -> None:
+        elapsed = time.monotonic() - self.started
+        logger.info(
+            f"{'Loaded' if final else 'Loading'} claims:{self.claims} lines:{self.lines} "
+            f"rejected:{self.rejected} elapsed:{elapsed:.1f}s "
+            f"rows/sec:{self.lines / elapsed if elapsed else 0:.0f}"
+        )
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.tools.load",
+        description="Bulk load claim CSV files, one claim per file",
+    )
+    parser.add_argument("paths", nargs="+", help="Claim CSV files or directories")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Parser processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--batch-lines",
+        type=int,
+        default=200000,
+        help="Claim lines per COPY and merge transaction",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+    )
+    # Per line net fee logging and SQL echo would dominate a backfill
+    logging.getLogger("app.ingest.engine").setLevel(logging.WARNING)
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+
+    files = list(iter_claim_files(args.paths))
+    logger.info(f"Loading {len(files)} claim files with {args.workers} workers")
+
+    engine = create_engine(config.postgres_conn_url)
+    try:
+        ClaimBulkLoader(
+            engine=engine, workers=args.workers, batch_lines=args.batch_lines
+        ).run(files)
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Create or upgrade the database schema: the test_app schema, missing tables
+and indexes, in place upgrades, claim_detail partitions and the initial top
+providers rollup. Run once per deploy before the API workers start, they
+don't touch the schema.
+
+    python -m app.tools.migrate
+"""
+
+import argparse
+import logging
+import time
+
+from app import config
+from app.model.psql.bootstrap import bootstrap_database
+
+logger = logging.getLogger("app.tools.migrate")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.tools.migrate",
+        description="Create or upgrade the claim app schema",
+    )
+    parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+    )
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+
+    started = time.monotonic()
+    bootstrap_database(config.postgres_conn_url)
+    logger.info(f"Migration finished in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Maintain the monthly claim_detail partitions: create the coming months, move
+lines out of the default partition into their month and optionally detach
+old months. Run it from cron, e.g. daily:
+
+    python -m app.tools.partitions --months-ahead 3
+    python -m app.tools.partitions --detach-before 2019-01-01
+"""
+
+import argparse
+import logging
+from datetime import date
+
+from sqlalchemy import create_engine
+
+from app import config
+from app.model.psql.partitions import (
+    detach_claim_detail_partitions,
+    ensure_claim_detail_partitions,
+)
+
+logger = logging.getLogger("app.tools.partitions")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.tools.partitions",
+        description="Create and detach monthly claim_detail partitions",
+    )
+    parser.add_argument(
+        "--months-ahead",
+        type=int,
+        default=config.claim_detail_partition_months_ahead,
+        help="months after the current one to create partitions for",
+    )
+    parser.add_argument(
+        "--detach-before",
+        type=date.fromisoformat,
+        help="detach partitions that end on or before this date (YYYY-MM-DD)",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+    )
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+
+    engine = create_engine(config.postgres_conn_url)
+    try:
+        with engine.begin() as connection:
+            created = ensure_claim_detail_partitions(
+                connection, months_ahead=args.months_ahead
+            )
+        logger.info(f"Created {len(created)} partitions")
+
+        if args.detach_before:
+            with engine.begin() as connection:
+                detached = detach_claim_detail_partitions(
+                    connection, before=args.detach_before
+                )
+            logger.info(f"Detached {len(detached)} partitions: {detached}")
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Rebuild the provider net fee totals behind GET /v1/claims/top-providers/
+from claim_detail, e.g. after manual data fixes made the rollup drift.
+
+    python -m app.tools.rollup
+"""
+
+import argparse
+import logging
+import time
+
+from sqlalchemy import create_engine
+
+from app import config
+from app.ingest.rollup import rebuild_provider_net_fee_totals
+
+logger = logging.getLogger("app.tools.rollup")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.tools.rollup",
+        description="Rebuild provider net fee totals from claim_detail",
+    )
+    parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+    )
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+
+    engine = create_engine(config.postgres_conn_url)
+    try:
+        started = time.monotonic()
+        with engine.begin() as connection:
+            rebuild_provider_net_fee_totals(connection)
+        logger.info(f"Rollup rebuild finished in {time.monotonic() - started:.1f}s")
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Per request cost of bearer token verification: signature and claim checks of
+every request against the verified token cache of repeat callers.
+
+    ENVIRONMENT=dev DATABASE_URL=sqlite:// python -m benchmarks.authorizer --requests 2000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+from app.authorizer.authorizer import TokenVerifier
+from app.authorizer.jwks import JwksKeySet
+
+
+async def per_request(verifier: TokenVerifier, token: str, requests: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        await verifier.verify(token)
+    return (time.perf_counter() - started) / requests
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.authorizer")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = {
+        **json.loads(RSAAlgorithm.to_jwk(private_key.public_key())),
+        "kid": "bench",
+    }
+    token = jwt.encode(
+        {
+            "sub": "abc",
+            "tenant": "123",
+            "exp": int(time.time()) + 3600,
+            "scope": "claims:read claims:write",
+        },
+        private_key,
+        "RS256",
+        headers={"kid": "bench"},
+    )
+
+    results = {}
+    for name, cache_size in (("verify", 0), ("cached", 10000)):
+        verifier = TokenVerifier(
+            key_set=JwksKeySet(lambda: {"keys": [jwk]}),
+            algorithms=["RS256"],
+            cache_size=cache_size,
+        )
+        results[name] = asyncio.run(per_request(verifier, token, args.requests))
+
+    print(
+        " ".join(
+            f"{name}:{seconds * 1e6:8.2f}us/request"
+            for name, seconds in results.items()
+        )
+        + f" speedup:{results['verify'] / results['cached']:.0f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
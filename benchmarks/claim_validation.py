@@ -0,0 +1,79 @@
+"""
+Per object Claim validation and net fee computation against the column
+oriented path used for large claim lists.
+
+    ENVIRONMENT=dev DATABASE_URL=sqlite:// python -m benchmarks.claim_validation --lines 1000 10000
+"""
+
+import argparse
+import logging
+import timeit
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app.ingest.batch import validate_claim_batch
+from app.ingest.engine import calculate_net_fee
+from app.model.api.claims import Claim
+
+claims_adapter = TypeAdapter(List[Claim])
+
+
+def claim_list(lines: int) -> List[dict]:
+    return [
+        {
+            "service date": "3/28/18 0:00",
+            "submitted procedure": f"D{4000 + line % 1000}",
+            "quadrant": "UR" if line % 3 else None,
+            "Plan/Group #": "GRP-1000",
+            "Subscriber#": str(3730189502 + line % 500),
+            "Provider NPI": str(1497775530 + line % 50),
+            "provider fees": f"${100 + line % 90}.00 ",
+            "Allowed fees": f"${90 + line % 90}.00 ",
+            "member coinsurance": f"${line % 40}.60 ",
+            "member copay": "$0.00 ",
+        }
+        for line in range(lines)
+    ]
+
+
+def per_object(payload: List[dict]) -> List[float]:
+    return [calculate_net_fee(claim) for claim in claims_adapter.validate_python(payload)]
+
+
+def columnar(payload: List[dict]) -> List[float]:
+    batch, errors = validate_claim_batch(payload)
+    return batch.net_fees_cents()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.claim_validation")
+    parser.add_argument("--lines", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    # Same logging level as production, calculate_net_fee logs at DEBUG
+    logging.basicConfig(level=logging.INFO)
+
+    for lines in args.lines:
+        payload = claim_list(lines)
+        assert per_object(payload) == columnar(payload)
+
+        results = {}
+        for name, validate in (("per object", per_object), ("columnar", columnar)):
+            results[name] = min(
+                timeit.repeat(lambda: validate(payload), number=1, repeat=args.repeat)
+            )
+
+        print(
+            f"lines:{lines:>7} "
+            + " ".join(
+                f"{name}:{seconds * 1000:8.2f}ms ({lines / seconds:,.0f} lines/s)"
+                for name, seconds in results.items()
+            )
+            + f" speedup:{results['per object'] / results['columnar']:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
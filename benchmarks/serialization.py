@@ -0,0 +1,140 @@
+"""
+Per row cost of the claim read response: a ClaimResourceResponseModel per
+row, validated again against the route's List[ClaimResourceResponseModel]
+and encoded with the stdlib as FastAPI does, against plain dicts encoded by
+FastJSONResponse.
+
+    ENVIRONMENT=dev DATABASE_URL=sqlite:// python -m benchmarks.serialization --lines 10 100 1000
+"""
+
+import argparse
+import json
+import timeit
+from collections import namedtuple
+from datetime import datetime
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.api.claims import claim_resource_from_row
+from app.api.responses import FastJSONResponse
+from app.model.api.claims import ClaimResourceResponseModel
+
+response_adapter = TypeAdapter(List[ClaimResourceResponseModel])
+
+ClaimResourceRow = namedtuple(
+    "ClaimResourceRow",
+    [
+        "claim_id",
+        "service_date",
+        "submitted_procedure",
+        "quadrant",
+        "group",
+        "subscriber",
+        "npi",
+        "provider_fees_cents",
+        "allowed_fees_cents",
+        "member_co_insurance_cents",
+        "member_co_pay_cents",
+        "net_fees_cents",
+        "created",
+        "updated",
+    ],
+)
+
+
+def claim_rows(lines: int) -> List[ClaimResourceRow]:
+    created = datetime(2024, 1, 1, 12, 30, 15, 123456)
+    return [
+        ClaimResourceRow(
+            claim_id=1,
+            service_date=datetime(2018, 3, 28),
+            submitted_procedure=f"D{4000 + line % 1000}",
+            quadrant="UR" if line % 3 else None,
+            group="GRP-1000",
+            subscriber=str(3730189502 + line % 500),
+            npi=str(1497775530 + line % 50),
+            provider_fees_cents=10000 + line % 9000,
+            allowed_fees_cents=9000 + line % 9000,
+            member_co_insurance_cents=line % 4000,
+            member_co_pay_cents=0,
+            net_fees_cents=5000 + line % 4000,
+            created=created,
+            updated=created,
+        )
+        for line in range(lines)
+    ]
+
+
+def model_response(rows: List[ClaimResourceRow]) -> bytes:
+    payload = [
+        ClaimResourceResponseModel(
+            claimId=row.claim_id,
+            service_date=row.service_date.isoformat(),
+            group=row.group,
+            subscriber=row.subscriber,
+            npi=row.npi,
+            quadrant=row.quadrant,
+            submitted_procedure=row.submitted_procedure,
+            provider_fees=row.provider_fees_cents / 100,
+            allowed_fees=row.allowed_fees_cents / 100,
+            member_co_insurance=row.member_co_insurance_cents / 100,
+            member_co_pay=row.member_co_pay_cents / 100,
+            net_fees=row.net_fees_cents / 100,
+            provider_fees_cents=row.provider_fees_cents,
+            allowed_fees_cents=row.allowed_fees_cents,
+            member_co_insurance_cents=row.member_co_insurance_cents,
+            member_co_pay_cents=row.member_co_pay_cents,
+            net_fees_cents=row.net_fees_cents,
+            createdAt=row.created.isoformat(),
+            updatedAt=row.updated.isoformat(),
+        ).model_dump()
+        for row in rows
+    ]
+    # Return annotation validation and encoding of FastAPI's serialize_response
+    content = response_adapter.dump_python(
+        response_adapter.validate_python(payload), mode="json"
+    )
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def fast_response(rows: List[ClaimResourceRow]) -> bytes:
+    return FastJSONResponse([claim_resource_from_row(row) for row in rows]).body
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.serialization")
+    parser.add_argument("--lines", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    for lines in args.lines:
+        rows = claim_rows(lines)
+        assert json.loads(model_response(rows)) == json.loads(fast_response(rows))
+
+        results = {}
+        for name, respond in (("model", model_response), ("fast", fast_response)):
+            results[name] = (
+                min(
+                    timeit.repeat(
+                        lambda: respond(rows), number=args.number, repeat=args.repeat
+                    )
+                )
+                / args.number
+            )
+
+        print(
+            f"lines:{lines:>6} "
+            + " ".join(
+                f"{name}:{seconds * 1000:8.3f}ms ({seconds / lines * 1e6:6.2f}us/row)"
+                for name, seconds in results.items()
+            )
+            + f" speedup:{results['model'] / results['fast']:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import json
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+
+def rsa_jwk(kid: str):
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jwt.algorithms import RSAAlgorithm
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+    return private_key, {**jwk, "kid": kid, "alg": "RS256", "use": "sig"}
+
+
+class TestTokenVerifier(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        from app.authorizer.authorizer import TokenVerifier
+        from app.authorizer.jwks import JwksKeySet
+
+        self.private_key, jwk = rsa_jwk("key-1")
+        self.jwks = {"keys": [jwk]}
+        self.loads = 0
+
+        def load():
+            self.loads += 1
+            return self.jwks
+
+        self.now = time.time()
+        self.verifier = TokenVerifier(
+            key_set=JwksKeySet(load, refresh_interval=60),
+            algorithms=["RS256"],
+            audience="claim-app",
+            tenants=["123"],
+            clock=lambda: self.now,
+        )
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    def token(self, private_key=None, kid="key-1", **claims):
+        import jwt
+
+        claims = {
+            "sub": "abc",
+            "tenant": "123",
+            "aud": "claim-app",
+            "exp": int(time.time()) + 60,
+            "scope": "claims:read claims:write",
+            **claims,
+        }
+        return jwt.encode(
+            claims, private_key or self.private_key, "RS256", headers={"kid": kid}
+        )
+
+    async def test_verified_tokens_are_cached_until_they_expire(self):
+        token = self.token()
+        decode = self.verifier.decode
+        decoded = []
+
+        async def counted_decode(token):
+            decoded.append(token)
+            return await decode(token)
+
+        self.verifier.decode = counted_decode
+
+        identity = await self.verifier.verify(token)
+        self.assertEqual(
+            identity,
+            {"sub": "abc", "tenant": "123", "scopes": ["claims:read", "claims:write"]},
+        )
+        self.assertIs(await self.verifier.verify(token), identity)
+        self.assertEqual(len(decoded), 1)
+
+        # Past exp and the leeway the signature is checked again
+        self.now += 60 + 31
+        await self.verifier.verify(token)
+        self.assertEqual(len(decoded), 2)
+
+    async def test_invalid_tokens(self):
+        from fastapi import HTTPException
+
+        other_key, _ = rsa_jwk("key-1")
+        for token, status in (
+            (self.token(exp=int(time.time()) - 120), 401),
+            (self.token(aud="other-app"), 401),
+            (self.token(private_key=other_key), 401),
+            (self.token(kid="unknown"), 401),
+            (self.token(tenant="456"), 403),
+            ("not-a-jwt", 401),
+        ):
+            with self.assertRaises(HTTPException) as raised:
+                await self.verifier.verify(token)
+            self.assertEqual(raised.exception.status_code, status)
+
+    async def test_unknown_kid_reloads_rotated_keys(self):
+        await self.verifier.verify(self.token())
+        self.assertEqual(self.loads, 1)
+
+        new_key, jwk = rsa_jwk("key-2")
+        self.jwks = {"keys": [jwk]}
+        token = self.token(private_key=new_key, kid="key-2")
+
+        # Reloads are spaced by the refresh interval
+        self.verifier.key_set.attempted_at -= 60
+        self.assertEqual((await self.verifier.verify(token))["sub"], "abc")
+        self.assertEqual(self.loads, 2)
+
+        from fastapi import HTTPException
+
+        for _ in range(3):
+            with self.assertRaises(HTTPException):
+                await self.verifier.verify(self.token(kid="made-up"))
+        self.assertEqual(self.loads, 2)
+
+    def test_routes_check_scopes(self):
+        from fastapi import Depends, FastAPI
+
+        from app.authorizer import authorizer
+
+        app = FastAPI()
+
+        @app.post(
+            "/claims",
+            dependencies=[Depends(authorizer.require_scopes(authorizer.CLAIMS_WRITE))],
+        )
+        async def process_claim() -> dict:
+            return {"status": "OK"}
+
+        client = TestClient(app)
+        with patch.object(authorizer, "token_verifier", self.verifier):
+            read_only = self.token(scope="claims:read")
+            responses = [
+                client.post("/claims", headers={"Authorization": authorization})
+                for authorization in (
+                    f"Bearer {self.token()}",
+                    f"Bearer {read_only}",
+                    f"Basic {read_only}",
+                )
+            ]
+
+        self.assertEqual(
+            [response.status_code for response in responses], [200, 403, 401]
+        )
+        self.assertEqual(responses[1].json(), {"detail": "Missing scope: claims:write"})
+        self.assertEqual(responses[2].headers["WWW-Authenticate"], "Bearer")
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import patch
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class BrokenBackend:
+    async def get(self, key):
+        raise ConnectionError("cache is down")
+
+    async def set(self, key, value, ttl):
+        raise ConnectionError("cache is down")
+
+    async def delete(self, *keys):
+        raise ConnectionError("cache is down")
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        self.loads = 0
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    async def load(self):
+        self.loads += 1
+        await asyncio.sleep(0)
+        return [{"provider_npi": "1497775530", "total_net_fees": 10.0}]
+
+    async def test_memory_backend_expires_and_evicts(self):
+        from app.cache.backends import MemoryCacheBackend
+
+        clock = FakeClock()
+        backend = MemoryCacheBackend(max_entries=2, clock=clock)
+
+        await backend.set("a", 1, ttl=10)
+        await backend.set("b", 2, ttl=10)
+        # Reading "a" makes "b" the least recently used entry
+        self.assertEqual(await backend.get("a"), 1)
+        await backend.set("c", 3, ttl=10)
+
+        self.assertIsNone(await backend.get("b"))
+        self.assertEqual(backend.evictions, 1)
+
+        clock.now = 10
+        self.assertIsNone(await backend.get("a"))
+        self.assertEqual(len(backend), 1)
+
+    async def test_read_through_and_invalidate(self):
+        from app.cache.backends import LocalSharedCacheClient, SharedCacheBackend
+        from app.cache.response import TOP_PROVIDERS_ROUTE, ResponseCache
+
+        cache = ResponseCache(
+            backend=SharedCacheBackend(client=LocalSharedCacheClient()),
+            ttls={TOP_PROVIDERS_ROUTE: 10},
+        )
+
+        first = await cache.get_or_load(TOP_PROVIDERS_ROUTE, (), self.load)
+        second = await cache.get_or_load(TOP_PROVIDERS_ROUTE, (), self.load)
+        self.assertEqual(first, second)
+        self.assertEqual(self.loads, 1)
+
+        await cache.invalidate(TOP_PROVIDERS_ROUTE)
+        await cache.get_or_load(TOP_PROVIDERS_ROUTE, (), self.load)
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(cache.stats()[TOP_PROVIDERS_ROUTE]["hits"], 1)
+        self.assertEqual(cache.stats()[TOP_PROVIDERS_ROUTE]["misses"], 2)
+
+    async def test_concurrent_misses_share_one_load(self):
+        from app.cache.backends import MemoryCacheBackend
+        from app.cache.response import CLAIM_ROUTE, ResponseCache
+
+        cache = ResponseCache(backend=MemoryCacheBackend(), ttls={CLAIM_ROUTE: 10})
+
+        results = await asyncio.gather(
+            *[cache.get_or_load(CLAIM_ROUTE, (1234,), self.load) for _ in range(5)]
+        )
+
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(len({id(result) for result in results}), 1)
+
+    async def test_waiters_load_when_the_leader_is_cancelled(self):
+        from app.cache.backends import MemoryCacheBackend
+        from app.cache.response import CLAIM_ROUTE, ResponseCache
+
+        cache = ResponseCache(backend=MemoryCacheBackend(), ttls={CLAIM_ROUTE: 10})
+        started = asyncio.Event()
+
+        async def load_forever():
+            started.set()
+            await asyncio.sleep(3600)
+
+        leader = asyncio.create_task(
+            cache.get_or_load(CLAIM_ROUTE, (1234,), load_forever)
+        )
+        await started.wait()
+        waiters = [
+            asyncio.create_task(cache.get_or_load(CLAIM_ROUTE, (1234,), self.load))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        results = await asyncio.gather(*waiters)
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        # One waiter took over the load, the others shared it
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(len({id(result) for result in results}), 1)
+        self.assertEqual(cache._loading, {})
+
+    async def test_cancelled_waiter_leaves_the_load_running(self):
+        from app.cache.backends import MemoryCacheBackend
+        from app.cache.response import CLAIM_ROUTE, ResponseCache
+
+        cache = ResponseCache(backend=MemoryCacheBackend(), ttls={CLAIM_ROUTE: 10})
+        release = asyncio.Event()
+
+        async def load_when_released():
+            await release.wait()
+            return await self.load()
+
+        leader = asyncio.create_task(
+            cache.get_or_load(CLAIM_ROUTE, (1234,), load_when_released)
+        )
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_load(CLAIM_ROUTE, (1234,), self.load))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+
+        release.set()
+        self.assertEqual((await leader)[0]["provider_npi"], "1497775530")
+        self.assertEqual(self.loads, 1)
+
+    async def test_missing_claim_is_not_cached(self):
+        from app.cache.backends import MemoryCacheBackend
+        from app.cache.response import CLAIM_ROUTE, ResponseCache
+
+        cache = ResponseCache(backend=MemoryCacheBackend(), ttls={CLAIM_ROUTE: 10})
+
+        async def load_missing():
+            self.loads += 1
+            return None
+
+        self.assertIsNone(await cache.get_or_load(CLAIM_ROUTE, (1,), load_missing))
+        self.assertIsNone(await cache.get_or_load(CLAIM_ROUTE, (1,), load_missing))
+        self.assertEqual(self.loads, 2)
+
+    async def test_broken_backend_falls_back_to_loader(self):
+        from app.cache.response import CLAIM_ROUTE, ResponseCache
+
+        cache = ResponseCache(backend=BrokenBackend(), ttls={CLAIM_ROUTE: 10})
+
+        with self.assertLogs("app.cache.response", level="WARNING"):
+            result = await cache.get_or_load(CLAIM_ROUTE, (1234,), self.load)
+            await cache.invalidate(CLAIM_ROUTE, 1234)
+
+        self.assertEqual(result[0]["provider_npi"], "1497775530")
+        self.assertEqual(self.loads, 1)
@@ -0,0 +1,135 @@
+import csv
+import os
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+CLAIM_FILE = Path(__file__).parent.parent / "claim_1234.csv"
+
+
+class TestClaimBatchValidation(unittest.TestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        with open(CLAIM_FILE, newline="", encoding="utf-8-sig") as claim_file:
+            reader = csv.reader(claim_file)
+            header = [column.strip() for column in next(reader)]
+            self.payload = [
+                {
+                    column: value if value or column != "quadrant" else None
+                    for column, value in zip(header, record)
+                }
+                for record in reader
+                if record
+            ]
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    def test_columnar_matches_per_object_validation(self):
+        from app.api.claims import claims_adapter
+        from app.ingest.batch import ClaimBatch, validate_claim_batch
+        from app.ingest.engine import calculate_net_fee
+
+        # Numbers are accepted for the NPI like coerce_numbers_to_str does
+        self.payload[0]["Provider NPI"] = int(self.payload[0]["Provider NPI"])
+        claims = claims_adapter.validate_python(self.payload)
+
+        batch, errors = validate_claim_batch(self.payload)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(batch, ClaimBatch.from_claims(claims))
+        self.assertEqual(
+            batch.net_fees_cents(), [calculate_net_fee(claim) for claim in claims]
+        )
+        self.assertEqual(batch.quadrant, [None, None, None, "UR"])
+        self.assertEqual(batch.member_co_insurance_cents, [0, 0, 1625, 3560])
+
+    def test_columnar_reports_row_positions(self):
+        from app.ingest.batch import validate_claim_batch
+
+        self.payload[1]["submitted procedure"] = "E0210"
+        self.payload[3]["Provider NPI"] = "123"
+        self.payload[3]["Allowed fees"] = "$1O0.00"
+
+        batch, errors = validate_claim_batch(self.payload)
+
+        self.assertIsNone(batch)
+        self.assertEqual(
+            [error["loc"] for error in errors],
+            [(1, "submitted procedure"), (3, "Allowed fees"), (3, "Provider NPI")],
+        )
+
+    def test_columnar_reports_missing_and_mistyped_fields(self):
+        from app.ingest.batch import validate_claim_batch
+
+        del self.payload[0]["member copay"]
+        batch, errors = validate_claim_batch(self.payload)
+        self.assertEqual(
+            [(error["type"], error["loc"]) for error in errors],
+            [("missing", (0, "member copay"))],
+        )
+
+        self.payload[0]["member copay"] = 0
+        self.payload[2]["quadrant"] = 7
+        batch, errors = validate_claim_batch(self.payload)
+        self.assertEqual(
+            [(error["type"], error["loc"]) for error in errors],
+            [("string_type", (0, "member copay")), ("string_type", (2, "quadrant"))],
+        )
+
+    def test_large_claim_lists_use_columnar_validation(self):
+        from fastapi.exceptions import RequestValidationError
+
+        from app.api.claims import _validate_claims, config
+        from app.ingest.batch import ClaimBatch
+
+        with patch.object(config, "claim_columnar_threshold", 4):
+            self.assertIsInstance(_validate_claims(self.payload), ClaimBatch)
+            self.assertIsInstance(_validate_claims(self.payload[:3]), list)
+
+            self.payload[2]["Provider NPI"] = "123"
+            for payload in (self.payload, self.payload[:3]):
+                with self.assertRaises(RequestValidationError) as raised:
+                    _validate_claims(payload)
+                self.assertEqual(
+                    raised.exception.errors()[0]["loc"], ("body", 2, "Provider NPI")
+                )
+
+    def test_malformed_service_dates_are_reported_per_row(self):
+        from fastapi.exceptions import RequestValidationError
+
+        from app.api.claims import _validate_claims, config
+
+        self.payload[1]["service date"] = "not a date"
+        self.payload[3]["service date"] = "2018-03-28"
+
+        # Per object and column-wise validation both answer 422 with the rows
+        for threshold in (100, 4):
+            with patch.object(config, "claim_columnar_threshold", threshold):
+                with self.assertRaises(RequestValidationError) as raised:
+                    _validate_claims(self.payload)
+            self.assertEqual(
+                [error["loc"] for error in raised.exception.errors()],
+                [("body", 1, "service date"), ("body", 3, "service date")],
+            )
+
+    def test_amounts_parse_to_exact_cents(self):
+        from app.model.api.claims import parse_cents
+
+        self.assertEqual(parse_cents("$35.60 "), 3560)
+        self.assertEqual(parse_cents("$.5"), 50)
+        self.assertEqual(parse_cents("-$0.05"), -5)
+        # 0.1 has no exact float, a million dimes still add up to the cent
+        self.assertEqual(sum([parse_cents("$0.10")] * 1000000), 10000000)
+
+        for amount in ("$", "$1.005", "$1._5", "nan", "$1,000.00"):
+            with self.assertRaises(ValueError):
+                parse_cents(amount)
@@ -0,0 +1,119 @@
+import os
+import unittest
+from collections import namedtuple
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+CLAIM_FILE = Path(__file__).parent.parent / "claim_1234.csv"
+
+ClaimRow = namedtuple("ClaimRow", ["claim_id", "created", "updated"])
+
+
+class FakeIngestEngine:
+    def __init__(self):
+        self.batches = []
+        self.payment_events = []
+
+    async def create_claim(self):
+        return ClaimRow(1234, datetime(2024, 1, 1), datetime(2024, 1, 1))
+
+    async def insert_claim_lines(self, claim_id, claims):
+        self.batches.append(claims)
+        return len(claims)
+
+    async def enqueue_payment_event(self, claim_id):
+        self.payment_events.append(claim_id)
+
+
+async def iter_bytes(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+class TestClaimCsvImporter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        from app.ingest.csv_import import ClaimCsvImporter
+
+        self.importer = ClaimCsvImporter(db_session=None, chunk_size=2, max_errors=1)
+        self.ingest_engine = FakeIngestEngine()
+        self.importer.ingest_engine = self.ingest_engine
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    async def test_import_claim_file_in_small_chunks(self):
+        data = CLAIM_FILE.read_bytes()
+
+        # 7 byte chunks split lines and "$" amounts across reads
+        report = await self.importer.run(iter_bytes(data, 7))
+
+        self.assertEqual(report.claimId, 1234)
+        self.assertEqual(report.importedCount, 4)
+        self.assertEqual(report.rejectedCount, 0)
+        self.assertEqual([len(batch) for batch in self.ingest_engine.batches], [2, 2])
+        self.assertEqual(self.ingest_engine.payment_events, [1234])
+
+        claim = self.ingest_engine.batches[1][1]
+        self.assertEqual(claim.quadrant, "UR")
+        self.assertEqual(claim.provider_fees_cents, 17800)
+        self.assertEqual(claim.member_co_insurance_cents, 3560)
+        self.assertIsNone(self.ingest_engine.batches[0][0].quadrant)
+
+    async def test_import_reports_invalid_rows(self):
+        data = CLAIM_FILE.read_bytes().rstrip() + (
+            b"\n"
+            b"3/28/18 0:00,E0180,,GRP-1000,3730189502,1497775530,$1 ,$1 ,$0 ,$0\n"
+            b"3/28/18 0:00,D0180,,GRP-1000,3730189502,123,$1 ,$1 ,$0 ,$0\n"
+        )
+
+        report = await self.importer.run(iter_bytes(data, 64))
+
+        self.assertEqual(report.importedCount, 4)
+        self.assertEqual(report.rejectedCount, 2)
+        # Report is capped by max_errors, rows still count as rejected
+        self.assertEqual(len(report.errors), 1)
+        self.assertEqual(report.errors[0].row, 6)
+        self.assertIn("submitted procedure", report.errors[0].errors[0])
+
+    async def test_import_rejects_empty_procedure_per_row(self):
+        data = CLAIM_FILE.read_bytes().rstrip() + (
+            b"\n3/28/18 0:00,,,GRP-1000,3730189502,1497775530,$1 ,$1 ,$0 ,$0\n"
+        )
+
+        report = await self.importer.run(iter_bytes(data, 64))
+
+        self.assertEqual(report.importedCount, 4)
+        self.assertEqual(report.rejectedCount, 1)
+        self.assertEqual(report.errors[0].row, 6)
+        self.assertIn("submitted procedure", report.errors[0].errors[0])
+
+    async def test_import_rejects_malformed_service_date_per_row(self):
+        data = CLAIM_FILE.read_bytes().rstrip() + (
+            b"\n2018-03-28,D0180,,GRP-1000,3730189502,1497775530,$1 ,$1 ,$0 ,$0\n"
+        )
+
+        report = await self.importer.run(iter_bytes(data, 64))
+
+        self.assertEqual(report.importedCount, 4)
+        self.assertEqual(report.rejectedCount, 1)
+        self.assertEqual(report.errors[0].row, 6)
+        self.assertIn("service date", report.errors[0].errors[0])
+
+    async def test_import_rejects_file_without_claim_columns(self):
+        from app.ingest.csv_import import ClaimImportError
+
+        with self.assertRaises(ClaimImportError):
+            await self.importer.run(iter_bytes(b"a,b\n1,2\n", 64))
+
+        self.assertEqual(self.ingest_engine.batches, [])
+        self.assertEqual(self.ingest_engine.payment_events, [])
@@ -0,0 +1,251 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from sqlalchemy import MetaData, event, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+
+class TestClaimResourceRead(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        from app.model.psql.orm import (
+            Base,
+            ClaimDetailModel,
+            ClaimModel,
+            PatientModel,
+            ProviderModel,
+        )
+
+        # The ORM lives in the test_app schema, sqlite gets it as an attached db
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(
+            f"sqlite+aiosqlite:///{self.tmp.name}/main.sqlite"
+        )
+        test_app_path = f"{self.tmp.name}/test_app.sqlite"
+
+        @event.listens_for(self.engine.sync_engine, "connect")
+        def attach_schema(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"ATTACH DATABASE '{test_app_path}' AS test_app")
+
+        self.statements = []
+
+        @event.listens_for(self.engine.sync_engine, "before_cursor_execute")
+        def count_statement(conn, cursor, statement, parameters, context, many):
+            self.statements.append(statement)
+
+        # now() server defaults are postgres only, claim lines set theirs explicitly.
+        # sqlite can't autoincrement the (id, service_date) key, ids are given too.
+        metadata = MetaData()
+        for table in Base.metadata.sorted_tables:
+            for column in table.to_metadata(metadata).columns:
+                column.server_default = None
+                column.autoincrement = "auto"
+
+        created = datetime(2024, 1, 1)
+        async with self.engine.begin() as connection:
+            await connection.run_sync(metadata.create_all)
+            await connection.execute(
+                insert(ProviderModel),
+                [
+                    {"provider_id": 1, "npi": "1497775530"},
+                    {"provider_id": 2, "npi": "1234567890"},
+                ],
+            )
+            await connection.execute(
+                insert(PatientModel),
+                [{"patient_id": 1, "subscriber_id": "3730189502"}],
+            )
+            await connection.execute(
+                insert(ClaimModel),
+                [
+                    {"claim_id": 1},
+                    {"claim_id": 2},
+                ],
+            )
+            await connection.execute(
+                insert(ClaimDetailModel),
+                [
+                    {
+                        "id": line + 1,
+                        "claim_id": 1,
+                        "subscriber_id": 1,
+                        "provider_id": 1 + line % 2,
+                        "service_date": datetime(2018, 3, 28),
+                        "submitted_procedure": "D0180",
+                        "quadrant": None,
+                        "group": "GRP-1000",
+                        "provider_fees_cents": 10000,
+                        "allowed_fees_cents": 10000 - line,
+                        "member_co_insurance_cents": 0,
+                        "member_co_pay_cents": 0,
+                        "net_fees_cents": line,
+                        "created": created,
+                        "updated": created,
+                    }
+                    for line in range(40)
+                ],
+            )
+
+        self.session = AsyncSession(bind=self.engine)
+        self.statements.clear()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+        self.tmp.cleanup()
+        self.env_patcher.stop()
+
+    async def test_claim_lines_are_read_in_one_query(self):
+        from app.api.claims import fetch_claim_resources
+
+        claims = await fetch_claim_resources(db_session=self.session, claim_id=1)
+
+        self.assertEqual(len(claims), 40)
+        self.assertEqual(len(self.statements), 1)
+        self.assertEqual([claim["net_fees_cents"] for claim in claims], list(range(40)))
+        self.assertEqual(claims[25]["net_fees"], 0.25)
+        self.assertEqual(claims[0]["subscriber"], "3730189502")
+        self.assertEqual(claims[0]["npi"], "1497775530")
+        self.assertEqual(claims[1]["npi"], "1234567890")
+
+    async def test_claim_without_lines_and_missing_claim(self):
+        from app.api.claims import fetch_claim_resources
+
+        self.assertEqual(
+            await fetch_claim_resources(db_session=self.session, claim_id=2), []
+        )
+        self.assertIsNone(
+            await fetch_claim_resources(db_session=self.session, claim_id=3)
+        )
+        self.assertEqual(len(self.statements), 2)
+
+    async def list_claims(self, limit, cursor=None):
+        import json
+
+        from app.api import claims
+
+        # pg_class isn't there on sqlite
+        with patch.object(claims, "_estimate_claims_count", return_value=0):
+            response = await claims.get_claims(
+                limit=limit, cursor=cursor, auth={"sub": "abc"}, db_session=self.session
+            )
+        return json.loads(response.body)
+
+    async def test_claims_cursor_round_trip_and_tampering(self):
+        import base64
+
+        from fastapi import HTTPException
+
+        from app.api.claims import _decode_claims_cursor, _encode_claims_cursor
+
+        created = datetime(2024, 1, 1, 12, 30, 15, 123456)
+        self.assertEqual(
+            _decode_claims_cursor(_encode_claims_cursor(created, 42)), (created, 42)
+        )
+
+        for payload in [b"[1, 2]", b'["2024-01-01", "x"]', b'{"a": 1}', b"7"]:
+            cursor = base64.urlsafe_b64encode(payload).decode()
+            with self.assertRaises(HTTPException) as raised:
+                await self.list_claims(limit=2, cursor=cursor)
+            self.assertEqual(raised.exception.status_code, 400)
+
+        with self.assertRaises(HTTPException) as raised:
+            await self.list_claims(limit=2, cursor="not a cursor")
+        self.assertEqual(raised.exception.status_code, 400)
+        self.assertIn("Invalid cursor", raised.exception.detail)
+
+    async def test_claims_pages_have_no_duplicates_or_gaps(self):
+        from app.api.claims import ClaimModel
+
+        # Claims created in the same second are ordered by claim_id
+        await self.session.execute(
+            insert(ClaimModel), [{"claim_id": i} for i in range(3, 13)]
+        )
+        for claim_id in range(1, 13):
+            await self.session.execute(
+                update(ClaimModel)
+                .where(ClaimModel.claim_id == claim_id)
+                .values(created=datetime(2024, 1, 1 + claim_id // 3))
+            )
+        await self.session.commit()
+        expected = sorted(
+            range(1, 13), key=lambda claim_id: (claim_id // 3, claim_id), reverse=True
+        )
+
+        for limit, page_sizes in [(5, [5, 5, 2]), (4, [4, 4, 4]), (12, [12])]:
+            pages, cursor = [], None
+            while True:
+                page = await self.list_claims(limit=limit, cursor=cursor)
+                pages.append([claim["claimId"] for claim in page["claims"]])
+                cursor = page["next"]
+                if cursor is None:
+                    break
+
+            self.assertEqual([len(page) for page in pages], page_sizes)
+            self.assertEqual(
+                [claim_id for page in pages for claim_id in page], expected
+            )
+
+    async def test_batch_groups_lines_by_claim(self):
+        from app.api.claims import (
+            ClaimModel,
+            claim_resource_query,
+            claim_resources_batch_query,
+            group_claim_resources,
+        )
+        from sqlalchemy.dialects import postgresql
+
+        statement = claim_resources_batch_query([3, 1, 2]).compile(
+            dialect=postgresql.dialect()
+        )
+        # Postgres gets one array parameter, not one parameter per id
+        self.assertIn("claim.claim_id = ANY (%(claim_ids)s::INTEGER[])", str(statement))
+        self.assertEqual(statement.params, {"claim_ids": [3, 1, 2]})
+
+        # sqlite has no ANY, same select filtered with IN stands in for it
+        rows = (
+            await self.session.execute(
+                claim_resource_query().where(ClaimModel.claim_id.in_([3, 1, 2]))
+            )
+        ).all()
+        claims = group_claim_resources(rows)
+
+        self.assertEqual(sorted(claims), [1, 2])
+        self.assertEqual(len(claims[1]), 40)
+        self.assertEqual(claims[2], [])
+
+    async def test_fast_response_matches_the_documented_model(self):
+        import json
+        from typing import List
+
+        from pydantic import TypeAdapter
+
+        from app.api.claims import fetch_claim_resources
+        from app.api.responses import FastJSONResponse
+        from app.asgi import app
+        from app.model.api.claims import ClaimResourceResponseModel
+
+        claims = await fetch_claim_resources(db_session=self.session, claim_id=1)
+
+        # Same payload the response model would have produced
+        adapter = TypeAdapter(List[ClaimResourceResponseModel])
+        self.assertEqual(adapter.dump_python(adapter.validate_python(claims)), claims)
+        self.assertEqual(json.loads(FastJSONResponse(claims).body), claims)
+
+        # OpenAPI still documents the model
+        schema = app.openapi()["paths"]["/v1/claims/{claimId}"]["get"]["responses"]
+        self.assertEqual(
+            schema["200"]["content"]["application/json"]["schema"]["items"],
+            {"$ref": "#/components/schemas/ClaimResourceResponseModel"},
+        )
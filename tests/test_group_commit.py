@@ -0,0 +1,198 @@
+import asyncio
+import os
+import unittest
+from collections import namedtuple
+from datetime import datetime
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+ClaimRow = namedtuple("ClaimRow", ["claim_id", "created", "updated"])
+
+
+class FakeSession:
+    def __init__(self):
+        self.commits = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def commit(self):
+        self.commits += 1
+
+
+class ScriptedSession:
+    # Answers every statement with the same rows, records the statements
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeIngestEngine:
+    # Shared across transactions like the claim tables
+    groups = []
+    tickets = {}
+    failed = {}
+
+    def __init__(self, db_session):
+        self.db_session = db_session
+
+    async def ingest_many(self, claims_list):
+        if "bad" in claims_list:
+            raise ValueError("bad claim")
+        self.groups.append(list(claims_list))
+        first = sum(len(group) for group in self.groups) - len(claims_list)
+        return [
+            ClaimRow(first + i + 1, datetime(2024, 1, 1), datetime(2024, 1, 1))
+            for i in range(len(claims_list))
+        ]
+
+    async def record_tickets(self, tickets):
+        self.tickets.update(tickets)
+
+    async def record_failed_ticket(self, ticket, error):
+        self.failed[ticket] = error
+
+    async def purge_tickets(self, retention_seconds):
+        pass
+
+
+class TestGroupCommitWriter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        FakeIngestEngine.groups = []
+        FakeIngestEngine.tickets = {}
+        FakeIngestEngine.failed = {}
+        self.session = FakeSession()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    def writer(self, **kwargs):
+        from app.ingest.group_commit import GroupCommitWriter
+
+        return GroupCommitWriter(
+            session_factory=lambda: self.session,
+            engine_class=FakeIngestEngine,
+            **kwargs,
+        )
+
+    async def test_concurrent_claims_share_a_commit(self):
+        writer = self.writer(max_claims=3, max_wait=0.05, writers=1)
+        writer.start()
+        claim_rows = await asyncio.gather(
+            *(writer.submit([f"claim {i}"]) for i in range(5))
+        )
+        await writer.stop()
+
+        self.assertEqual([len(group) for group in FakeIngestEngine.groups], [3, 2])
+        self.assertEqual(self.session.commits, 2)
+        self.assertEqual([row.claim_id for row in claim_rows], [1, 2, 3, 4, 5])
+
+    async def test_failed_group_is_written_claim_by_claim(self):
+        writer = self.writer(max_claims=3, max_wait=0.05, writers=1)
+        writer.start()
+        with self.assertLogs("app.ingest.group_commit", "WARNING") as logs:
+            ticket = writer.accept("bad")
+            results = await asyncio.gather(
+                writer.submit("good"), writer.submit("bad"), return_exceptions=True
+            )
+            await writer.stop()
+
+        self.assertEqual(results[0].claim_id, 1)
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(FakeIngestEngine.groups, [["good"]])
+        self.assertEqual(FakeIngestEngine.failed, {ticket: "ValueError: bad claim"})
+        self.assertIn("Group of 3 claims failed", logs.output[0])
+
+    async def test_stop_writes_accepted_claims_and_full_queue_rejects(self):
+        from app.ingest.group_commit import WriterBusy, ticket_issued_at
+
+        # The writer task only runs once the test awaits
+        writer = self.writer(max_pending=2, writers=1)
+        writer.start()
+        tickets = [writer.accept("one"), writer.accept("two")]
+        with self.assertRaises(WriterBusy):
+            writer.accept("three")
+
+        self.assertRegex(tickets[0], "^[0-9a-f]{32}$")
+        self.assertAlmostEqual(
+            ticket_issued_at(tickets[0]), datetime.now().timestamp(), delta=5
+        )
+
+        await writer.stop()
+        self.assertEqual(FakeIngestEngine.tickets, {tickets[0]: 1, tickets[1]: 2})
+
+    async def test_group_claims_are_created_in_one_statement(self):
+        from sqlalchemy.dialects import postgresql
+
+        from app.ingest.engine import ClaimIngestEngine
+
+        created = datetime(2024, 1, 1)
+        session = ScriptedSession(
+            [ClaimRow(claim_id, created, created) for claim_id in (12, 10, 11)]
+        )
+        # Claims without lines, only the claims and their (no) events are written
+        claim_rows = await ClaimIngestEngine(db_session=session).ingest_many(
+            [[], [], []]
+        )
+
+        self.assertEqual([row.claim_id for row in claim_rows], [10, 11, 12])
+        self.assertEqual(len(session.statements), 2)
+        sql = str(session.statements[0].compile(dialect=postgresql.dialect()))
+        self.assertIn("INSERT INTO test_app.claim (created) SELECT now()", sql)
+        self.assertIn("FROM generate_series(", sql)
+        self.assertIn("RETURNING test_app.claim.claim_id", sql)
+
+    def test_accepted_mode_answers_202_with_the_ticket_url(self):
+        from app.api import claims
+        from app.asgi import app
+
+        writer = self.writer(writers=0)
+        writer.start()
+        payload = [
+            {
+                "service date": "3/28/18 0:00",
+                "submitted procedure": "D0180",
+                "quadrant": None,
+                "Plan/Group #": "GRP-1000",
+                "Subscriber#": "3730189502",
+                "Provider NPI": "1497775530",
+                "provider fees": "$100.00 ",
+                "Allowed fees": "$100.00 ",
+                "member coinsurance": "$0.00 ",
+                "member copay": "$0.00 ",
+            }
+        ]
+
+        with (
+            patch.object(claims, "claim_writer", writer),
+            patch.object(claims.config, "claim_ingest_mode", "accepted"),
+        ):
+            response = TestClient(app).post(
+                "/v1/claims/", json=payload, headers={"Authorization": "Bearer test"}
+            )
+
+        self.assertEqual(response.status_code, 202)
+        ticket = response.json()["ticketId"]
+        self.assertEqual(response.json()["status"], "pending")
+        self.assertEqual(response.headers["Location"], f"/v1/claims/ingest/{ticket}")
+        self.assertEqual(writer._queue.qsize(), 1)
@@ -1,3 +1,4 @@
+import json
 import os
 import unittest
 from unittest.mock import patch
@@ -31,3 +32,56 @@ class TestHealthAPIModels(unittest.TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"status": "OK"})
+
+
+class TestReadiness(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    async def test_ready_reports_the_last_ping(self):
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        from app.api import health
+        from app.telemetry.readiness import DatabaseReadiness
+
+        engine = create_async_engine("sqlite+aiosqlite://")
+        broken = create_async_engine("sqlite+aiosqlite:////nonexistent/dir/db")
+        now = [100.0]
+        readiness = DatabaseReadiness(
+            lambda: engine, interval=5, timeout=2, clock=lambda: now[0]
+        )
+
+        with patch.object(health, "database_readiness", readiness):
+            # Not pinged yet
+            self.assertEqual((await health.get_readiness()).status_code, 503)
+
+            self.assertTrue(await readiness.ping())
+            response = await health.get_readiness()
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.body)["database"]["error"], None)
+
+            # A ping that stopped reporting
+            now[0] += 20
+            self.assertEqual((await health.get_readiness()).status_code, 503)
+
+            readiness.get_engine = lambda: broken
+            with self.assertLogs("app.telemetry.readiness", "WARNING"):
+                self.assertFalse(await readiness.ping())
+            response = await health.get_readiness()
+            self.assertEqual(response.status_code, 503)
+            self.assertIn(
+                "OperationalError", json.loads(response.body)["database"]["error"]
+            )
+
+        await engine.dispose()
+        await broken.dispose()
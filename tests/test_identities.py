@@ -0,0 +1,257 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from sqlalchemy import MetaData, create_engine, event, insert, select, text
+
+
+class ScriptedResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class ScriptedSession:
+    # Answers each statement with the next list of rows
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+        self.sync_session = SimpleNamespace(info={})
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return ScriptedResult(self.results.pop(0))
+
+
+class TestIdentityUpsert(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        from app.cache.identity import identity_cache
+
+        identity_cache.clear()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    async def test_new_and_existing_keys_resolve_in_one_statement(self):
+        from sqlalchemy.dialects import postgresql
+
+        from app.ingest.engine import ClaimIngestEngine
+
+        session = ScriptedSession([("1497775530", 1), ("3730189502", 2)])
+        engine = ClaimIngestEngine(db_session=session)
+
+        self.assertEqual(
+            await engine.upsert_patients(["1497775530", "3730189502"]),
+            {"1497775530": 1, "3730189502": 2},
+        )
+        self.assertEqual(len(session.statements), 1)
+        sql = str(session.statements[0].compile(dialect=postgresql.dialect()))
+        self.assertIn("ON CONFLICT (subscriber_id) DO NOTHING", sql)
+        self.assertIn("RETURNING test_app.patient.subscriber_id", sql)
+        self.assertIn("UNION ALL", sql)
+
+    async def test_new_keys_are_inserted_in_sorted_order(self):
+        from sqlalchemy.dialects import postgresql
+
+        from app.ingest.engine import ClaimIngestEngine
+
+        keys = ["3730189502", "1497775530", "9999999999", "1234567890"]
+        session = ScriptedSession([(key, i) for i, key in enumerate(keys)])
+        await ClaimIngestEngine(db_session=session).upsert_providers(set(keys))
+
+        sql = str(
+            session.statements[0].compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
+        )
+        values = sql[sql.index("VALUES") : sql.index("ON CONFLICT")]
+        positions = [values.index(f"'{key}'") for key in sorted(keys)]
+        self.assertEqual(positions, sorted(positions))
+
+    async def test_key_committed_concurrently_is_fetched_again(self):
+        from app.ingest.engine import ClaimIngestEngine
+
+        # The insert conflicts with a row the statement's snapshot doesn't see
+        session = ScriptedSession([("1497775530", 1)], [("1234567890", 7)])
+        engine = ClaimIngestEngine(db_session=session)
+
+        self.assertEqual(
+            await engine.upsert_providers(["1497775530", "1234567890"]),
+            {"1497775530": 1, "1234567890": 7},
+        )
+        self.assertEqual(len(session.statements), 2)
+        refetch = str(
+            session.statements[1].compile(compile_kwargs={"literal_binds": True})
+        )
+        self.assertIn("'1234567890'", refetch)
+        self.assertNotIn("1497775530", refetch)
+
+
+class TestMergeDuplicateIdentities(unittest.TestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        from app.model.psql.orm import Base
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{self.tmp.name}/main.sqlite")
+        test_app_path = f"{self.tmp.name}/test_app.sqlite"
+
+        @event.listens_for(self.engine, "connect")
+        def attach_schema(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"ATTACH DATABASE '{test_app_path}' AS test_app")
+
+        # Tables as created before the unique npi/subscriber_id indexes
+        self.metadata = MetaData()
+        for table in Base.metadata.sorted_tables:
+            copy = table.to_metadata(self.metadata)
+            for column in copy.columns:
+                column.server_default = None
+                column.autoincrement = "auto"
+            for index in list(copy.indexes):
+                if index.name in ("provider_npi_key", "patient_subscriber_id_key"):
+                    copy.indexes.remove(index)
+        self.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+        self.env_patcher.stop()
+
+    def test_duplicates_merge_into_the_lowest_id(self):
+        from app.model.psql.migrations import merge_duplicate_identities
+        from app.model.psql.orm import (
+            ClaimDetailModel,
+            ClaimModel,
+            PatientModel,
+            ProviderModel,
+            ProviderNetFeeTotalModel,
+        )
+
+        line = {
+            "claim_id": 1,
+            "service_date": datetime(2018, 3, 28),
+            "submitted_procedure": "D0180",
+            "group": "GRP-1000",
+            "provider_fees_cents": 10000,
+            "allowed_fees_cents": 10000,
+            "member_co_insurance_cents": 0,
+            "member_co_pay_cents": 0,
+        }
+        with self.engine.begin() as connection:
+            connection.execute(
+                insert(ProviderModel),
+                [
+                    {"provider_id": 1, "npi": "1497775530"},
+                    {"provider_id": 2, "npi": "1234567890"},
+                    {"provider_id": 3, "npi": "1497775530"},
+                ],
+            )
+            connection.execute(
+                insert(PatientModel),
+                [
+                    {"patient_id": 1, "subscriber_id": "3730189502"},
+                    {"patient_id": 2, "subscriber_id": "3730189502"},
+                ],
+            )
+            connection.execute(insert(ClaimModel), [{"claim_id": 1}])
+            connection.execute(
+                insert(ClaimDetailModel),
+                [
+                    {
+                        **line,
+                        "id": 1,
+                        "provider_id": 1,
+                        "subscriber_id": 1,
+                        "net_fees_cents": 100,
+                    },
+                    {
+                        **line,
+                        "id": 2,
+                        "provider_id": 3,
+                        "subscriber_id": 2,
+                        "net_fees_cents": 250,
+                    },
+                    {
+                        **line,
+                        "id": 3,
+                        "provider_id": 2,
+                        "subscriber_id": 2,
+                        "net_fees_cents": 40,
+                    },
+                ],
+            )
+            connection.execute(
+                insert(ProviderNetFeeTotalModel),
+                [
+                    {"provider_id": 1, "total_net_fees_cents": 100},
+                    {"provider_id": 2, "total_net_fees_cents": 40},
+                    {"provider_id": 3, "total_net_fees_cents": 250},
+                ],
+            )
+
+        with self.engine.begin() as connection:
+            with self.assertLogs("app.model.psql.migrations", "INFO"):
+                self.assertTrue(merge_duplicate_identities(connection))
+
+        with self.engine.connect() as connection:
+            self.assertEqual(
+                connection.execute(select(ProviderModel.provider_id)).scalars().all(),
+                [1, 2],
+            )
+            self.assertEqual(
+                connection.execute(select(PatientModel.patient_id)).scalars().all(), [1]
+            )
+            self.assertEqual(
+                connection.execute(
+                    select(
+                        ClaimDetailModel.provider_id, ClaimDetailModel.subscriber_id
+                    ).order_by(ClaimDetailModel.id)
+                ).all(),
+                [(1, 1), (1, 1), (2, 1)],
+            )
+            self.assertEqual(
+                dict(
+                    connection.execute(
+                        select(
+                            ProviderNetFeeTotalModel.provider_id,
+                            ProviderNetFeeTotalModel.total_net_fees_cents,
+                        )
+                    ).all()
+                ),
+                {1: 350, 2: 40},
+            )
+
+        # The unique indexes can be created now, the migration is a no-op after
+        for index in ProviderModel.__table__.indexes | PatientModel.__table__.indexes:
+            if index.unique and index.name.endswith(("npi_key", "subscriber_id_key")):
+                index.create(self.engine)
+        with self.engine.begin() as connection:
+            self.assertFalse(merge_duplicate_identities(connection))
+            self.assertEqual(
+                connection.execute(
+                    text("SELECT count(*) FROM test_app.provider")
+                ).scalar(),
+                2,
+            )
@@ -0,0 +1,111 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+
+class RecordingResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class RecordingSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+        self.sync_session = SimpleNamespace(info={})
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return RecordingResult(self.rows)
+
+
+class TestIdentityCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        from app.cache.identity import identity_cache
+
+        identity_cache.clear()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    def test_lru_bounds_and_stats(self):
+        from app.cache.identity import PATIENT, PROVIDER, IdentityCache
+
+        cache = IdentityCache(max_entries=2)
+        cache.put(PROVIDER, {"1497775530": 1, "1234567890": 2})
+        self.assertEqual(
+            cache.lookup(PROVIDER, ["1497775530"]), ({"1497775530": 1}, set())
+        )
+
+        cache.put(PROVIDER, {"1111111111": 3})
+        found, missing = cache.lookup(PROVIDER, ["1497775530", "1234567890"])
+        self.assertEqual((found, missing), ({"1497775530": 1}, {"1234567890"}))
+
+        cache.invalidate(PROVIDER, ["1497775530"])
+        self.assertEqual(cache.lookup(PROVIDER, ["1497775530"])[1], {"1497775530"})
+
+        stats = cache.stats()
+        self.assertEqual(stats[PROVIDER]["evictions"], 1)
+        self.assertEqual(stats[PROVIDER]["hit_rate"], 0.5)
+        self.assertEqual(stats[PATIENT]["entries"], 0)
+
+    async def test_cached_identities_skip_the_lookup(self):
+        from app.cache.identity import PENDING_IDENTITIES, PROVIDER, identity_cache
+        from app.ingest.engine import ClaimIngestEngine
+
+        identity_cache.put(PROVIDER, {"1497775530": 1})
+        session = RecordingSession(rows=[("1234567890", 2)])
+        engine = ClaimIngestEngine(db_session=session)
+
+        self.assertEqual(
+            await engine.upsert_providers(["1497775530"]), {"1497775530": 1}
+        )
+        self.assertEqual(session.statements, [])
+
+        self.assertEqual(
+            await engine.upsert_providers(["1497775530", "1234567890"]),
+            {"1497775530": 1, "1234567890": 2},
+        )
+        self.assertEqual(len(session.statements), 1)
+        self.assertNotIn("1497775530", str(session.statements[0].compile()))
+        # Only the resolved key waits for the commit
+        self.assertEqual(
+            session.sync_session.info[PENDING_IDENTITIES],
+            [(PROVIDER, {"1234567890": 2})],
+        )
+
+    def test_identities_are_cached_on_commit_only(self):
+        from sqlalchemy import create_engine, text
+        from sqlalchemy.orm import Session
+
+        from app.cache.identity import PATIENT, identity_cache, remember_identities
+
+        engine = create_engine("sqlite://")
+        with Session(bind=engine) as session:
+            db_session = SimpleNamespace(sync_session=session)
+
+            session.execute(text("SELECT 1"))
+            remember_identities(db_session, PATIENT, {"3730189502": 7})
+            session.rollback()
+            session.commit()
+            self.assertEqual(identity_cache.lookup(PATIENT, ["3730189502"])[0], {})
+
+            remember_identities(db_session, PATIENT, {"3730189502": 7})
+            session.commit()
+            self.assertEqual(
+                identity_cache.lookup(PATIENT, ["3730189502"])[0], {"3730189502": 7}
+            )
+        engine.dispose()
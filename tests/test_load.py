@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+CLAIM_FILE = Path(__file__).parent.parent / "claim_1234.csv"
+
+
+class RecordingResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class RecordingConnection:
+    # Compiles every statement for postgres, the months query finds one month
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, parameters=None):
+        from sqlalchemy.dialects import postgresql
+
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return RecordingResult([datetime(2018, 3, 1)])
+
+
+class TestClaimBulkLoader(unittest.TestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        self.env_patcher.stop()
+
+    def claim_file(self, extra: bytes) -> str:
+        path = f"{self.tmp.name}/claim.csv"
+        Path(path).write_bytes(CLAIM_FILE.read_bytes().rstrip() + b"\n" + extra)
+        return path
+
+    def test_parse_rejects_bad_rows_and_keeps_the_file(self):
+        from app.tools import load
+
+        path = self.claim_file(
+            b"2018-03-28,D0180,,GRP-1000,3730189502,1497775530,$1 ,$1 ,$0 ,$0\n"
+            b"3/28/18 0:00,,,GRP-1000,3730189502,1497775530,$1 ,$1 ,$0 ,$0\n"
+            b"3/28/18 0:00,D0180,,GRP-1000,3730189502,1234567890,$1 ,$1 ,$0 ,$0\n"
+        )
+
+        calculate_net_fee = load.calculate_net_fee
+
+        def fail_on_second_provider(claim):
+            if claim.npi == "1234567890":
+                raise IndexError("list index out of range")
+            return calculate_net_fee(claim)
+
+        with patch.object(load, "calculate_net_fee", fail_on_second_provider):
+            parsed = load.parse_claim_file((7, path))
+
+        self.assertEqual((parsed.lines, parsed.rejected), (4, 3))
+        self.assertEqual(len(parsed.copy_data.splitlines()), 4)
+        self.assertTrue(parsed.copy_data.startswith('7,"1497775530","3730189502"'))
+        self.assertIn(":6: service date", parsed.errors[0])
+        self.assertIn(":7: submitted procedure", parsed.errors[1])
+        self.assertIn(":8: IndexError", parsed.errors[2])
+
+    def test_rejected_rows_are_counted_in_the_report(self):
+        from app.tools.load import ClaimBulkLoader, parse_claim_file
+
+        path = self.claim_file(
+            b"2018-03-28,D0180,,GRP-1000,3730189502,1497775530,$1 ,$1 ,$0 ,$0\n"
+        )
+        loader = ClaimBulkLoader(engine=None, workers=1, batch_lines=100)
+        loader.rejected += parse_claim_file((0, path)).rejected
+
+        with self.assertLogs("app.tools.load", "INFO") as logs:
+            loader.report(final=True)
+        self.assertIn("rejected:1", logs.output[0])
+
+    def test_merge_resolves_identities_then_writes_claims_and_totals(self):
+        from app.tools import load
+
+        connection = RecordingConnection()
+        with patch.object(load, "ensure_claim_detail_partitions") as partitions:
+            load.ClaimBulkLoader(engine=None, workers=1, batch_lines=100).merge(
+                connection
+            )
+
+        self.assertEqual(partitions.call_args.kwargs["months"], [datetime(2018, 3, 1)])
+        provider, patient, claim_ids, claims, months, lines, totals = (
+            connection.statements
+        )
+        self.assertIn("INSERT INTO test_app.provider (npi)", provider)
+        self.assertIn("ON CONFLICT (npi) DO NOTHING", provider)
+        self.assertIn("ON CONFLICT (subscriber_id) DO NOTHING", patient)
+        self.assertIn("nextval(pg_get_serial_sequence(", claim_ids)
+        self.assertIn("INSERT INTO test_app.claim (claim_id)", claims)
+        self.assertIn("date_trunc", months)
+        self.assertIn("INSERT INTO test_app.claim_detail", lines)
+        self.assertIn(
+            "JOIN test_app.provider ON test_app.provider.npi = claim_detail_staging.npi",
+            lines,
+        )
+        self.assertIn("ON CONFLICT (provider_id) DO UPDATE", totals)
+        self.assertIn("ORDER BY test_app.provider.provider_id", totals)
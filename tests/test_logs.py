@@ -0,0 +1,161 @@
+import io
+import json
+import logging
+import os
+import queue
+import unittest
+from logging.handlers import QueueListener
+from unittest.mock import patch
+
+
+class TestLoggingPipeline(unittest.TestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    def record(self, msg, *args, level=logging.INFO):
+        return logging.LogRecord("app.test", level, __file__, 1, msg, args, None)
+
+    def test_queued_records_keep_the_request_trace_id(self):
+        from app.telemetry.logs import JsonFormatter, TraceQueueHandler
+        from app.telemetry.trace import request_id_context
+
+        stream = io.StringIO()
+        stream_handler = logging.StreamHandler(stream)
+        stream_handler.setFormatter(JsonFormatter())
+        handler = TraceQueueHandler(queue.Queue(maxsize=10))
+        listener = QueueListener(handler.queue, stream_handler)
+
+        listener.start()
+        token = request_id_context.set("4bf92f3577b34da6a3ce929d0e0e4736")
+        try:
+            handler.handle(self.record("Processing claim for user: %s", "1234"))
+        finally:
+            request_id_context.reset(token)
+        listener.stop()
+
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(entry["trace_id"], "4bf92f3577b34da6a3ce929d0e0e4736")
+        self.assertEqual(entry["message"], "Processing claim for user: 1234")
+        self.assertEqual(entry["level"], "INFO")
+
+    def test_records_are_formatted_by_the_listener_thread(self):
+        import sys
+        import threading
+
+        from app.telemetry.logs import JsonFormatter, TraceQueueHandler
+
+        threads = []
+
+        class RecordingFormatter(JsonFormatter):
+            def format(self, record):
+                threads.append(threading.current_thread().name)
+                return super().format(record)
+
+        stream = io.StringIO()
+        stream_handler = logging.StreamHandler(stream)
+        stream_handler.setFormatter(RecordingFormatter())
+        handler = TraceQueueHandler(queue.Queue(maxsize=10))
+        listener = QueueListener(handler.queue, stream_handler)
+
+        try:
+            raise ValueError("bad claim")
+        except ValueError:
+            record = logging.LogRecord(
+                "app.test",
+                logging.ERROR,
+                __file__,
+                1,
+                "Claim %s failed",
+                ("1234",),
+                sys.exc_info(),
+            )
+        handler.handle(record)
+        queued = handler.queue.get_nowait()
+        # Queued as logged, only the trace id added
+        self.assertEqual((queued.msg, queued.args), ("Claim %s failed", ("1234",)))
+        self.assertIsNotNone(queued.exc_info)
+        self.assertEqual(threads, [])
+
+        listener.start()
+        handler.queue.put_nowait(queued)
+        listener.stop()
+
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.current_thread().name)
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(entry["message"], "Claim 1234 failed")
+        self.assertIn("ValueError: bad claim", entry["exception"])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        from app.telemetry.logs import TraceQueueHandler
+
+        handler = TraceQueueHandler(queue.Queue(maxsize=2))
+        for line in range(5):
+            handler.handle(self.record("line %s", line))
+
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_sampling_keeps_warnings(self):
+        from app.telemetry.logs import SamplingFilter, parse_logger_settings
+
+        sampler = SamplingFilter(0.25)
+        kept = [sampler.filter(self.record("line %s", line)) for line in range(8)]
+        self.assertEqual(kept, [True, False, False, False] * 2)
+        self.assertTrue(sampler.filter(self.record("slow", level=logging.WARNING)))
+        self.assertEqual(
+            parse_logger_settings("app.api.claims=0.1, sqlalchemy.engine=0"),
+            {"app.api.claims": 0.1, "sqlalchemy.engine": 0.0},
+        )
+
+    def test_logger_settings_cover_child_loggers(self):
+        from app.telemetry.logs import RateLimitFilter, SamplingFilter
+
+        handler = logging.StreamHandler(io.StringIO())
+        handler.addFilter(SamplingFilter(0.5, name="sqlalchemy.engine"))
+        handler.addFilter(RateLimitFilter(1, name="app.api", clock=lambda: 100.0))
+
+        def record(name, line):
+            return logging.LogRecord(
+                name, logging.INFO, __file__, 1, "line %s", (line,), None
+            )
+
+        sampled = [
+            handler.filter(record("sqlalchemy.engine.Engine", line))
+            for line in range(4)
+        ]
+        self.assertEqual(sampled, [True, False, True, False])
+        limited = [handler.filter(record("app.api.claims", line)) for line in range(3)]
+        self.assertEqual(limited, [True, False, False])
+        # Neither setting covers other loggers, nor a name that merely starts alike
+        self.assertTrue(
+            all(handler.filter(record("app.apiary", line)) for line in range(3))
+        )
+        self.assertTrue(
+            all(handler.filter(record("app.test", line)) for line in range(3))
+        )
+
+    def test_rate_limit_reports_suppressed_records(self):
+        from app.telemetry.logs import RateLimitFilter
+
+        now = [100.0]
+        limiter = RateLimitFilter(per_second=2, clock=lambda: now[0])
+        passed = [limiter.filter(self.record("line %s", line)) for line in range(5)]
+        self.assertEqual(passed, [True, True, False, False, False])
+
+        now[0] = 101.2
+        record = self.record("line %s", 5)
+        self.assertTrue(limiter.filter(record))
+        self.assertEqual(
+            record.getMessage(), "line 5 (3 earlier messages suppressed by rate limit)"
+        )
@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    def test_requests_are_counted_by_route_name(self):
+        from prometheus_client import REGISTRY
+
+        from app.asgi import app
+
+        labels = {"route": "get_health", "method": "GET", "status": "200"}
+        before = REGISTRY.get_sample_value("claim_app_http_requests_total", labels) or 0
+
+        client = TestClient(app=app)
+        client.get("/health/")
+        client.get("/no-such-route")
+        response = client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertEqual(
+            REGISTRY.get_sample_value("claim_app_http_requests_total", labels),
+            before + 1,
+        )
+        self.assertIn('route="unmatched"', response.text)
+        self.assertIn(
+            'claim_app_http_request_duration_seconds_bucket{le="0.005",route="get_health"}',
+            response.text,
+        )
+
+    def test_pool_checkouts_are_tracked(self):
+        from prometheus_client import REGISTRY
+        from sqlalchemy import create_engine
+        from sqlalchemy.pool import QueuePool
+
+        from app.telemetry.metrics import instrument_pool
+
+        engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=1)
+        instrument_pool(engine.pool)
+        before = REGISTRY.get_sample_value("claim_app_db_pool_checked_out")
+
+        first = engine.connect()
+        second = engine.connect()
+        self.assertEqual(
+            REGISTRY.get_sample_value("claim_app_db_pool_checked_out"), before + 2
+        )
+        self.assertEqual(REGISTRY.get_sample_value("claim_app_db_pool_overflow"), 1)
+
+        first.close()
+        second.close()
+        self.assertEqual(
+            REGISTRY.get_sample_value("claim_app_db_pool_checked_out"), before
+        )
+        engine.dispose()
+
+    def test_workers_are_aggregated_through_the_multiprocess_dir(self):
+        worker = textwrap.dedent(
+            """
+            from app.telemetry.metrics import CLAIM_LINES_INGESTED
+            CLAIM_LINES_INGESTED.labels("process_claim").inc(4)
+            """
+        )
+        scrape = textwrap.dedent(
+            """
+            import sys
+            from app.telemetry.metrics import render_metrics
+            sys.stdout.write(render_metrics().decode())
+            """
+        )
+
+        with tempfile.TemporaryDirectory() as multiproc_dir:
+            env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": multiproc_dir}
+            for _ in range(2):
+                subprocess.run([sys.executable, "-c", worker], env=env, check=True)
+            output = subprocess.run(
+                [sys.executable, "-c", scrape],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+
+        self.assertIn(
+            'claim_app_claim_lines_ingested_total{route="process_claim"} 8.0', output
+        )
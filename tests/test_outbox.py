@@ -0,0 +1,178 @@
+import json
+import os
+import tempfile
+import unittest
+from collections import namedtuple
+from datetime import datetime
+from unittest.mock import patch
+
+OutboxRow = namedtuple(
+    "OutboxRow", ["id", "claim_id", "event_type", "payload", "attempts", "created"]
+)
+
+
+class FakeSession:
+    def __init__(self):
+        self.commits = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        pass
+
+
+class FakeOutboxStore:
+    # Shared across dispatch transactions like the payment_outbox table
+    rows = {}
+    dead = {}
+
+    def __init__(self, db_session):
+        self.db_session = db_session
+
+    async def claim_batch(self, limit):
+        return sorted(self.rows.values())[:limit]
+
+    async def delete(self, ids):
+        for id in ids:
+            del self.rows[id]
+
+    async def retry(self, ids, error, backoff_base, backoff_max):
+        for id in ids:
+            self.rows[id] = self.rows[id]._replace(attempts=self.rows[id].attempts + 1)
+
+    async def dead_letter(self, ids, error):
+        for id in ids:
+            self.dead[id] = error
+        await self.delete(ids)
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return RecordingResult()
+
+
+class RecordingResult:
+    def all(self):
+        return []
+
+
+class BrokenSink:
+    async def publish(self, events):
+        raise ConnectionError("queue is down")
+
+    async def close(self):
+        pass
+
+
+class TestOutboxDispatcher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        FakeOutboxStore.rows = {
+            id: OutboxRow(
+                id,
+                1000 + id,
+                "claim.processed",
+                {"claimId": 1000 + id, "lines": 4, "netFeesCents": 11685},
+                0,
+                datetime(2024, 1, 1),
+            )
+            for id in range(1, 6)
+        }
+        FakeOutboxStore.dead = {}
+        self.session = FakeSession()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    def dispatcher(self, sink, **kwargs):
+        from app.outbox.dispatcher import OutboxDispatcher
+
+        return OutboxDispatcher(
+            session_factory=lambda: self.session,
+            sink=sink,
+            batch_size=2,
+            store_class=FakeOutboxStore,
+            **kwargs,
+        )
+
+    async def test_publishes_and_deletes_in_batches(self):
+        from app.outbox.sinks import MemoryPaymentEventSink
+
+        sink = MemoryPaymentEventSink()
+        dispatcher = self.dispatcher(sink)
+
+        self.assertEqual(
+            [await dispatcher.dispatch_once() for _ in range(4)], [2, 2, 1, 0]
+        )
+        self.assertEqual([event["eventId"] for event in sink.events], [1, 2, 3, 4, 5])
+        self.assertEqual(sink.events[0]["payload"]["netFeesCents"], 11685)
+        self.assertEqual(FakeOutboxStore.rows, {})
+        self.assertEqual(self.session.commits, 3)
+
+    async def test_failed_publish_retries_then_dead_letters(self):
+        dispatcher = self.dispatcher(BrokenSink(), max_attempts=2)
+
+        await dispatcher.dispatch_once()
+        self.assertEqual(FakeOutboxStore.rows[1].attempts, 1)
+        self.assertEqual(dispatcher.retried, 2)
+
+        await dispatcher.dispatch_once()
+        self.assertNotIn(1, FakeOutboxStore.rows)
+        self.assertEqual(
+            FakeOutboxStore.dead,
+            {1: "ConnectionError: queue is down", 2: "ConnectionError: queue is down"},
+        )
+        self.assertEqual(dispatcher.dead_lettered, 2)
+
+    async def test_file_sink_appends_json_lines(self):
+        from app.outbox.sinks import FilePaymentEventSink
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = FilePaymentEventSink(path=f"{tmp}/payment-events.jsonl")
+            dispatcher = self.dispatcher(sink)
+            while await dispatcher.dispatch_once():
+                pass
+
+            with open(sink.path) as sink_file:
+                events = [json.loads(line) for line in sink_file]
+
+        self.assertEqual(
+            [event["claimId"] for event in events], [1001, 1002, 1003, 1004, 1005]
+        )
+        self.assertEqual(events[0]["createdAt"], "2024-01-01T00:00:00")
+
+    async def test_outbox_statements_lock_and_back_off(self):
+        from sqlalchemy.dialects import postgresql
+
+        from app.outbox.store import OutboxStore
+
+        store = OutboxStore(RecordingSession())
+        await store.claim_batch(10)
+        await store.retry([1], "down", 1.0, 300.0)
+
+        claim_sql, retry_sql = [
+            str(statement.compile(dialect=postgresql.dialect()))
+            for statement in store.db_session.statements
+        ]
+        self.assertIn("FOR UPDATE SKIP LOCKED", claim_sql)
+        self.assertIn("attempts=(test_app.payment_outbox.attempts + ", retry_sql)
+        self.assertIn("least(", retry_sql)
@@ -0,0 +1,148 @@
+import os
+import unittest
+from datetime import date, datetime
+from unittest.mock import patch
+
+
+class ScriptedResult:
+    def __init__(self, rows):
+        self.rows = rows
+        self.rowcount = len(rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def scalar(self):
+        return self.rows[0][0] if self.rows else None
+
+
+class ScriptedConnection:
+    # Answers the catalog queries of the partition maintenance from sets of
+    # table names, records every statement
+    def __init__(self, attached, detached=(), default_months=()):
+        self.attached = set(attached)
+        self.detached = set(detached)
+        self.default_months = default_months
+        self.statements = []
+
+    def execute(self, statement, parameters=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        if "to_regclass" in sql:
+            name = parameters["name"].split(".")[1]
+            exists = name in self.attached or name in self.detached
+            return ScriptedResult([(name if exists else None,)])
+        if "FROM pg_inherits" in sql:
+            return ScriptedResult([(name,) for name in self.attached])
+        if "date_trunc" in sql:
+            return ScriptedResult([(month,) for month in self.default_months])
+        if "ATTACH PARTITION" in sql:
+            self.attached.add(sql.split(".")[-1].split(" ")[0])
+        return ScriptedResult([])
+
+
+class TestClaimDetailPartitions(unittest.TestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    def test_claim_detail_is_range_partitioned_by_service_date(self):
+        from sqlalchemy.dialects import postgresql
+        from sqlalchemy.schema import CreateTable
+
+        from app.model.psql.orm import ClaimDetailModel
+
+        ddl = str(
+            CreateTable(ClaimDetailModel.__table__).compile(
+                dialect=postgresql.dialect()
+            )
+        )
+        self.assertIn("PRIMARY KEY (id, service_date)", ddl)
+        self.assertIn("PARTITION BY RANGE (service_date)", ddl)
+        self.assertIn("id SERIAL NOT NULL", ddl)
+
+    def test_month_arithmetic(self):
+        from app.model.psql.partitions import add_months, month_start, partition_name
+
+        self.assertEqual(month_start(datetime(2024, 2, 29, 13, 5)), date(2024, 2, 1))
+        self.assertEqual(add_months(date(2024, 11, 1), 3), date(2025, 2, 1))
+        self.assertEqual(add_months(date(2024, 1, 1), -1), date(2023, 12, 1))
+        self.assertEqual(partition_name(date(2018, 3, 1)), "claim_detail_p201803")
+
+    def test_ensure_creates_missing_months_and_drains_default(self):
+        from app.model.psql.partitions import ensure_claim_detail_partitions
+
+        connection = ScriptedConnection(
+            attached={"claim_detail_p202401"},
+            detached={"claim_detail_p201803"},
+            default_months=[datetime(2018, 3, 1), datetime(2019, 7, 1)],
+        )
+
+        with self.assertLogs("app.model.psql.partitions", "WARNING"):
+            created = ensure_claim_detail_partitions(
+                connection, months_ahead=2, today=date(2024, 1, 17)
+            )
+
+        self.assertEqual(
+            created,
+            [
+                "test_app.claim_detail_p201907",
+                "test_app.claim_detail_p202402",
+                "test_app.claim_detail_p202403",
+            ],
+        )
+        self.assertIn("pg_advisory_xact_lock", connection.statements[0])
+        statements = "\n".join(connection.statements)
+        self.assertIn(
+            "DELETE FROM test_app.claim_detail_default WHERE "
+            "service_date >= '2019-07-01' AND service_date < '2019-08-01'",
+            statements,
+        )
+        # The default is locked before its lines of the month move out
+        moves = [
+            i for i, sql in enumerate(connection.statements) if "WITH moved" in sql
+        ]
+        for i in moves:
+            self.assertEqual(
+                connection.statements[i - 1],
+                "LOCK TABLE test_app.claim_detail_default IN ACCESS EXCLUSIVE MODE",
+            )
+        self.assertIn(
+            "ATTACH PARTITION test_app.claim_detail_p202403 "
+            "FOR VALUES FROM ('2024-03-01') TO ('2024-04-01')",
+            statements,
+        )
+
+    def test_detach_stops_at_the_cutoff(self):
+        from app.model.psql.partitions import detach_claim_detail_partitions
+
+        connection = ScriptedConnection(
+            attached={
+                "claim_detail_p202311",
+                "claim_detail_p202312",
+                "claim_detail_p202401",
+            }
+        )
+
+        detached = detach_claim_detail_partitions(connection, before=date(2024, 1, 1))
+
+        self.assertEqual(
+            detached,
+            ["test_app.claim_detail_p202311", "test_app.claim_detail_p202312"],
+        )
+        # Each detach is followed by subtracting its lines from the totals
+        detaches = [i for i, sql in enumerate(connection.statements) if "DETACH" in sql]
+        self.assertEqual(len(detaches), 2)
+        for i in detaches:
+            subtract = connection.statements[i + 1]
+            self.assertIn("UPDATE test_app.provider_net_fee_totals", subtract)
+            self.assertIn(connection.statements[i].split()[-1], subtract)
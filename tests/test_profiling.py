@@ -0,0 +1,77 @@
+import os
+import re
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+
+class TestRequestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        from fastapi import APIRouter, FastAPI
+        from sqlalchemy import text
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        from app.telemetry.profiling import (
+            ProfiledAPIRoute,
+            ProfilingMiddleware,
+            instrument_engine,
+            profile_phase,
+        )
+
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        instrument_engine(self.engine.sync_engine, slow_query_ms=0, explain_slow=True)
+
+        router = APIRouter(route_class=ProfiledAPIRoute)
+
+        @router.get("/claims/{claimId}")
+        async def get_claim(claimId: int) -> dict:
+            with profile_phase("validate"):
+                claim_ids = [claimId] * 6
+            # One query per line, the N+1 pattern the profile flags
+            async with self.engine.connect() as connection:
+                lines = [
+                    (await connection.execute(text("SELECT :id"), {"id": id})).scalar()
+                    for id in claim_ids
+                ]
+            return {"claimId": claimId, "lines": lines}
+
+        app = FastAPI()
+        app.include_router(router)
+        self.app = TestClient(
+            app=ProfilingMiddleware(app, server_timing=True, repeated_query_threshold=5)
+        )
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    def test_server_timing_breaks_down_the_request(self):
+        with self.assertLogs("app.telemetry.profiling", "WARNING") as logs:
+            response = self.app.get("/claims/7")
+
+        self.assertEqual(response.json(), {"claimId": 7, "lines": [7] * 6})
+        self.assertRegex(
+            response.headers["server-timing"],
+            re.compile(
+                r'^db;dur=[\d.]+;desc="6 queries", validate;dur=[\d.]+, '
+                r"serialize;dur=[\d.]+, total;dur=[\d.]+$"
+            ),
+        )
+
+        messages = [record.getMessage() for record in logs.records]
+        self.assertEqual(
+            sum(message.startswith("Slow query") for message in messages), 6
+        )
+        self.assertIn(
+            "Statement executed 6 times in GET /claims/7, N+1 pattern? SELECT ?",
+            messages,
+        )
@@ -0,0 +1,221 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+
+class FakeClock(object):
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class RecordingResult(object):
+    rowcount = 3
+
+    def one(self):
+        return (1, 9.0)
+
+
+class RecordingEngine(object):
+    # Stands in for the async engine of PostgresTokenBucketStore
+    def __init__(self) -> None:
+        self.statements = []
+        self.isolation_level = None
+
+    def begin(self):
+        self.isolation_level = "transaction"
+        return self
+
+    def connect(self):
+        self.isolation_level = None
+        return self
+
+    async def execution_options(self, isolation_level):
+        self.isolation_level = isolation_level
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, parameters):
+        self.statements.append((str(statement), parameters, self.isolation_level))
+        return RecordingResult()
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    async def test_workers_share_one_bucket(self):
+        from app.ratelimit.buckets import LocalTokenBucketStore, parse_rate_limits
+        from app.ratelimit.limiter import RateLimiter
+
+        clock = FakeClock()
+        store = LocalTokenBucketStore(clock=clock)
+        limits = parse_rate_limits("top_providers=10/minute")
+        workers = [RateLimiter(store, limits, clock=clock) for _ in range(5)]
+
+        decisions = [
+            await workers[check % 5].check("top_providers", "123:abc")
+            for check in range(30)
+        ]
+        self.assertEqual(sum(decision.allowed for decision in decisions), 10)
+        self.assertAlmostEqual(decisions[-1].retry_after, 6)
+
+        # Other clients have their own bucket, refills follow the clock
+        self.assertTrue((await workers[0].check("top_providers", "123:xyz")).allowed)
+        clock.now += 6
+        self.assertTrue((await workers[1].check("top_providers", "123:abc")).allowed)
+        self.assertFalse((await workers[2].check("top_providers", "123:abc")).allowed)
+
+    async def test_leases_serve_clients_well_under_their_limit(self):
+        from app.ratelimit.buckets import LocalTokenBucketStore, parse_rate_limits
+        from app.ratelimit.limiter import RateLimiter
+
+        clock = FakeClock()
+        store = LocalTokenBucketStore(clock=clock)
+        takes = []
+        take = store.take
+
+        async def counted_take(key, limit, lease):
+            takes.append(lease)
+            return await take(key, limit, lease)
+
+        store.take = counted_take
+        limiter = RateLimiter(
+            store, parse_rate_limits("claims=100/minute"), clock=clock
+        )
+
+        decisions = [await limiter.check("claims", "123:abc") for _ in range(100)]
+
+        # Leases of 10 while the bucket holds 20 or more, single tokens after
+        self.assertTrue(all(decision.allowed for decision in decisions))
+        self.assertEqual(takes, [10] * 19)
+        self.assertFalse((await limiter.check("claims", "123:abc")).allowed)
+        self.assertEqual(len(takes), 20)
+
+        # Leased tokens expire unused
+        clock.now += 60
+        await limiter.check("claims", "123:abc")
+        await limiter.check("claims", "123:abc")
+        clock.now += 1
+        await limiter.check("claims", "123:abc")
+        self.assertEqual(len(takes), 22)
+
+    async def test_failing_store_lets_requests_through(self):
+        from app.ratelimit.buckets import TokenBucketStore, parse_rate_limits
+        from app.ratelimit.limiter import RateLimiter
+
+        limiter = RateLimiter(
+            TokenBucketStore(), parse_rate_limits("top_providers=1/minute")
+        )
+        with self.assertLogs("app.ratelimit.limiter", "WARNING"):
+            self.assertTrue((await limiter.check("top_providers", "123:abc")).allowed)
+
+    async def test_full_buckets_are_purged_once_per_interval(self):
+        from app.ratelimit.buckets import PostgresTokenBucketStore, RateLimit
+
+        clock = FakeClock()
+        engine = RecordingEngine()
+        store = PostgresTokenBucketStore(
+            get_engine=lambda: engine, retention_seconds=60, clock=clock
+        )
+        limit = RateLimit(capacity=10, period=60)
+
+        with self.assertLogs("app.ratelimit.buckets", "INFO") as logs:
+            for _ in range(3):
+                self.assertEqual(await store.take("top:123:abc", limit, 1), (1, 9.0))
+            clock.now += 3601
+            await store.take("top:123:abc", limit, 1)
+
+        purges = [
+            parameters
+            for statement, parameters, _ in engine.statements
+            if statement.strip().startswith("DELETE FROM test_app.rate_limit_bucket")
+        ]
+        self.assertEqual(purges, [{"retention_seconds": 60}] * 2)
+        self.assertEqual(len(engine.statements), 6)
+        # Takes are autocommitted, no BEGIN/COMMIT round trips around the upsert
+        self.assertEqual(
+            {
+                isolation_level
+                for statement, _, isolation_level in engine.statements
+                if "INSERT INTO test_app.rate_limit_bucket" in statement
+            },
+            {"AUTOCOMMIT"},
+        )
+        self.assertIn("Purged 3 full rate limit buckets", logs.output[0])
+
+    def test_lease_needs_two_tokens_to_serve_locally(self):
+        from app.ratelimit.buckets import parse_rate_limits
+        from app.ratelimit.limiter import RateLimiter
+
+        limits = parse_rate_limits("top_providers=10/minute,claims=20/minute")
+        limiter = RateLimiter(None, limits)
+        self.assertEqual(limiter.lease_size(limits["top_providers"]), 1)
+        self.assertEqual(limiter.lease_size(limits["claims"]), 2)
+
+    def test_shared_store_keeps_buckets_for_the_longest_period(self):
+        from app.ratelimit import limiter
+        from app.ratelimit.buckets import parse_rate_limits
+
+        with patch.object(limiter.config, "rate_limit_backend", "postgres"):
+            store = limiter.initialize_rate_limit_store(
+                parse_rate_limits("top_providers=10/minute,claims=1000/hour")
+            )
+
+        self.assertEqual(store.retention_seconds, 3600)
+
+    def test_route_answers_429_per_authenticated_client(self):
+        from typing import Annotated
+
+        from fastapi import Depends, FastAPI, Header
+
+        from app.authorizer.authorizer import authenticate_user
+        from app.ratelimit import limiter
+        from app.ratelimit.buckets import LocalTokenBucketStore, parse_rate_limits
+
+        app = FastAPI()
+
+        @app.get("/top", dependencies=[Depends(limiter.rate_limit("top_providers"))])
+        async def top() -> dict:
+            return {"status": "OK"}
+
+        def authenticate(Authorization: Annotated[str, Header()]):
+            return {"sub": Authorization, "tenant": "123"}
+
+        app.dependency_overrides[authenticate_user] = authenticate
+        client = TestClient(app)
+        rate_limiter = limiter.RateLimiter(
+            LocalTokenBucketStore(), parse_rate_limits("top_providers=2/minute")
+        )
+
+        with patch.object(limiter, "rate_limiter", rate_limiter):
+            statuses = [
+                client.get("/top", headers={"Authorization": "abc"}).status_code
+                for _ in range(3)
+            ]
+            denied = client.get("/top", headers={"Authorization": "abc"})
+            other = client.get("/top", headers={"Authorization": "xyz"})
+
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(denied.json(), {"detail": "Too Many Requests."})
+        self.assertEqual(denied.headers["Retry-After"], "30")
+        self.assertEqual(other.status_code, 200)
@@ -0,0 +1,97 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+
+class TestReadReplicas(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        from app.model.psql.replicas import ReadReplicas, Replica
+
+        self.primary = create_async_engine("sqlite+aiosqlite://")
+        self.replica_engine = create_async_engine("sqlite+aiosqlite://")
+        self.broken = create_async_engine("sqlite+aiosqlite:////nonexistent/dir/db")
+        self.now = [1000.0]
+        self.replica = Replica(
+            "replica",
+            self.replica_engine,
+            sessionmaker(bind=self.replica_engine, class_=AsyncSession),
+        )
+        self.replicas = ReadReplicas(
+            [self.replica],
+            max_lag=5,
+            sticky_seconds=10,
+            clock=lambda: self.now[0],
+        )
+
+    async def asyncTearDown(self):
+        for engine in (self.primary, self.replica_engine, self.broken):
+            await engine.dispose()
+        self.env_patcher.stop()
+
+    async def test_reads_use_healthy_replicas_except_after_a_write(self):
+        # Not pinged yet
+        self.assertIsNone(self.replicas.route("123:abc"))
+
+        self.assertTrue(await self.replicas.ping(self.replica))
+        self.assertIs(self.replicas.route("123:abc"), self.replica)
+
+        until = self.replicas.stick("123:abc")
+        self.assertIsNone(self.replicas.route("123:abc"))
+        self.assertIs(self.replicas.route("123:other"), self.replica)
+
+        # Another worker only knows the cookie, a made up one is ignored
+        self.replicas._sticky.clear()
+        self.assertIsNone(self.replicas.route("123:abc", until))
+        self.assertIs(self.replicas.route("123:abc", until + 3600), self.replica)
+
+        self.now[0] += 11
+        self.assertIs(self.replicas.route("123:abc", until), self.replica)
+
+    async def test_lagging_or_failing_replica_falls_back_to_the_primary(self):
+        primary = sessionmaker(bind=self.primary, class_=AsyncSession)
+        self.assertTrue(await self.replicas.ping(self.replica))
+
+        async with self.replicas.session(primary, "123:abc") as db_session:
+            self.assertIs(db_session.bind, self.replica_engine)
+
+        # Went away since its last ping
+        self.replica.engine = self.broken
+        self.replica.session_factory = sessionmaker(
+            bind=self.broken, class_=AsyncSession
+        )
+        with self.assertLogs("app.model.psql.replicas", "WARNING"):
+            async with self.replicas.session(primary, "123:abc") as db_session:
+                self.assertIs(db_session.bind, self.primary)
+        self.assertFalse(self.replica.ok)
+        self.assertIn("OperationalError", self.replicas.status()[0]["error"])
+
+        self.replica.engine = self.replica_engine
+        self.assertTrue(await self.replicas.ping(self.replica))
+        self.replicas.max_lag = -1
+        with self.assertLogs("app.model.psql.replicas", "WARNING"):
+            self.assertFalse(await self.replicas.ping(self.replica))
+        self.assertIsNone(self.replicas.route("123:abc"))
+
+    def test_write_response_sets_the_primary_cookie(self):
+        from app.api import claims
+        from app.model.psql.replicas import PRIMARY_COOKIE
+
+        auth = {"sub": "abc", "tenant": "123", "scopes": []}
+        with patch.object(claims, "get_read_replicas", return_value=self.replicas):
+            response = claims.Response()
+            claims._stick_to_primary(auth, response)
+
+        self.assertIn(PRIMARY_COOKIE, response.headers["set-cookie"])
+        self.assertTrue(self.replicas.is_sticky("123:abc"))
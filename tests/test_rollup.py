@@ -0,0 +1,173 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import MetaData, event, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+CLAIM = {
+    "service date": "3/28/18 0:00",
+    "submitted procedure": "D0180",
+    "quadrant": None,
+    "Plan/Group #": "GRP-1000",
+    "Subscriber#": "3730189502",
+    "Provider NPI": "1497775530",
+    "provider fees": "$100.00 ",
+    "Allowed fees": "$100.00 ",
+    "member coinsurance": "$0.00 ",
+    "member copay": "$0.00 ",
+}
+
+NPIS = [f"{1000000000 + provider}" for provider in range(12)]
+
+
+class TestProviderNetFeeTotals(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        from app.cache.identity import PATIENT, PROVIDER, identity_cache
+        from app.model.psql.orm import (
+            Base,
+            ClaimDetailModel,
+            ClaimModel,
+            PatientModel,
+            ProviderModel,
+        )
+
+        # The ORM lives in the test_app schema, sqlite gets it as an attached db
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(
+            f"sqlite+aiosqlite:///{self.tmp.name}/main.sqlite"
+        )
+        test_app_path = f"{self.tmp.name}/test_app.sqlite"
+
+        @event.listens_for(self.engine.sync_engine, "connect")
+        def attach_schema(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"ATTACH DATABASE '{test_app_path}' AS test_app")
+
+        # now() server defaults are postgres only. sqlite can't autoincrement the
+        # (id, service_date) key, the ingest leaves the line ids NULL here.
+        metadata = MetaData()
+        for table in Base.metadata.sorted_tables:
+            copy = table.to_metadata(metadata)
+            for column in copy.columns:
+                column.server_default = None
+                column.autoincrement = "auto"
+        metadata.tables[ClaimDetailModel.__table__.fullname].c.id.nullable = True
+
+        async with self.engine.begin() as connection:
+            await connection.run_sync(metadata.create_all)
+            await connection.execute(
+                insert(ProviderModel),
+                [
+                    {"provider_id": provider_id, "npi": npi}
+                    for provider_id, npi in enumerate(NPIS, 1)
+                ],
+            )
+            await connection.execute(
+                insert(PatientModel), [{"patient_id": 1, "subscriber_id": "3730189502"}]
+            )
+            await connection.execute(
+                insert(ClaimModel), [{"claim_id": i} for i in range(1, 6)]
+            )
+
+        # Identities resolve from the cache, their upsert needs postgres RETURNING
+        identity_cache.clear()
+        identity_cache.put(
+            PROVIDER, {npi: provider_id for provider_id, npi in enumerate(NPIS, 1)}
+        )
+        identity_cache.put(PATIENT, {"3730189502": 1})
+
+    async def asyncTearDown(self):
+        from app.cache.identity import identity_cache
+
+        identity_cache.clear()
+        await self.engine.dispose()
+        self.tmp.cleanup()
+        self.env_patcher.stop()
+
+    async def top_providers(self, db_session):
+        from app.api import claims
+        from app.cache.response import ResponseCache
+
+        with patch.object(claims, "response_cache", ResponseCache(None, {})):
+            response = await claims.get_top_providers(
+                auth={"sub": "abc"}, db_session=db_session
+            )
+        return json.loads(response.body)
+
+    async def line_totals(self, db_session):
+        from app.model.psql.orm import ClaimDetailModel, ProviderModel
+
+        result = await db_session.execute(
+            select(ProviderModel.npi, func.sum(ClaimDetailModel.net_fees_cents))
+            .join(
+                ProviderModel,
+                ProviderModel.provider_id == ClaimDetailModel.provider_id,
+            )
+            .group_by(ProviderModel.npi)
+        )
+        return dict(result.all())
+
+    async def rollup_totals(self, connection):
+        from app.model.psql.orm import ProviderNetFeeTotalModel
+
+        result = await connection.execute(
+            select(
+                ProviderNetFeeTotalModel.provider_id,
+                ProviderNetFeeTotalModel.total_net_fees_cents,
+            )
+        )
+        return dict(result.all())
+
+    async def test_ingested_totals_match_the_claim_lines_and_a_rebuild(self):
+        from app.ingest.engine import ClaimIngestEngine
+        from app.ingest.rollup import rebuild_provider_net_fee_totals
+        from app.model.api.claims import Claim
+
+        async with AsyncSession(bind=self.engine) as db_session:
+            ingest_engine = ClaimIngestEngine(db_session=db_session)
+            for claim_id in range(1, 6):
+                # Overlapping providers across claims, fees vary by line
+                claims = [
+                    Claim.model_validate(
+                        {
+                            **CLAIM,
+                            "Provider NPI": NPIS[(claim_id * line) % len(NPIS)],
+                            "provider fees": f"${100 + claim_id * 7 + line}.25 ",
+                            "member coinsurance": f"${line}.10 ",
+                        }
+                    )
+                    for line in range(1, 8)
+                ]
+                await ingest_engine.insert_claim_lines(claim_id, claims)
+            await db_session.commit()
+
+            line_totals = await self.line_totals(db_session)
+            top_providers = await self.top_providers(db_session)
+
+        self.assertEqual(len(line_totals), 12)
+        for provider in top_providers:
+            self.assertEqual(
+                provider["total_net_fees_cents"], line_totals[provider["provider_npi"]]
+            )
+        self.assertEqual(
+            [provider["total_net_fees_cents"] for provider in top_providers],
+            sorted(line_totals.values(), reverse=True)[:10],
+        )
+
+        async with self.engine.begin() as connection:
+            totals = await self.rollup_totals(connection)
+            self.assertEqual(
+                await connection.run_sync(rebuild_provider_net_fee_totals), 12
+            )
+            self.assertEqual(await self.rollup_totals(connection), totals)
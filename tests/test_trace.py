@@ -0,0 +1,69 @@
+import os
+import re
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+
+class TestTraceIdMiddleware(unittest.TestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DATABASE_URL": "sqlite:///:memory:",
+                "ENVIRONMENT": "dev",
+            },
+        )
+        self.env_patcher.start()
+
+        from starlette.applications import Starlette
+        from starlette.responses import PlainTextResponse
+        from starlette.routing import Route
+
+        from app.telemetry.trace import TraceIdMiddleware, request_id_context
+
+        async def trace_id(request):
+            return PlainTextResponse(request_id_context.get())
+
+        self.app = TestClient(
+            app=TraceIdMiddleware(Starlette(routes=[Route("/trace", trace_id)]))
+        )
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    def test_traceparent_trace_id_is_used(self):
+        response = self.app.get(
+            "/trace",
+            headers={
+                "traceparent": "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01",
+                "x-request-id": "ignored-when-traceparent-is-valid",
+            },
+        )
+
+        self.assertEqual(response.text, "4bf92f3577b34da6a3ce929d0e0e4736")
+        self.assertEqual(
+            response.headers["x-request-id"], "4bf92f3577b34da6a3ce929d0e0e4736"
+        )
+
+    def test_request_id_header_is_echoed(self):
+        response = self.app.get("/trace", headers={"x-request-id": "lb-7f3a:42"})
+
+        self.assertEqual(response.text, "lb-7f3a:42")
+        self.assertEqual(response.headers["x-request-id"], "lb-7f3a:42")
+
+    def test_unusable_ids_get_a_generated_one(self):
+        first = self.app.get(
+            "/trace",
+            headers={
+                "traceparent": "00-00000000000000000000000000000000-00f067aa0ba902b7-01",
+                "x-request-id": "spaces and\ttabs",
+            },
+        )
+        second = self.app.get("/trace")
+
+        for response in (first, second):
+            self.assertRegex(response.text, re.compile(r"^[0-9a-f]{32}$"))
+            self.assertEqual(response.headers["x-request-id"], response.text)
+        self.assertNotEqual(first.text, second.text)